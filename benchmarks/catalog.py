@@ -0,0 +1,116 @@
+# benchmarks/catalog.py
+"""
+Synthetic product catalogs in the docs/products format, for benchmarking
+retrieval at sizes the sample catalog can't reach.
+
+Generation is seeded, so the same size and seed always produce the same
+files and queries, and runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.catalog --size 10000 --output /tmp/catalog_10k
+"""
+import argparse
+import os
+import random
+from typing import Dict, List, Set, Tuple
+
+BRANDS = ["Dermaclear", "Nutriva", "Solaris", "Purelle", "Botanix", "Hydra+", "Vitalis", "Zenskin", "Aquaderm", "Farmacia Sol"]
+PRODUCT_TYPES = [
+    ("Moisturizing Cream", "crema"), ("Anti-Dandruff Shampoo", "shampoo"), ("Sunscreen SPF 50+", "protector"),
+    ("Antibacterial Soap", "jabon"), ("Vitamin C Supplement", "vitaminas"), ("Facial Serum", "serum"),
+    ("Body Lotion", "locion"), ("Lip Balm", "balsamo"), ("Hand Sanitizer", "gel"), ("Night Repair Mask", "mascarilla"),
+    ("Zinc Supplement", "zinc"), ("Micellar Water", "agua_micelar")
+]
+VARIANTS = ["Premium", "Sensitive", "Daily", "Intensive", "Kids", "Sport", "Mineral", "Fresh", "Ultra", "Classic"]
+INGREDIENTS = [
+    "Hyaluronic acid", "Vitamin E", "Ceramides", "Ketoconazole 2%", "Zinc pyrithione", "Zinc oxide",
+    "Titanium dioxide", "Triclosan", "Glycerin", "Aloe vera", "Ascorbic acid 1000mg", "Niacinamide",
+    "Salicylic acid", "Shea butter", "Panthenol", "Retinol", "Tea tree oil", "Collagen", "Biotin", "Rosehip oil"
+]
+AUDIENCES = [
+    "All skin types", "Dry skin", "Oily skin", "Sensitive skin", "Seborrheic dermatitis", "Children over 3 years",
+    "Adults", "Outdoor activities", "Frequent hand washing", "Immune system support"
+]
+USAGES = [
+    "Apply morning and night to clean face", "Apply to wet hair, massage and rinse after 3 minutes",
+    "Apply 15 minutes before sun exposure and reapply every 2 hours", "Take 1 tablet daily with food",
+    "Lather with water and rinse thoroughly", "Apply a thin layer before bed"
+]
+BENEFITS = [
+    "24-hour hydration", "Reduces flaking and itching", "Broad spectrum UVA/UVB protection",
+    "Eliminates 99.9% of bacteria", "Strengthens the immune system", "Improves skin texture",
+    "Water resistant for 80 minutes", "Soothes irritation", "Evens out skin tone"
+]
+
+def generate_document(rng: random.Random, index: int) -> tuple:
+    """One product document as (filename, content)"""
+    product_type, slug = rng.choice(PRODUCT_TYPES)
+    name = f"{rng.choice(BRANDS)} {product_type} {rng.choice(VARIANTS)} {index}"
+    content = "\n".join([
+        name,
+        f"Ingredients: {', '.join(rng.sample(INGREDIENTS, 3))}",
+        f"Indicated for: {', '.join(rng.sample(AUDIENCES, 2))}",
+        f"Usage: {rng.choice(USAGES)}",
+        f"Benefits: {', '.join(rng.sample(BENEFITS, 2))}",
+        f"Price: ${rng.randint(3, 60)}.{rng.choice(['00', '25', '49', '50', '75', '99'])}"
+    ])
+    return f"{slug}_{index:07d}.txt", content
+
+def generate_catalog(size: int, output_dir: str, seed: int = 42) -> str:
+    """Writes size product files to output_dir; existing files are overwritten"""
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    for index in range(size):
+        filename, content = generate_document(rng, index)
+        with open(os.path.join(output_dir, filename), "w", encoding="utf-8") as f:
+            f.write(content)
+    return output_dir
+
+def generate_queries(count: int, catalog_size: int, seed: int = 7) -> List[str]:
+    """User-style questions about products, ingredients and skin types"""
+    rng = random.Random(seed)
+    templates = [
+        lambda: f"How much does the {rng.choice(PRODUCT_TYPES)[0].lower()} cost?",
+        lambda: f"Which product contains {rng.choice(INGREDIENTS).lower()}?",
+        lambda: f"What do you recommend for {rng.choice(AUDIENCES).lower()}?",
+        lambda: f"Is there a {rng.choice(VARIANTS).lower()} {rng.choice(PRODUCT_TYPES)[0].lower()}?",
+        lambda: f"Tell me about {rng.choice(BRANDS)} product {rng.randrange(catalog_size)}",
+    ]
+    return [rng.choice(templates)() for _ in range(count)]
+
+def labeled_queries(catalog_path: str, count: int, seed: int = 7) -> List[Tuple[str, Set[str]]]:
+    """
+    Questions naming a product's brand, variant, type and one of its
+    ingredients, each with the ids of every product in the catalog that
+    fits that description (the relevant set for recall)
+    """
+    products: Dict[Tuple[str, str, str], List[Tuple[str, List[str]]]] = {}
+    for filename in sorted(os.listdir(catalog_path)):
+        with open(os.path.join(catalog_path, filename), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        brand = next(brand for brand in BRANDS if lines[0].startswith(brand + " "))
+        rest = lines[0][len(brand) + 1:]
+        product_type = next(name for name, _ in PRODUCT_TYPES if rest.startswith(name + " "))
+        variant = rest[len(product_type) + 1:].rsplit(" ", 1)[0]
+        ingredients = lines[1].split(": ", 1)[1].split(", ")
+        products.setdefault((brand, product_type, variant), []).append((filename[:-len(".txt")], ingredients))
+    
+    rng = random.Random(seed)
+    groups = sorted(products)
+    queries = []
+    for _ in range(count):
+        brand, product_type, variant = rng.choice(groups)
+        ingredient = rng.choice(rng.choice(products[(brand, product_type, variant)])[1])
+        relevant = {doc_id for doc_id, ingredients in products[(brand, product_type, variant)] if ingredient in ingredients}
+        queries.append((f"{brand} {variant} {product_type.lower()} with {ingredient.lower()}", relevant))
+    return queries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic product catalog")
+    parser.add_argument("--size", type=int, required=True, help="Number of product files")
+    parser.add_argument("--output", required=True, help="Directory to write the files to")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    generate_catalog(args.size, args.output, args.seed)
+    print(f"Wrote {args.size} products to {args.output}")
@@ -0,0 +1,53 @@
+# benchmarks/compare.py
+"""
+Compares two benchmark result files written by run_suite.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import json
+from typing import Dict, Tuple
+
+METRICS = ("qps", "p50_ms", "p95_ms", "p99_ms")
+
+def load_results(path: str) -> Tuple[Dict, Dict]:
+    """The report and its results keyed by (catalog_size, target)"""
+    with open(path) as f:
+        report = json.load(f)
+    results = {
+        (run["catalog_size"], result["target"]): result
+        for run in report["runs"]
+        for result in run["results"]
+    }
+    return report, results
+
+def change(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+    
+    old_report, old = load_results(args.baseline)
+    new_report, new = load_results(args.candidate)
+    print(f"baseline {old_report['commit']} ({old_report['timestamp']})")
+    print(f"candidate {new_report['commit']} ({new_report['timestamp']})")
+    if old_report["settings"] != new_report["settings"]:
+        print("warning: runs used different settings")
+    
+    print(f"\n{'catalog':>8} {'target':<28}" + "".join(f"{metric:>18}" for metric in METRICS))
+    for key in sorted(set(old) & set(new)):
+        size, target = key
+        cells = "".join(
+            f"{new[key][metric]:>10} {change(old[key][metric], new[key][metric]):>7}"
+            for metric in METRICS
+        )
+        print(f"{size:>8} {target:<28}{cells}")
+
+if __name__ == "__main__":
+    main()
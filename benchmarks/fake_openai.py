@@ -0,0 +1,176 @@
+# benchmarks/fake_openai.py
+"""
+Local stand-in for the OpenAI chat completions API with configurable latency.
+Supports both regular and streamed (`stream: true`) completions, and can be
+told to fail calls with given HTTP statuses.
+Used by the benchmarks and tests so the pipeline can be exercised without
+network access or an API key.
+
+Standalone usage:
+    python -m benchmarks.fake_openai --port 9000 --latency 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 python -m src.api.main
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+import uuid
+import json
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def _answer_for(messages: list) -> str:
+    """Deterministic answer that quotes the first document in the prompt"""
+    prompt = messages[-1]["content"] if messages else ""
+    marker = "Document 1:\n"
+    if marker in prompt:
+        first_line = prompt.split(marker, 1)[1].split("\n", 1)[0].strip()
+        return f"Based on the available information, I recommend {first_line}."
+    return "I don't have that specific information."
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+def create_app(latency: float = 0.2, token_delay: float = 0.0) -> FastAPI:
+    """
+    Creates the fake API. latency is applied before the first token of every
+    completion, token_delay between streamed tokens. Statuses appended to
+    app.state.errors are answered instead, one per call, in order.
+    """
+    app = FastAPI(title="Fake OpenAI")
+    app.state.latency = latency
+    app.state.token_delay = token_delay
+    app.state.calls = 0
+    app.state.errors = []
+    
+    async def stream_tokens(completion_id: str, model: str, content: str):
+        yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+        for i, word in enumerate(content.split(" ")):
+            if i:
+                await asyncio.sleep(app.state.token_delay)
+            yield _chunk(completion_id, model, {"content": word if i == 0 else f" {word}"})
+        yield _chunk(completion_id, model, {}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+    
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        await asyncio.sleep(app.state.latency)
+        if app.state.errors:
+            status = app.state.errors.pop(0)
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": f"Injected {status}", "type": "fake_error", "code": status}},
+                headers={"Retry-After": "0"} if status == 429 else None
+            )
+        
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "fake")
+        content = _answer_for(body.get("messages", []))
+        
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_tokens(completion_id, model, content),
+                media_type="text/event-stream"
+            )
+        
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": 0,
+                "completion_tokens": len(content.split()),
+                "total_tokens": len(content.split())
+            }
+        }
+    
+    return app
+
+class BackgroundServer:
+    """Runs an ASGI app on a free local port in a background thread"""
+    
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        self.app = app
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+    
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+    
+    def start(self) -> str:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        self.port = sock.getsockname()[1]
+        
+        config = uvicorn.Config(self.app, log_level="warning", lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(
+            target=self._server.run, kwargs={"sockets": [sock]}, daemon=True
+        )
+        self._thread.start()
+        
+        while not self._server.started:
+            time.sleep(0.01)
+        return self.url
+    
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+    
+    def __enter__(self):
+        self.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+class FakeOpenAIServer(BackgroundServer):
+    """Fake OpenAI API served from a background thread"""
+    
+    def __init__(self, latency: float = 0.2, token_delay: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        super().__init__(create_app(latency, token_delay), host, port)
+    
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+    
+    @property
+    def calls(self) -> int:
+        return self.app.state.calls
+    
+    def fail_next(self, *statuses: int):
+        """Answers the next calls with these HTTP statuses"""
+        self.app.state.errors.extend(statuses)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    args = parser.parse_args()
+    
+    uvicorn.run(create_app(args.latency, args.token_delay), host=args.host, port=args.port, log_level="warning")
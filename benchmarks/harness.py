@@ -0,0 +1,87 @@
+# benchmarks/harness.py
+"""
+Measurement helpers shared by the benchmark scripts: run a callable under a
+fixed concurrency and summarize its latencies as percentiles and QPS.
+"""
+import asyncio
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Sequence
+import numpy as np
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(np.ceil(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+def summarize(target: str, latencies: List[float], elapsed: float, errors: int, concurrency: int) -> Dict:
+    """Latency percentiles in milliseconds and throughput for one target"""
+    latencies = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        "target": target,
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "qps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0
+    }
+
+def run_threaded(target: str, func: Callable, inputs: Sequence, concurrency: int) -> Dict:
+    """Calls a blocking func once per input from `concurrency` threads"""
+    def timed(item):
+        start = time.perf_counter()
+        func(item)
+        return time.perf_counter() - start
+    
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(timed, item) for item in inputs]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    return summarize(target, latencies, time.perf_counter() - start, errors, concurrency)
+
+async def run_concurrent(target: str, func: Callable[..., Awaitable], inputs: Sequence, concurrency: int) -> Dict:
+    """Awaits func once per input with at most `concurrency` calls in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+    
+    async def timed(item):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await func(item)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(item) for item in inputs))
+    return summarize(target, latencies, time.perf_counter() - start, errors, concurrency)
+
+class TokenOverlapCrossEncoder:
+    """
+    Stand-in for a CrossEncoder: scores each (query, document) pair by the
+    share of query words found in the document. Lets the rerank benchmark
+    run offline; it measures pipeline cost, not model quality.
+    """
+    
+    def predict(self, pairs, batch_size=32, **kwargs):
+        scores = []
+        for query, document in pairs:
+            words = set(re.findall(r"\w+", query.lower()))
+            found = words & set(re.findall(r"\w+", document.lower()))
+            scores.append(len(found) / len(words) if words else 0.0)
+        return np.asarray(scores, dtype=np.float32)
@@ -0,0 +1,106 @@
+# benchmarks/load_benchmark.py
+"""
+Concurrent-request throughput of the blocking vs async request path.
+
+The "blocking" route reproduces the previous endpoint pattern (an async
+handler calling the synchronous MultiAgentSystem.process_query), the "async"
+route awaits aprocess_query. Both run against the fake OpenAI server, so the
+numbers isolate event-loop behaviour from network variance.
+
+Usage:
+    python -m benchmarks.load_benchmark --requests 40 --concurrency 8 --llm-latency 0.25
+"""
+import argparse
+import asyncio
+import json
+import sys
+import os
+import time
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from src.utils.config import Config
+
+QUERIES = [
+    "What shampoo do you recommend for dandruff?",
+    "How much does the sunscreen cost?",
+    "Which cream is good for dry skin?",
+    "What are the ingredients of the hand soap?",
+]
+
+def build_app(system) -> FastAPI:
+    app = FastAPI()
+    
+    @app.post("/blocking")
+    async def blocking(payload: dict):
+        return system.process_query(payload["query"])
+    
+    @app.post("/async")
+    async def non_blocking(payload: dict):
+        return await system.aprocess_query(payload["query"])
+    
+    return app
+
+async def run_load(app: FastAPI, route: str, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None
+    ) as client:
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(route, json={"query": QUERIES[i % len(QUERIES)]})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    return {
+        "route": route,
+        "requests": total,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.25)
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+    
+    with FakeOpenAIServer(latency=args.llm_latency) as server:
+        Config.OPENAI_BASE_URL = server.base_url
+        Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or "benchmark"
+        
+        from src.agents.multi_agent_system import MultiAgentSystem
+        app = build_app(MultiAgentSystem())
+        
+        results = [
+            asyncio.run(run_load(app, route, args.requests, args.concurrency))
+            for route in ("/blocking", "/async")
+        ]
+    
+    print(f"\n{'route':<10} {'rps':>8} {'p50 ms':>8} {'max ms':>8} {'total s':>8}")
+    for r in results:
+        print(f"{r['route']:<10} {r['throughput_rps']:>8} {r['p50_ms']:>8} {r['max_ms']:>8} {r['elapsed_s']:>8}")
+    print(f"\nSpeedup: {results[1]['throughput_rps'] / results[0]['throughput_rps']:.1f}x")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# benchmarks/quantization.py
+"""
+Memory and recall of quantized embeddings (VECTOR_QUANTIZATION).
+
+A synthetic catalog is indexed once into a NumPy vector store artifact,
+which is then opened with each configuration in --configs: "none" (exact
+float search), "int8", or "pq:<dims>" for product quantization with
+<dims>-dimensional sub-vectors, each at every rescore factor in
+--rescore-factors. Queries are labeled (benchmarks/catalog.labeled_queries:
+brand, variant, type and an ingredient, with every product matching them)
+and searched in vector mode. For each configuration it reports:
+- scanned_mb: the vectors every query scans, which must stay resident
+  (float matrix, or codes plus codebooks), and the compression against float
+- recall: the labeled relevant products found in the top k
+- exact_overlap: the share of the exact search's top k that is returned,
+  i.e. what quantization loses before the labels come into it
+- encode_s: fitting the quantizer and encoding the catalog at open
+- search p50/p95 of DocumentRetriever.search
+
+Usage:
+    python -m benchmarks.quantization --catalog-size 10000 --queries 300
+    python -m benchmarks.quantization --embedding-model hashing --configs none,int8,pq:4,pq:8 --rescore-factors 2,10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Set, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.catalog import labeled_queries
+from benchmarks.harness import run_threaded
+from benchmarks.run_suite import RESULTS_DIR, git_commit, prepare_catalog
+from tests.helpers import HashingEmbeddingModel
+from src.rag.registry import get_embedding_model
+from src.rag.vector_store import describe
+from src.utils.config import Config
+
+def parse_config(name: str) -> Tuple[str, int]:
+    """("pq", 8) for "pq:8"; the sub-vector size only matters for pq"""
+    kind, _, dims = name.partition(":")
+    return kind, int(dims) if dims else Config.PQ_SUBVECTOR_DIM
+
+def returned_ids(docs: List[Dict]) -> List[str]:
+    return [doc["metadata"].get("doc_id", doc["id"]) for doc in docs]
+
+def recall(results: List[List[str]], labeled: List[Tuple[str, Set[str]]], top_k: int) -> float:
+    """Mean share of each query's relevant products (up to top_k) that were returned"""
+    return statistics.mean(
+        len(relevant.intersection(ids)) / min(top_k, len(relevant))
+        for ids, (_, relevant) in zip(results, labeled)
+    )
+
+def run_config(name: str, rescore_factor: int, artifact: str, model, labeled, exact, args) -> Dict:
+    from src.rag.retriever import DocumentRetriever
+    
+    kind, dims = parse_config(name)
+    Config.VECTOR_QUANTIZATION = kind
+    Config.PQ_SUBVECTOR_DIM = dims
+    Config.QUANTIZED_RESCORE_FACTOR = rescore_factor
+    start = time.perf_counter()
+    retriever = DocumentRetriever(embedding_model=model, artifact=artifact)
+    open_s = time.perf_counter() - start
+    
+    queries = [query for query, _ in labeled]
+    results = [returned_ids(docs) for docs in retriever.search_batch(queries, top_k=args.top_k)]
+    vectors = describe(retriever.collection)
+    scanned = vectors["codes_bytes"] or vectors["embeddings_bytes"]
+    overlap = statistics.mean(
+        len(set(ids) & set(best)) / max(1, len(best)) for ids, best in zip(results, exact)
+    ) if exact is not None else None
+    search = run_threaded(name, lambda query: retriever.search(query, args.top_k), queries, 1)
+    return {
+        "config": name,
+        "rescore_factor": rescore_factor if kind != "none" else None,
+        "scanned_mb": round(scanned / 2 ** 20, 2),
+        "compression": round(vectors["embeddings_bytes"] / scanned, 1),
+        "recall": round(recall(results, labeled, args.top_k), 3),
+        "exact_overlap": round(overlap, 3) if overlap is not None else None,
+        "encode_s": round(open_s, 3),
+        "search_p50_ms": search["p50_ms"],
+        "search_p95_ms": search["p95_ms"],
+        "results": results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog-size", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--configs", default="none,int8,pq:4,pq:8", help="Comma-separated none | int8 | pq:<sub-vector dims>")
+    parser.add_argument("--rescore-factors", default=str(Config.QUANTIZED_RESCORE_FACTOR),
+                        help="Comma-separated QUANTIZED_RESCORE_FACTOR values for the quantized configs")
+    parser.add_argument("--embedding-model", default=Config.EMBEDDING_MODEL,
+                        help="SentenceTransformer name, or 'hashing' for an offline stand-in")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/quantization_<timestamp>_<commit>.json)")
+    args = parser.parse_args()
+    
+    from src.rag.build_index import IndexBuilder
+    
+    Config.RETRIEVAL_MODE = "vector"
+    Config.VECTOR_QUANTIZATION = "none"
+    if args.embedding_model != "hashing":
+        Config.EMBEDDING_MODEL = args.embedding_model
+    model = HashingEmbeddingModel() if args.embedding_model == "hashing" else get_embedding_model()
+    catalog = prepare_catalog(args.catalog_size, args.seed)
+    labeled = labeled_queries(catalog, args.queries, args.seed)
+    
+    configs = args.configs.split(",")
+    # The exact search comes first: it is what exact_overlap compares against
+    configs = (["none"] if "none" in configs else []) + [name for name in configs if name != "none"]
+    factors = [int(factor) for factor in args.rescore_factors.split(",")]
+    runs, exact = [], None
+    with tempfile.TemporaryDirectory() as root:
+        manifest = IndexBuilder(catalog, root, embedding_model=model, vector_store="numpy").build()
+        artifact = os.path.join(root, manifest["version"])
+        print(f"Indexed {manifest['chunks']} entries")
+        print(f"\n{'config':<8} {'rescore':>7} {'scanned':>9} {'ratio':>6} {'recall':>7} {'exact':>6} {'encode':>7} {'p50':>9} {'p95':>9}")
+        for name in configs:
+            for factor in factors if name != "none" else factors[:1]:
+                run = run_config(name, factor, artifact, model, labeled, exact, args)
+                if name == "none":
+                    exact = run["results"]
+                runs.append(run)
+                print(
+                    f"{name:<8} {str(run['rescore_factor'] or '-'):>7} {run['scanned_mb']:>7}MB {run['compression']:>5}x "
+                    f"{run['recall']:>7} {str(run['exact_overlap']):>6} {run['encode_s']:>6}s "
+                    f"{run['search_p50_ms']:>7}ms {run['search_p95_ms']:>7}ms"
+                )
+    for run in runs:
+        run.pop("results")
+    
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "settings": {
+            "catalog_size": args.catalog_size,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "embedding_model": args.embedding_model,
+            "seed": args.seed
+        },
+        "entries": manifest["chunks"],
+        "runs": runs
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"quantization_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    main()
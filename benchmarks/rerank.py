@@ -0,0 +1,166 @@
+# benchmarks/rerank.py
+"""
+Latency and prompt-size tradeoff of the cross-encoder rerank stage.
+
+Over a synthetic catalog, each configuration retrieves for the same queries
+and then answers them end to end through MultiAgentSystem (LLM calls go to
+the fake OpenAI server). Configurations:
+- baseline: no reranking, top_k = --top-k
+- wide: no reranking, top_k = --wide-top-k (the "raise TOP_K_DOCUMENTS" option)
+- rerank@N for each candidate depth N: retrieve N, keep the --top-k best
+
+For each one it reports retrieval and end-to-end p50/p95, the prompt
+context tokens, and hit rate on the queries that name a product number
+(whether that product is among the documents passed to the LLM).
+
+Usage:
+    python -m benchmarks.rerank --catalog-size 1000 --depths 10,20,50
+    python -m benchmarks.rerank --embedding-model hashing --rerank-model overlap
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.catalog import generate_queries
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.harness import TokenOverlapCrossEncoder, run_threaded
+from benchmarks.run_suite import RESULTS_DIR, build_index, git_commit, prepare_catalog
+from src.rag import registry
+from src.rag.context_builder import ContextBuilder
+from src.utils.config import Config
+
+PRODUCT_NUMBER = re.compile(r"product (\d+)$")
+
+def hit_rate(queries: List[str], results: List[Dict]) -> Optional[float]:
+    """Share of product-number queries whose product was retrieved"""
+    hits, labelled = 0, 0
+    for query, result in zip(queries, results):
+        match = PRODUCT_NUMBER.search(query)
+        if not match:
+            continue
+        labelled += 1
+        suffix = f"_{int(match.group(1)):07d}"
+        hits += any(doc["metadata"].get("doc_id", doc["id"]).endswith(suffix) for doc in result["retrieved_docs"])
+    return round(hits / labelled, 3) if labelled else None
+
+def run_config(name: str, agent, top_k: int, queries: List[str], args) -> Dict:
+    from src.agents.multi_agent_system import MultiAgentSystem
+    
+    results = [agent.run(query, top_k) for query in queries]
+    builder = ContextBuilder()
+    tokens = [builder.build(result["retrieved_docs"]).tokens for result in results]
+    
+    retrieval = run_threaded(f"{name}.retrieve", lambda query: agent.run(query, top_k), queries, args.concurrency)
+    system = MultiAgentSystem()
+    system.retriever_agent = agent
+    end_to_end = run_threaded(f"{name}.process_query", lambda query: system.process_query(query, top_k), queries, args.concurrency)
+    
+    return {
+        "config": name,
+        "top_k": top_k,
+        "candidates": Config.RERANK_CANDIDATES if agent.reranker is not None else top_k,
+        "context_tokens_mean": round(statistics.mean(tokens), 1),
+        "hit_rate": hit_rate(queries, results),
+        "retrieval": retrieval,
+        "end_to_end": end_to_end
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--depths", default="10,20,50", help="Comma-separated rerank candidate depths")
+    parser.add_argument("--top-k", type=int, default=3, help="Documents passed to the LLM")
+    parser.add_argument("--wide-top-k", type=int, default=8, help="top_k of the no-rerank comparison")
+    parser.add_argument("--budget-ms", type=float, default=Config.RERANK_BUDGET_MS, help="Rerank time budget per query (0 = none)")
+    parser.add_argument("--llm-latency", type=float, default=0.25, help="Fake LLM seconds per completion")
+    parser.add_argument("--embedding-model", default=Config.EMBEDDING_MODEL,
+                        help="SentenceTransformer name, or 'hashing' for an offline stand-in")
+    parser.add_argument("--rerank-model", default=Config.RERANK_MODEL,
+                        help="CrossEncoder name, or 'overlap' for an offline stand-in")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/rerank_<timestamp>_<commit>.json)")
+    args = parser.parse_args()
+    
+    from src.agents.retriever_agent import RetrieverAgent
+    from src.rag.reranker import CrossEncoderReranker
+    
+    Config.RESPONSE_CACHE_ENABLED = False
+    Config.COALESCE_REQUESTS = False
+    if args.embedding_model != "hashing":
+        Config.EMBEDDING_MODEL = args.embedding_model
+    if args.rerank_model != "overlap":
+        Config.RERANK_MODEL = args.rerank_model
+    
+    catalog = prepare_catalog(args.catalog_size, args.seed)
+    index = build_index(catalog, args.embedding_model)
+    print(f"Indexed {index['indexed']} products in {index['index_build_s']}s")
+    # After build_index, which resets the registry
+    if args.rerank_model == "overlap":
+        registry._cross_encoder = TokenOverlapCrossEncoder()
+    queries = generate_queries(args.requests, args.catalog_size, args.seed)
+    retriever = registry.get_retriever()
+    reranker = CrossEncoderReranker(budget_ms=args.budget_ms)
+    
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "settings": {
+            "catalog_size": args.catalog_size,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "top_k": args.top_k,
+            "wide_top_k": args.wide_top_k,
+            "budget_ms": args.budget_ms,
+            "llm_latency_s": args.llm_latency,
+            "embedding_model": args.embedding_model,
+            "rerank_model": args.rerank_model,
+            "seed": args.seed
+        },
+        **index,
+        "runs": []
+    }
+    
+    configs = [("baseline", None, args.top_k), ("wide", None, args.wide_top_k)]
+    configs += [(f"rerank@{depth}", depth, args.top_k) for depth in (int(d) for d in args.depths.split(","))]
+    with FakeOpenAIServer(latency=args.llm_latency) as llm:
+        Config.OPENAI_BASE_URL = llm.base_url
+        Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or "benchmark"
+        print(f"\n{'config':<12} {'k':>3} {'tokens':>7} {'hit':>6} {'retr p50':>9} {'retr p95':>9} {'e2e p50':>9} {'e2e p95':>9}")
+        for name, depth, top_k in configs:
+            if depth is not None:
+                Config.RERANK_CANDIDATES = depth
+            agent = RetrieverAgent(retriever, reranker=reranker if depth is not None else None)
+            run = run_config(name, agent, top_k, queries, args)
+            report["runs"].append(run)
+            print(
+                f"{name:<12} {top_k:>3} {run['context_tokens_mean']:>7} {str(run['hit_rate']):>6} "
+                f"{run['retrieval']['p50_ms']:>8}ms {run['retrieval']['p95_ms']:>8}ms "
+                f"{run['end_to_end']['p50_ms']:>8}ms {run['end_to_end']['p95_ms']:>8}ms"
+            )
+    
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"rerank_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    main()
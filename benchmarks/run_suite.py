@@ -0,0 +1,178 @@
+# benchmarks/run_suite.py
+"""
+End-to-end benchmark suite for the RAG pipeline.
+
+For each catalog size, a synthetic catalog is generated and indexed, then
+these targets are measured under the given concurrency:
+- retriever.search: DocumentRetriever.search
+- multi_agent.process_query: MultiAgentSystem.process_query
+- langgraph.process_query: LangGraphMultiAgentSystem.process_query
+- api./query, api./query-langgraph: the FastAPI endpoints over HTTP
+
+LLM calls go to the local fake OpenAI server, so results reflect our own
+code plus a fixed, configurable LLM latency; with --generator-backend
+extractive, answers are generated in-process instead. The response cache is off
+unless --response-cache is given, so every request reaches the LLM.
+Results (with commit and environment) are written as JSON; compare two
+runs with benchmarks/compare.py.
+
+Usage:
+    python -m benchmarks.run_suite --catalog-sizes 1000,10000 --requests 200 --concurrency 8
+    python -m benchmarks.run_suite --catalog-sizes 1000 --embedding-model hashing --output results.json
+    python -m benchmarks.run_suite --embedding-model hashing --generator-backend extractive
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.catalog import generate_catalog, generate_queries
+from benchmarks.fake_openai import BackgroundServer, FakeOpenAIServer
+from benchmarks.harness import run_concurrent, run_threaded
+from tests.helpers import HashingEmbeddingModel
+from src.rag import registry
+from src.rag.generator_backends import GENERATOR_BACKENDS
+from src.utils.config import Config
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+CATALOG_DIR = os.path.join(os.path.dirname(__file__), ".catalogs")
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def prepare_catalog(size: int, seed: int) -> str:
+    """Generates the catalog once and reuses it on later runs"""
+    path = os.path.join(CATALOG_DIR, f"{size}-{seed}")
+    if not os.path.isdir(path) or len(os.listdir(path)) != size:
+        print(f"Generating {size} products in {path}")
+        generate_catalog(size, path, seed)
+    return path
+
+def build_index(catalog_path: str, embedding_model: str) -> Dict:
+    """Indexes the catalog into the shared retriever and times it"""
+    registry.shutdown()
+    Config.DOCS_PATH = catalog_path
+    if embedding_model == "hashing":
+        registry._embedding_model = HashingEmbeddingModel()
+    
+    start = time.perf_counter()
+    retriever = registry.get_retriever()
+    return {"index_build_s": round(time.perf_counter() - start, 3), "indexed": retriever.collection.count()}
+
+async def measure_api(url: str, path: str, queries: List[str], concurrency: int) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+        async def post(query: str):
+            response = await client.post(path, json={"user_id": "bench", "query": query})
+            response.raise_for_status()
+        
+        return await run_concurrent(f"api.{path}", post, queries, concurrency)
+
+def run_catalog(size: int, args) -> Dict:
+    from src.agents.multi_agent_system import MultiAgentSystem
+    from src.agents.langgraph_system import LangGraphMultiAgentSystem
+    from src.api import main
+    
+    catalog = prepare_catalog(size, args.seed)
+    index = build_index(catalog, args.embedding_model)
+    print(f"Indexed {index['indexed']} products in {index['index_build_s']}s")
+    
+    queries = generate_queries(args.requests, size, args.seed)
+    retriever = registry.get_retriever()
+    multi_agent = MultiAgentSystem()
+    langgraph = LangGraphMultiAgentSystem()
+    
+    results = [
+        run_threaded("retriever.search", retriever.search, queries, args.concurrency),
+        run_threaded("multi_agent.process_query", multi_agent.process_query, queries, args.concurrency),
+        run_threaded("langgraph.process_query", langgraph.process_query, queries, args.concurrency),
+    ]
+    
+    main.multi_agent_system, main.langgraph_system = multi_agent, langgraph
+    with BackgroundServer(main.app) as api:
+        for path in ("/query", "/query-langgraph"):
+            results.append(asyncio.run(measure_api(api.url, path, queries, args.concurrency)))
+    
+    for result in results:
+        print(
+            f"  {result['target']:<28} qps {result['qps']:>8}  p50 {result['p50_ms']:>8}ms  "
+            f"p95 {result['p95_ms']:>8}ms  p99 {result['p99_ms']:>8}ms  errors {result['errors']}"
+        )
+    return {"catalog_size": size, **index, "results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog-sizes", default="1000", help="Comma-separated product counts, e.g. 1000,10000,100000")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per target")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.25, help="Fake LLM seconds per completion")
+    parser.add_argument("--embedding-model", default=Config.EMBEDDING_MODEL,
+                        help="SentenceTransformer name, or 'hashing' for an offline stand-in")
+    parser.add_argument("--generator-backend", default="openai", choices=GENERATOR_BACKENDS,
+                        help="GENERATOR_BACKEND: openai answers from the fake server, extractive in-process")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the semantic response cache on")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/<timestamp>_<commit>.json)")
+    args = parser.parse_args()
+    
+    sizes = [int(size) for size in args.catalog_sizes.split(",")]
+    Config.RESPONSE_CACHE_ENABLED = args.response_cache
+    Config.GENERATOR_BACKEND = args.generator_backend
+    if args.embedding_model != "hashing":
+        Config.EMBEDDING_MODEL = args.embedding_model
+    
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency_s": args.llm_latency,
+            "generator_backend": args.generator_backend,
+            "embedding_model": args.embedding_model,
+            "response_cache": args.response_cache,
+            "top_k": Config.TOP_K_DOCUMENTS,
+            "seed": args.seed
+        },
+        "runs": []
+    }
+    
+    with FakeOpenAIServer(latency=args.llm_latency) as llm:
+        Config.OPENAI_BASE_URL = llm.base_url
+        Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or "benchmark"
+        for size in sizes:
+            print(f"\nCatalog of {size} products")
+            report["runs"].append(run_catalog(size, args))
+    
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/scaling.py
+"""
+Throughput scaling of the multi-worker server (src/api/serve.py).
+
+For each worker count, the server is started as a separate process over the
+same synthetic catalog and on-disk index, and /query is measured over HTTP
+under a fixed concurrency. Worker counts default to powers of two up to the
+number of cores. LLM calls go to the fake OpenAI server with a small
+latency, so throughput is bounded by our own CPU work (embedding,
+retrieval, request handling) rather than by waiting on the model.
+
+Usage:
+    python -m benchmarks.scaling --catalog-size 1000 --requests 400 --concurrency 32
+    python -m benchmarks.scaling --workers 1,2,4 --embedding-model hashing
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.catalog import generate_queries
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.run_suite import RESULTS_DIR, git_commit, measure_api, prepare_catalog
+from src.utils.config import Config
+
+def default_worker_counts() -> List[int]:
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_until(url: str, server: subprocess.Popen, timeout: float = 600) -> float:
+    """Seconds until url answers 200"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} did not answer within {timeout}s")
+
+def stop_server(server: subprocess.Popen):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+def run_workers(workers: int, env: Dict, queries: List[str], args) -> Dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.scaling", "--serve", "--workers", str(workers),
+         "--port", str(port), "--embedding-model", args.embedding_model],
+        env=env, cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    )
+    try:
+        startup = wait_until(f"{url}/ready", server)
+        # Warm every worker's caches and connection pools before measuring
+        asyncio.run(measure_api(url, "/query", queries[:args.concurrency], args.concurrency))
+        result = asyncio.run(measure_api(url, "/query", queries, args.concurrency))
+    finally:
+        stop_server(server)
+    return {"workers": workers, "startup_s": round(startup, 3), **result}
+
+def serve_main(args):
+    """Server process: optionally injects the offline model, then serves"""
+    from src.api.serve import serve
+    if args.embedding_model == "hashing":
+        from tests.helpers import HashingEmbeddingModel
+        from src.rag import registry
+        registry._embedding_model = HashingEmbeddingModel()
+    serve(int(args.workers), "127.0.0.1", args.port)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", help="Comma-separated worker counts (default: powers of two up to the core count)")
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="Fake LLM seconds per completion")
+    parser.add_argument("--embedding-model", default=Config.EMBEDDING_MODEL,
+                        help="SentenceTransformer name, or 'hashing' for an offline stand-in")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/scaling_<timestamp>_<commit>.json)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve_main(args)
+        return
+    
+    worker_counts = [int(count) for count in args.workers.split(",")] if args.workers else default_worker_counts()
+    catalog = prepare_catalog(args.catalog_size, args.seed)
+    queries = generate_queries(args.requests, args.catalog_size, args.seed)
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "settings": {
+            "catalog_size": args.catalog_size,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency_s": args.llm_latency,
+            "embedding_model": args.embedding_model,
+            "seed": args.seed
+        },
+        "runs": []
+    }
+    
+    with FakeOpenAIServer(latency=args.llm_latency) as llm, tempfile.TemporaryDirectory() as index_dir:
+        env = dict(
+            os.environ,
+            OPENAI_BASE_URL=llm.base_url,
+            OPENAI_API_KEY=Config.OPENAI_API_KEY or "benchmark",
+            DOCS_PATH=catalog,
+            # Built by the first run, reused (and only re-checked) by the others
+            CHROMA_PERSIST_DIR=index_dir,
+            RESPONSE_CACHE_ENABLED="False",
+            COALESCE_REQUESTS="False",
+            LOG_LEVEL="WARNING"
+        )
+        for workers in worker_counts:
+            print(f"\n{workers} worker(s)")
+            run = run_workers(workers, env, queries, args)
+            report["runs"].append(run)
+            print(
+                f"  qps {run['qps']:>8}  p50 {run['p50_ms']:>8}ms  p95 {run['p95_ms']:>8}ms  "
+                f"p99 {run['p99_ms']:>8}ms  errors {run['errors']}  startup {run['startup_s']}s"
+            )
+    
+    base = report["runs"][0]["qps"]
+    print(f"\n{'workers':>8} {'qps':>10} {'speedup':>8}")
+    for run in report["runs"]:
+        speedup = run["qps"] / base if base else 0.0
+        print(f"{run['workers']:>8} {run['qps']:>10} {speedup:>7.2f}x")
+    
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"scaling_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+if __name__ == "__main__":
+    main()
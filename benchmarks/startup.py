@@ -0,0 +1,144 @@
+# benchmarks/startup.py
+"""
+Startup time of the API server, broken down by phase.
+
+Each run starts a fresh server process over the synthetic catalog (in-memory
+index, so every run embeds the corpus) and records:
+- import_app_s: importing src.api.main in a fresh interpreter
+- port_s: process start until /health answers
+- ready_s: process start until /ready answers 200
+- the per-component load times /ready reports: imports (torch,
+  sentence-transformers, Chroma and the agents), embedding_model, index
+  (reading, embedding and indexing the catalog) and the two systems
+
+Usage:
+    python -m benchmarks.startup --catalog-size 1000 --runs 3
+    python -m benchmarks.startup --embedding-model hashing
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.config import Config
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+IMPORT_PROBE = "import time; start = time.perf_counter(); import src.api.main; print(time.perf_counter() - start)"
+
+def measure_import(env: Dict) -> float:
+    """Seconds to import the app in a fresh interpreter"""
+    result = subprocess.run([sys.executable, "-c", IMPORT_PROBE], env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def run_once(env: Dict, args) -> Dict:
+    from benchmarks.scaling import free_port, stop_server, wait_until
+    
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.startup", "--serve", "--port", str(port), "--embedding-model", args.embedding_model],
+        env=env, cwd=ROOT
+    )
+    try:
+        port_s = wait_until(f"{url}/health", server)
+        ready_s = port_s + wait_until(f"{url}/ready", server)
+        report = httpx.get(f"{url}/ready", timeout=5).json()
+    finally:
+        stop_server(server)
+    return {
+        "import_app_s": round(measure_import(env), 3),
+        "port_s": round(port_s, 3),
+        "ready_s": round(ready_s, 3),
+        "components": {name: state.get("elapsed_s") for name, state in report["components"].items()}
+    }
+
+def serve_main(args):
+    """Server process: optionally injects the offline model, then serves the app"""
+    import uvicorn
+    from src.api import main
+    if args.embedding_model == "hashing":
+        from tests.helpers import HashingEmbeddingModel
+        from src.rag import registry
+        registry._embedding_model = HashingEmbeddingModel()
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_config=None)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog-size", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--embedding-model", default=Config.EMBEDDING_MODEL,
+                        help="SentenceTransformer name, or 'hashing' for an offline stand-in")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/startup_<timestamp>_<commit>.json)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve_main(args)
+        return
+    
+    # Imported only here: they load the whole stack, which the server process must not
+    from benchmarks.run_suite import RESULTS_DIR, git_commit, prepare_catalog
+    catalog = prepare_catalog(args.catalog_size, args.seed)
+    commit = git_commit()
+    env = dict(
+        os.environ,
+        DOCS_PATH=catalog,
+        OPENAI_API_KEY=Config.OPENAI_API_KEY or "benchmark",
+        CHROMA_PERSISTENT="False",
+        INDEX_ARTIFACT="",
+        LOG_LEVEL="WARNING"
+    )
+    runs = []
+    for number in range(1, args.runs + 1):
+        run = run_once(env, args)
+        runs.append(run)
+        phases = "  ".join(f"{name} {seconds}s" for name, seconds in run["components"].items())
+        print(f"run {number}: import {run['import_app_s']}s  port {run['port_s']}s  ready {run['ready_s']}s  ({phases})")
+    
+    median = {
+        key: round(statistics.median(run[key] for run in runs), 3)
+        for key in ("import_app_s", "port_s", "ready_s")
+    }
+    median["components"] = {
+        name: round(statistics.median(run["components"][name] or 0.0 for run in runs), 3)
+        for name in runs[0]["components"]
+    }
+    print(f"\nmedian: import {median['import_app_s']}s  port {median['port_s']}s  ready {median['ready_s']}s")
+    
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "settings": {
+            "catalog_size": args.catalog_size,
+            "runs": args.runs,
+            "embedding_model": args.embedding_model,
+            "seed": args.seed
+        },
+        "median": median,
+        "runs": runs
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"startup_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
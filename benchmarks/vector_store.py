@@ -0,0 +1,186 @@
+# benchmarks/vector_store.py
+"""
+Chroma against the NumPy vector store (VECTOR_STORE) over the same catalog.
+
+An index artifact is built with each backend, then each one is opened in a
+fresh process, the way a server starts from INDEX_ARTIFACT, which records:
+- open_s: opening the artifact (including importing the backend's client
+  library) and building the local indexes
+- rss_mb: resident memory after opening, and rss_open_mb, the part the open
+  added on top of the embedding model and the application code
+- store_ms: p50/p95 of the vector store's query alone, for precomputed
+  query embeddings
+- search: DocumentRetriever.search p50/p95 and QPS under --concurrency
+- size_mb: the store's files in the artifact
+The NumPy store's search is exact, so it also gives Chroma's recall:
+chroma_exact is the share of queries for which Chroma's approximate (HNSW)
+top_k is as near as the exact one (compared by distance, as ties may come
+back in either order).
+
+Usage:
+    python -m benchmarks.vector_store --catalog-size 10000 --requests 500
+    python -m benchmarks.vector_store --embedding-model hashing --retrieval-mode hybrid
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.config import Config
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BACKENDS = ("chroma", "numpy")
+
+def rss_mb() -> float:
+    """Current resident set size of this process"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+
+def load_model(name: str):
+    if name == "hashing":
+        from tests.helpers import HashingEmbeddingModel
+        return HashingEmbeddingModel()
+    from src.rag.registry import get_embedding_model
+    Config.EMBEDDING_MODEL = name
+    return get_embedding_model()
+
+def probe_main(args):
+    """Child process: opens one artifact and measures it, printing JSON"""
+    from benchmarks.catalog import generate_queries
+    from benchmarks.harness import percentile, run_threaded
+    from src.rag.retriever import DocumentRetriever
+    
+    model = load_model(args.embedding_model)
+    queries = generate_queries(args.requests, args.catalog_size, args.seed)
+    model.encode(queries[:1])
+    before = rss_mb()
+    
+    start = time.perf_counter()
+    retriever = DocumentRetriever(embedding_model=model, artifact=args.artifact)
+    open_s = time.perf_counter() - start
+    after = rss_mb()
+    
+    embeddings = retriever.embed_queries(queries)
+    collection = retriever.collection
+    latencies = []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[embedding], n_results=args.top_k)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    
+    search = run_threaded("retriever.search", lambda query: retriever.search(query, args.top_k), queries, args.concurrency)
+    print(json.dumps({
+        "vector_store": retriever.vector_store,
+        "open_s": round(open_s, 3),
+        "rss_mb": after,
+        "rss_open_mb": round(after - before, 1),
+        "store_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "store_p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "search": search,
+        "top_distances": collection.query(query_embeddings=embeddings, n_results=args.top_k)["distances"]
+    }))
+
+def run_backend(artifact: str, args) -> Dict:
+    env = dict(os.environ, LOG_LEVEL="WARNING", RETRIEVAL_MODE=args.retrieval_mode, INDEX_ARTIFACT="")
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.vector_store", "--probe", "--artifact", artifact,
+         "--embedding-model", args.embedding_model, "--catalog-size", str(args.catalog_size),
+         "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+         "--top-k", str(args.top_k), "--seed", str(args.seed)],
+        env=env, cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog-size", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--top-k", type=int, default=Config.TOP_K_DOCUMENTS)
+    parser.add_argument("--retrieval-mode", default="vector", help="RETRIEVAL_MODE of the measured retrievers")
+    parser.add_argument("--embedding-model", default=Config.EMBEDDING_MODEL,
+                        help="SentenceTransformer name, or 'hashing' for an offline stand-in")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/vector_store_<timestamp>_<commit>.json)")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--artifact", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.probe:
+        probe_main(args)
+        return
+    
+    # Imported only here: they load the whole stack, which the probe measures itself
+    from benchmarks.run_suite import RESULTS_DIR, git_commit, prepare_catalog
+    from src.rag.artifact import store_path
+    from src.rag.build_index import IndexBuilder, directory_bytes
+    
+    catalog = prepare_catalog(args.catalog_size, args.seed)
+    model = load_model(args.embedding_model)
+    runs = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in BACKENDS:
+            root = os.path.join(workdir, backend)
+            manifest = IndexBuilder(catalog, root, embedding_model=model, vector_store=backend).build()
+            artifact = os.path.join(root, manifest["version"])
+            run = run_backend(artifact, args)
+            run["build_s"] = manifest["stats"]["total_s"]
+            run["size_mb"] = round(directory_bytes(store_path(artifact, backend)) / 2 ** 20, 1)
+            runs.append(run)
+    
+    print(f"\n{'store':<8} {'build':>7} {'open':>7} {'rss':>8} {'rss open':>9} {'size':>8} "
+          f"{'store p50':>10} {'store p95':>10} {'search p50':>11} {'search p95':>11} {'qps':>8}")
+    for run in runs:
+        print(
+            f"{run['vector_store']:<8} {run['build_s']:>6}s {run['open_s']:>6}s {run['rss_mb']:>6}MB "
+            f"{run['rss_open_mb']:>7}MB {run['size_mb']:>6}MB {run['store_p50_ms']:>8}ms {run['store_p95_ms']:>8}ms "
+            f"{run['search']['p50_ms']:>9}ms {run['search']['p95_ms']:>9}ms {run['search']['qps']:>8}"
+        )
+    approximate, exact = (run.pop("top_distances") for run in runs)
+    chroma_exact = round(
+        sum(np.allclose(found, best, atol=1e-4) for found, best in zip(approximate, exact)) / len(exact), 3
+    )
+    print(f"\nChroma found the exact top {args.top_k} for {chroma_exact:.1%} of queries")
+    
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "settings": {
+            "catalog_size": args.catalog_size,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "top_k": args.top_k,
+            "retrieval_mode": args.retrieval_mode,
+            "embedding_model": args.embedding_model,
+            "seed": args.seed
+        },
+        "chroma_exact": chroma_exact,
+        "runs": runs
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"vector_store_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
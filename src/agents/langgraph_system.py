@@ -1,17 +1,41 @@
 # src/agents/langgraph_system.py
-from typing import Dict, TypedDict
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple, TypedDict
 from langgraph.graph import StateGraph, END
 from src.agents.retriever_agent import RetrieverAgent
 from src.agents.responder_agent import ResponderAgent
+from src.agents.router_agent import RouterAgent
+from src.rag.conversation import Turn
+from src.rag.fields import SearchFilters
+from src.rag.registry import get_conversation_store
+from src.utils.metrics import pipeline_label, record_error, track_request
 
 class AgentState(TypedDict):
     """State shared between agents"""
     query: str
-    user_id: str
+    user_id: Optional[str]
+    # Structured constraints for retrieval (price range, ingredient, skin type)
+    filters: Optional[SearchFilters]
+    # The user's earlier turns when the query follows up on them
+    history: Optional[List[Turn]]
     retrieved_docs: list
     final_response: str
     retriever_status: str
     responder_status: str
+    # Response cache keys from retrieval, and whether the answer was cached
+    query_embedding: Optional[list]
+    index_version: str
+    # Routing decision: "fast_path" answers from document fields and skips the responder
+    route: Optional[dict]
+    cache_hit: bool
+    # Prompt size actually sent to the LLM
+    docs_used: int
+    context_tokens: int
+    context_truncated: bool
+    # Set when the responder fails: message, HTTP status and Retry-After
+    error: Optional[dict]
+    # Only set on the streaming graph: nodes push events for the client here
+    event_queue: Optional[asyncio.Queue]
 
 class LangGraphMultiAgentSystem:
     """
@@ -20,78 +44,335 @@ class LangGraphMultiAgentSystem:
     """
     
     def __init__(self):
+        # RetrieverAgent resolves the same process-wide retriever as MultiAgentSystem
         self.retriever_agent = RetrieverAgent()
         self.responder_agent = ResponderAgent()
+        self.router_agent = RouterAgent()
+        # Per-user turns, shared with MultiAgentSystem
+        self.conversations = get_conversation_store()
         self.graph = self._build_graph()
+        self.async_graph = self._build_graph(mode="async")
+        self.stream_graph = self._build_graph(mode="stream")
+        # Metrics label, named after the endpoint
+        self.pipeline = "query-langgraph"
     
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self, mode: str = "sync") -> StateGraph:
         """Build the LangGraph workflow"""
         workflow = StateGraph(AgentState)
         
-        # Add nodes (agents)
-        workflow.add_node("retriever", self._retriever_node)
-        workflow.add_node("responder", self._responder_node)
+        # Add nodes (agents); async and stream graphs use non-blocking node variants
+        if mode == "async":
+            workflow.add_node("retriever", self._aretriever_node)
+            workflow.add_node("router", self._arouter_node)
+            workflow.add_node("responder", self._aresponder_node)
+        elif mode == "stream":
+            workflow.add_node("retriever", self._stream_retriever_node)
+            workflow.add_node("router", self._stream_router_node)
+            workflow.add_node("responder", self._stream_responder_node)
+        else:
+            workflow.add_node("retriever", self._retriever_node)
+            workflow.add_node("router", self._router_node)
+            workflow.add_node("responder", self._responder_node)
         
-        # Define the flow
+        # Define the flow: failed searches end at the retriever, fast-path answers at the router
         workflow.set_entry_point("retriever")
-        workflow.add_edge("retriever", "responder")
+        workflow.add_conditional_edges("retriever", self._retrieval_path, {"failed": END, "found": "router"})
+        workflow.add_conditional_edges("router", self._route_path, {"fast_path": END, "llm": "responder"})
         workflow.add_edge("responder", END)
         
         return workflow.compile()
     
     def _retriever_node(self, state: AgentState) -> AgentState:
         """Retriever agent node"""
-        result = self.retriever_agent.run(state["query"])
-        
-        state["retrieved_docs"] = result["retrieved_docs"]
-        state["retriever_status"] = result["status"]
-        
-        return state
+        # The sync graph runs nodes on its own threads, outside the request context
+        with pipeline_label(self.pipeline):
+            result = self.retriever_agent.run(state["query"], filters=state["filters"], doc_ids=self._doc_ids(state))
+        return self._apply_retrieval(state, result)
+    
+    def _router_node(self, state: AgentState) -> AgentState:
+        """Router agent node: answers single-field lookups without the LLM"""
+        with pipeline_label(self.pipeline):
+            result = self.router_agent.run(state["query"], state["retrieved_docs"])
+        return self._apply_route(state, result)
     
     def _responder_node(self, state: AgentState) -> AgentState:
         """Responder agent node"""
-        result = self.responder_agent.run(
-            state["query"], 
-            state["retrieved_docs"]
+        with pipeline_label(self.pipeline):
+            result = self.responder_agent.run(
+                state["query"], 
+                state["retrieved_docs"],
+                state["query_embedding"],
+                state["index_version"],
+                state["history"]
+            )
+        
+        return self._apply_response(state, result)
+    
+    async def _aretriever_node(self, state: AgentState) -> AgentState:
+        """Async retriever agent node"""
+        result = await self.retriever_agent.arun(state["query"], filters=state["filters"], doc_ids=self._doc_ids(state))
+        return self._apply_retrieval(state, result)
+    
+    async def _arouter_node(self, state: AgentState) -> AgentState:
+        """Async router agent node; routing is cheap enough to run on the event loop"""
+        result = self.router_agent.run(state["query"], state["retrieved_docs"])
+        return self._apply_route(state, result)
+    
+    async def _aresponder_node(self, state: AgentState) -> AgentState:
+        """Async responder agent node"""
+        result = await self.responder_agent.arun(
+            state["query"],
+            state["retrieved_docs"],
+            state["query_embedding"],
+            state["index_version"],
+            state["history"]
         )
         
+        return self._apply_response(state, result)
+    
+    async def _stream_retriever_node(self, state: AgentState) -> AgentState:
+        """Retriever node that publishes document metadata once search finishes"""
+        state = await self._aretriever_node(state)
+        if state["error"]:
+            return state
+        
+        await state["event_queue"].put({
+            "type": "retrieval",
+            "docs": self.retriever_agent.summarize_docs(state["retrieved_docs"])
+        })
+        return state
+    
+    async def _stream_router_node(self, state: AgentState) -> AgentState:
+        """Router node that publishes a fast-path answer as a single token"""
+        state = await self._arouter_node(state)
+        
+        if state["route"]["path"] == "fast_path":
+            await state["event_queue"].put({"type": "token", "content": state["final_response"]})
+        return state
+    
+    async def _stream_responder_node(self, state: AgentState) -> AgentState:
+        """Responder node that publishes tokens as they are generated"""
+        async for event in self.responder_agent.astream(
+            state["query"],
+            state["retrieved_docs"],
+            state["query_embedding"],
+            state["index_version"],
+            state["history"]
+        ):
+            if event["type"] == "token":
+                await state["event_queue"].put(event)
+            else:
+                state = self._apply_response(state, event["result"])
+        
+        return state
+    
+    def _apply_route(self, state: AgentState, result: Dict) -> AgentState:
+        """Records the routing decision; a fast-path result also fills in the response"""
+        state["route"] = self.router_agent.summarize(result)
+        if result["path"] == "fast_path":
+            state = self._apply_response(state, result)
+        return state
+    
+    @staticmethod
+    def _doc_ids(state: AgentState) -> Optional[List[str]]:
+        """Documents a follow-up is answered from: those of the previous turn"""
+        return list(state["history"][-1].doc_ids) if state["history"] else None
+    
+    @staticmethod
+    def _apply_retrieval(state: AgentState, result: Dict) -> AgentState:
+        """Copies a retriever result into the graph state; a failed search sets the error"""
+        state["retrieved_docs"] = result["retrieved_docs"]
+        state["retriever_status"] = result["status"]
+        state["query_embedding"] = result["query_embedding"]
+        state["index_version"] = result["index_version"]
+        # A query the previous documents don't answer was searched for afresh
+        state["history"] = state["history"] if result["follow_up"] else None
+        if result["status"] == "error":
+            state["final_response"] = "Error in document search"
+            state["error"] = {key: result.get(key) for key in ("error", "status_code", "retry_after")}
+        return state
+    
+    @staticmethod
+    def _retrieval_path(state: AgentState) -> str:
+        """Conditional edge out of the retriever: nothing to route or answer after a failed search"""
+        return "failed" if state["retriever_status"] == "error" else "found"
+    
+    @staticmethod
+    def _route_path(state: AgentState) -> str:
+        """Conditional edge out of the router"""
+        return state["route"]["path"]
+    
+    @staticmethod
+    def _apply_response(state: AgentState, result: Dict) -> AgentState:
+        """Copies a responder result into the graph state"""
         state["final_response"] = result["response"]
         state["responder_status"] = result["status"]
-        
+        state["cache_hit"] = result["cache_hit"]
+        state["docs_used"] = result["docs_used"]
+        state["context_tokens"] = result["context_tokens"]
+        state["context_truncated"] = result["context_truncated"]
+        if result["status"] == "error":
+            state["error"] = {key: result.get(key) for key in ("error", "status_code", "retry_after")}
         return state
     
-    def process_query(self, query: str, user_id: str = "default") -> Dict:
-        """Process query using LangGraph workflow"""
-        initial_state = AgentState(
+    def process_query(self, query: str, user_id: Optional[str] = None,
+                      filters: Optional[SearchFilters] = None) -> Dict:
+        """
+        Process query using LangGraph workflow. With a user_id the turn is
+        remembered, and a follow-up is answered from the previous turn's documents.
+        """
+        # Execute the graph
+        with track_request(self.pipeline):
+            history = self._recall(user_id, query, filters)
+            final_state = self.graph.invoke(self._initial_state(query, user_id, filters, history))
+        return self._remember(self._format_result(query, user_id, final_state), final_state)
+    
+    async def aprocess_query(self, query: str, user_id: Optional[str] = None,
+                             filters: Optional[SearchFilters] = None) -> Dict:
+        """Process query using the async LangGraph workflow"""
+        with track_request(self.pipeline):
+            history = await self._arecall(user_id, query, filters)
+            final_state = await self.async_graph.ainvoke(self._initial_state(query, user_id, filters, history))
+        return await self._aremember(self._format_result(query, user_id, final_state), final_state)
+    
+    async def astream_query(self, query: str, user_id: Optional[str] = None,
+                            filters: Optional[SearchFilters] = None) -> AsyncIterator[Dict]:
+        """
+        Runs the streaming graph and yields the events its nodes publish
+        ("retrieval", then "token"s), followed by a final "done" event, or
+        "error" if the responder failed
+        """
+        with track_request(self.pipeline):
+            history = await self._arecall(user_id, query, filters)
+            queue = asyncio.Queue()
+            # The graph task inherits the pipeline label when it is created
+            task = asyncio.ensure_future(
+                self.stream_graph.ainvoke(self._initial_state(query, user_id, filters, history, queue))
+            )
+            # Sentinel so the consumer stops once the graph has finished
+            task.add_done_callback(lambda _: queue.put_nowait(None))
+            
+            try:
+                while True:
+                    event = await queue.get()
+                    if event is None:
+                        break
+                    yield event
+                
+                final_state = await task
+                result = await self._aremember(self._format_result(query, user_id, final_state), final_state)
+                yield {"type": "done" if result["status"] == "success" else "error", "result": result}
+            
+            except Exception as e:
+                record_error("system")
+                yield {
+                    "type": "error",
+                    "result": {
+                        "system": "LangGraphMultiAgentSystem",
+                        "query": query,
+                        "status": "error",
+                        "error": str(e)
+                    }
+                }
+            finally:
+                task.cancel()
+    
+    @staticmethod
+    def _searches(filters: Optional[SearchFilters]) -> bool:
+        """Filtered queries always search, even if they follow up on the previous turn"""
+        return filters is not None and not filters.is_empty()
+    
+    def _recall(self, user_id: Optional[str], query: str, filters: Optional[SearchFilters]) -> Optional[List[Turn]]:
+        """The user's earlier turns if the query follows up on them"""
+        return None if self._searches(filters) else self.conversations.recall(user_id, query)
+    
+    async def _arecall(self, user_id: Optional[str], query: str,
+                       filters: Optional[SearchFilters]) -> Optional[List[Turn]]:
+        """Async variant of _recall; SQLite sessions are read on the executor"""
+        return None if self._searches(filters) else await self.conversations.arecall(user_id, query)
+    
+    @staticmethod
+    def _initial_state(query: str, user_id: Optional[str], filters: Optional[SearchFilters] = None,
+                       history: Optional[List[Turn]] = None,
+                       event_queue: Optional[asyncio.Queue] = None) -> AgentState:
+        """Initial graph state for a query, with the user's turns if it is a follow-up"""
+        return AgentState(
             query=query,
             user_id=user_id,
+            filters=filters,
+            history=history,
             retrieved_docs=[],
             final_response="",
             retriever_status="",
-            responder_status=""
+            responder_status="",
+            query_embedding=None,
+            index_version="",
+            route=None,
+            cache_hit=False,
+            docs_used=0,
+            context_tokens=0,
+            context_truncated=False,
+            error=None,
+            event_queue=event_queue
         )
-        
-        # Execute the graph
-        final_state = self.graph.invoke(initial_state)
-        
-        return {
+    
+    @staticmethod
+    def _turn(result: Dict, final_state: AgentState) -> Optional[Tuple[List[str], bool]]:
+        """
+        What a successful result leaves in the user's session: the document a
+        fast-path answer came from, or else every retrieved document, and
+        whether they were reused from the previous turn
+        """
+        if result["status"] != "success":
+            return None
+        route = final_state["route"] or {}
+        doc_ids = [route["doc_id"]] if route.get("doc_id") else [doc["id"] for doc in final_state["retrieved_docs"]]
+        return doc_ids, result["agent_results"]["retriever"]["follow_up"]
+    
+    def _remember(self, result: Dict, final_state: AgentState) -> Dict:
+        """Records an answered query in the user's session"""
+        turn = self._turn(result, final_state)
+        if turn is not None:
+            self.conversations.record(final_state["user_id"], final_state["query"], result["final_response"], *turn)
+        return result
+    
+    async def _aremember(self, result: Dict, final_state: AgentState) -> Dict:
+        """Async variant of _remember; SQLite sessions are written on the executor"""
+        turn = self._turn(result, final_state)
+        if turn is not None:
+            await self.conversations.arecord(
+                final_state["user_id"], final_state["query"], result["final_response"], *turn
+            )
+        return result
+    
+    def _format_result(self, query: str, user_id: Optional[str], final_state: AgentState) -> Dict:
+        """Builds the system result from the final graph state"""
+        result = {
             "system": "LangGraphMultiAgentSystem",
             "query": query,
             "user_id": user_id,
             "final_response": final_state["final_response"],
             "retrieved_docs": final_state["retrieved_docs"],
-            "status": "success",
+            "status": "error" if final_state["error"] else "success",
             "agent_results": {
                 "retriever": {
                     "status": final_state["retriever_status"],
-                    "docs_found": len(final_state["retrieved_docs"])
+                    "docs_found": len(final_state["retrieved_docs"]),
+                    "follow_up": final_state["history"] is not None
                 },
                 "responder": {
                     "status": final_state["responder_status"],
-                    "docs_used": len(final_state["retrieved_docs"])
-                }
+                    "docs_used": final_state["docs_used"],
+                    "cache_hit": final_state["cache_hit"],
+                    "context_tokens": final_state["context_tokens"],
+                    "context_truncated": final_state["context_truncated"]
+                },
+                "router": final_state["route"]
             }
         }
+        if final_state["error"]:
+            result.update(final_state["error"])
+        return result
     
     def get_system_info(self) -> Dict:
         """System information"""
@@ -101,7 +382,8 @@ class LangGraphMultiAgentSystem:
             "framework": "LangGraph",
             "agents": {
                 "retriever": self.retriever_agent.get_info(),
+                "router": self.router_agent.get_info(),
                 "responder": self.responder_agent.get_info()
             },
-            "workflow": ["retriever", "responder"]
+            "workflow": ["retriever", "router", "responder"]
         }
\ No newline at end of file
@@ -1,80 +1,361 @@
 # src/agents/multi_agent_system.py
-from typing import Dict
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from src.agents.retriever_agent import RetrieverAgent
 from src.agents.responder_agent import ResponderAgent
-from src.rag.retriever import DocumentRetriever
+from src.agents.router_agent import RouterAgent
+from src.rag.conversation import Turn
+from src.rag.embeddings import EmbeddingEncoder
+from src.rag.fields import SearchFilters
+from src.rag.registry import get_conversation_store, get_retriever
+from src.utils.config import Config
+from src.utils.logger import get_logger
+from src.utils.singleflight import SingleFlight
+from src.utils.metrics import record_error, track_request
+
+logger = get_logger(__name__)
 
 class MultiAgentSystem:
     """
     Multi-agent system coordinator for RAG
     """
     def __init__(self):
-        # Create shared retriever instance
-        self.shared_retriever = DocumentRetriever()
+        # Resolve the process-wide retriever (also used by the LangGraph system)
+        self.shared_retriever = get_retriever()
         
         # Pass shared retriever to agents
         self.retriever_agent = RetrieverAgent(shared_retriever=self.shared_retriever)
         self.responder_agent = ResponderAgent()
+        self.router_agent = RouterAgent()
         self.system_name = "MultiAgentRAGSystem"
+        # Metrics label, named after the endpoint
+        self.pipeline = "query"
+        # Identical queries arriving together share one retrieval and LLM call
+        self.single_flight = SingleFlight() if Config.COALESCE_REQUESTS else None
+        # Per-user turns, shared with the LangGraph system
+        self.conversations = get_conversation_store()
+    
+    @staticmethod
+    def _flight_key(query: str, top_k: int, filters: Optional[SearchFilters]):
+        """Requests with the same key get the same answer"""
+        return EmbeddingEncoder.normalize_query(query), top_k, filters
+    
+    @staticmethod
+    def _searches(filters: Optional[SearchFilters]) -> bool:
+        """Filtered queries always search, even if they follow up on the previous turn"""
+        return filters is not None and not filters.is_empty()
+    
+    def _recall(self, user_id: Optional[str], query: str, filters: Optional[SearchFilters]) -> Optional[List[Turn]]:
+        """The user's earlier turns if the query follows up on them"""
+        return None if self._searches(filters) else self.conversations.recall(user_id, query)
     
-    def process_query(self, query: str, top_k: int = 3) -> Dict:
+    async def _arecall(self, user_id: Optional[str], query: str,
+                       filters: Optional[SearchFilters]) -> Optional[List[Turn]]:
+        """Async variant of _recall; SQLite sessions are read on the executor"""
+        return None if self._searches(filters) else await self.conversations.arecall(user_id, query)
+    
+    @staticmethod
+    def _turn(result: Dict) -> Optional[Tuple[List[str], bool]]:
         """
-        Processes a query using the multi-agent pipeline
+        What a successful result leaves in the user's session: the document a
+        fast-path answer came from, or else every retrieved document, and
+        whether they were reused from the previous turn
         """
-        print(f"{self.system_name}: Starting processing of '{query}'")
+        if result["status"] != "success":
+            return None
+        route = result["agent_results"].get("router") or {}
+        doc_ids = [route["doc_id"]] if route.get("doc_id") else [doc["id"] for doc in result["retrieved_docs"]]
+        return doc_ids, result["agent_results"]["retriever"]["follow_up"]
+    
+    def _remember(self, user_id: Optional[str], query: str, result: Dict):
+        """Records an answered query in the user's session"""
+        turn = self._turn(result)
+        if turn is not None:
+            self.conversations.record(user_id, query, result["final_response"], *turn)
+    
+    async def _aremember(self, user_id: Optional[str], query: str, result: Dict):
+        """Async variant of _remember; SQLite sessions are written on the executor"""
+        turn = self._turn(result)
+        if turn is not None:
+            await self.conversations.arecord(user_id, query, result["final_response"], *turn)
+    
+    @staticmethod
+    def _doc_ids(history: Optional[List[Turn]]) -> Optional[List[str]]:
+        """Documents a follow-up is answered from: those of the previous turn"""
+        return list(history[-1].doc_ids) if history else None
+    
+    def process_query(self, query: str, top_k: int = 3, filters: Optional[SearchFilters] = None,
+                      user_id: Optional[str] = None) -> Dict:
+        """
+        Processes a query using the multi-agent pipeline; filters restrict
+        retrieval to matching products. Concurrent identical queries are
+        coalesced into one pipeline run. With a user_id the turn is
+        remembered, and a follow-up to the user's previous turn is answered
+        from its documents, outside coalescing since it depends on the user.
+        """
+        with track_request(self.pipeline):
+            history = self._recall(user_id, query, filters)
+            if history is not None or self.single_flight is None:
+                result = self._process_query(query, top_k, filters, history)
+            else:
+                result = self.single_flight.do(
+                    self._flight_key(query, top_k, filters), self._process_query, query, top_k, filters
+                )
+            self._remember(user_id, query, result)
+            return result
+    
+    def _process_query(self, query: str, top_k: int, filters: Optional[SearchFilters],
+                       history: Optional[List[Turn]] = None) -> Dict:
+        """Body of process_query, run once per set of coalesced requests"""
+        logger.debug("Starting processing", extra={"system": self.system_name, "query": query})
         
         try:
-            # STEP 1: Retriever Agent searches for documents
-            retrieval_result = self.retriever_agent.run(query, top_k)
+            # STEP 1: Retriever Agent searches for documents (or fetches a follow-up's)
+            retrieval_result = self.retriever_agent.run(query, top_k, filters, self._doc_ids(history))
             
             if retrieval_result["status"] == "error":
-                return {
-                    "system": self.system_name,
-                    "query": query,
-                    "final_response": "Error in document search",
-                    "retrieved_docs": [],
-                    "status": "error",
-                    "error": retrieval_result.get("error", "Unknown error")
-                }
+                return self._retrieval_error(query, retrieval_result)
+            # A query the previous documents don't answer was searched for afresh
+            history = history if retrieval_result["follow_up"] else None
             
-            # STEP 2: Responder Agent generates response
-            response_result = self.responder_agent.run(
-                query, 
-                retrieval_result["retrieved_docs"]
-            )
+            # STEP 2: Router Agent answers single-field lookups from the documents
+            route_result = self.router_agent.run(query, retrieval_result["retrieved_docs"])
             
-            # STEP 3: Combine results
-            final_result = {
-                "system": self.system_name,
-                "query": query,
-                "final_response": response_result["response"],
-                "retrieved_docs": retrieval_result["retrieved_docs"],
-                "status": response_result["status"],
-                "agent_results": {
-                    "retriever": {
-                        "docs_found": retrieval_result["doc_count"],
-                        "status": retrieval_result["status"]
-                    },
-                    "responder": {
-                        "docs_used": response_result["docs_used"],
-                        "status": response_result["status"]
-                    }
-                }
-            }
+            # STEP 3: Responder Agent generates response for everything else
+            if route_result["path"] == "fast_path":
+                response_result = route_result
+            else:
+                response_result = self.responder_agent.run(
+                    query, 
+                    retrieval_result["retrieved_docs"],
+                    retrieval_result["query_embedding"],
+                    retrieval_result["index_version"],
+                    history
+                )
             
-            print(f"{self.system_name}: Processing completed")
-            return final_result
+            # STEP 4: Combine results
+            return self._combine_results(query, retrieval_result, response_result, route_result)
+        
+        except Exception as e:
+            return self._system_error(query, e)
+    
+    async def aprocess_query(self, query: str, top_k: int = 3, filters: Optional[SearchFilters] = None,
+                             user_id: Optional[str] = None) -> Dict:
+        """
+        Async variant of process_query; safe to await from the API event loop
+        """
+        with track_request(self.pipeline):
+            history = await self._arecall(user_id, query, filters)
+            if history is not None or self.single_flight is None:
+                result = await self._aprocess_query(query, top_k, filters, history)
+            else:
+                result = await self.single_flight.ado(
+                    self._flight_key(query, top_k, filters), self._aprocess_query, query, top_k, filters
+                )
+            await self._aremember(user_id, query, result)
+            return result
+    
+    async def _aprocess_query(self, query: str, top_k: int, filters: Optional[SearchFilters],
+                              history: Optional[List[Turn]] = None) -> Dict:
+        """Body of aprocess_query, run once per set of coalesced requests"""
+        logger.debug("Starting processing", extra={"system": self.system_name, "query": query})
+        
+        try:
+            retrieval_result = await self.retriever_agent.arun(query, top_k, filters, self._doc_ids(history))
+            
+            if retrieval_result["status"] == "error":
+                return self._retrieval_error(query, retrieval_result)
+            history = history if retrieval_result["follow_up"] else None
+            
+            route_result = self.router_agent.run(query, retrieval_result["retrieved_docs"])
+            if route_result["path"] == "fast_path":
+                response_result = route_result
+            else:
+                response_result = await self.responder_agent.arun(
+                    query,
+                    retrieval_result["retrieved_docs"],
+                    retrieval_result["query_embedding"],
+                    retrieval_result["index_version"],
+                    history
+                )
             
+            return self._combine_results(query, retrieval_result, response_result, route_result)
+        
         except Exception as e:
-            print(f"{self.system_name}: System error - {e}")
-            return {
-                "system": self.system_name,
-                "query": query,
-                "final_response": f"System error: {str(e)}",
-                "retrieved_docs": [],
-                "status": "system_error",
-                "error": str(e)
+            return self._system_error(query, e)
+    
+    async def astream_query(self, query: str, top_k: int = 3, filters: Optional[SearchFilters] = None,
+                            user_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of aprocess_query. Yields a "retrieval" event with
+        document metadata as soon as search finishes, "token" events while the
+        response is generated, and a final "done" event with the combined
+        result, or "error" if any stage failed.
+        """
+        logger.debug("Starting streamed processing", extra={"system": self.system_name, "query": query})
+        
+        with track_request(self.pipeline):
+            try:
+                history = await self._arecall(user_id, query, filters)
+                retrieval_result = await self.retriever_agent.arun(query, top_k, filters, self._doc_ids(history))
+                
+                if retrieval_result["status"] == "error":
+                    yield {"type": "error", "result": self._retrieval_error(query, retrieval_result)}
+                    return
+                history = history if retrieval_result["follow_up"] else None
+                
+                yield {
+                    "type": "retrieval",
+                    "docs": self.retriever_agent.summarize_docs(retrieval_result["retrieved_docs"])
+                }
+                
+                route_result = self.router_agent.run(query, retrieval_result["retrieved_docs"])
+                if route_result["path"] == "fast_path":
+                    # The whole answer is known already: send it as a single token
+                    response_result = route_result
+                    yield {"type": "token", "content": route_result["response"]}
+                else:
+                    response_result = None
+                    async for event in self.responder_agent.astream(
+                        query,
+                        retrieval_result["retrieved_docs"],
+                        retrieval_result["query_embedding"],
+                        retrieval_result["index_version"],
+                        history
+                    ):
+                        if event["type"] == "token":
+                            yield event
+                        else:
+                            response_result = event["result"]
+                
+                result = self._combine_results(query, retrieval_result, response_result, route_result)
+                await self._aremember(user_id, query, result)
+                yield {"type": "done" if result["status"] == "success" else "error", "result": result}
+            
+            except Exception as e:
+                yield {"type": "error", "result": self._system_error(query, e)}
+    
+    async def aprocess_batch(self, queries: List[str], top_k: int = 3,
+                             filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """
+        Processes many queries: one embedding pass and one vector search for
+        the whole batch, then LLM calls with at most BATCH_LLM_CONCURRENCY in
+        flight. Results come back in input order, each with its own status.
+        Filters apply to every query.
+        """
+        logger.debug("Starting batch", extra={"system": self.system_name, "queries": len(queries)})
+        
+        with track_request("query-batch"):
+            return await self._aprocess_batch(queries, top_k, filters)
+    
+    async def _aprocess_batch(self, queries: List[str], top_k: int,
+                              filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """Body of aprocess_batch, timed as a single request"""
+        # Blank queries fail individually instead of failing the whole batch
+        valid = [i for i, query in enumerate(queries) if query.strip()]
+        batch = await self.retriever_agent.arun_batch([queries[i] for i in valid], top_k, filters) if valid else []
+        retrieval_results = dict(zip(valid, batch))
+        semaphore = asyncio.Semaphore(Config.BATCH_LLM_CONCURRENCY)
+        
+        async def answer(position: int, query: str) -> Dict:
+            if position not in retrieval_results:
+                return self._retrieval_error(query, {"error": "Empty query", "status_code": 400})
+            
+            retrieval_result = retrieval_results[position]
+            if retrieval_result["status"] == "error":
+                return self._retrieval_error(query, retrieval_result)
+            
+            try:
+                route_result = self.router_agent.run(query, retrieval_result["retrieved_docs"])
+                if route_result["path"] == "fast_path":
+                    return self._combine_results(query, retrieval_result, route_result, route_result)
+                
+                async with semaphore:
+                    response_result = await self.responder_agent.arun(
+                        query,
+                        retrieval_result["retrieved_docs"],
+                        retrieval_result["query_embedding"],
+                        retrieval_result["index_version"]
+                    )
+                return self._combine_results(query, retrieval_result, response_result, route_result)
+            except Exception as e:
+                return self._system_error(query, e)
+        
+        results = await asyncio.gather(*(answer(i, query) for i, query in enumerate(queries)))
+        logger.debug("Batch completed", extra={"system": self.system_name, "queries": len(queries)})
+        return list(results)
+    
+    def process_batch(self, queries: List[str], top_k: int = 3,
+                      filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """
+        Synchronous entry point to aprocess_batch for offline evaluation and
+        enrichment jobs; must not be called from a running event loop
+        """
+        return asyncio.run(self.aprocess_batch(queries, top_k, filters))
+    
+    def _combine_results(self, query: str, retrieval_result: Dict, response_result: Dict,
+                         route_result: Optional[Dict] = None) -> Dict:
+        """
+        Combines the agent results into the final system result. On the fast
+        path the router's answer stands in for the responder's.
+        """
+        final_result = {
+            "system": self.system_name,
+            "query": query,
+            "final_response": response_result["response"],
+            "retrieved_docs": retrieval_result["retrieved_docs"],
+            "status": response_result["status"],
+            "agent_results": {
+                "retriever": {
+                    "docs_found": retrieval_result["doc_count"],
+                    "status": retrieval_result["status"],
+                    "follow_up": retrieval_result["follow_up"]
+                },
+                "responder": {
+                    "docs_used": response_result["docs_used"],
+                    "status": response_result["status"],
+                    "cache_hit": response_result.get("cache_hit", False),
+                    "context_tokens": response_result.get("context_tokens", 0),
+                    "context_truncated": response_result.get("context_truncated", False)
+                }
             }
+        }
+        if route_result is not None:
+            final_result["agent_results"]["router"] = self.router_agent.summarize(route_result)
+        
+        if "error" in response_result:
+            final_result["error"] = response_result["error"]
+            final_result["status_code"] = response_result.get("status_code", 500)
+            final_result["retry_after"] = response_result.get("retry_after")
+        
+        logger.debug("Processing completed", extra={"system": self.system_name, "status": final_result["status"]})
+        return final_result
+    
+    def _retrieval_error(self, query: str, retrieval_result: Dict) -> Dict:
+        """Result returned when the retriever agent fails, with the HTTP status its error calls for"""
+        return {
+            "system": self.system_name,
+            "query": query,
+            "final_response": "Error in document search",
+            "retrieved_docs": [],
+            "status": "error",
+            "error": retrieval_result.get("error", "Unknown error"),
+            "status_code": retrieval_result.get("status_code", 503),
+            "retry_after": retrieval_result.get("retry_after")
+        }
+    
+    def _system_error(self, query: str, error: Exception) -> Dict:
+        """Result returned on unexpected pipeline errors"""
+        record_error("system")
+        logger.error("System error", extra={"system": self.system_name, "query": query, "error": str(error)})
+        return {
+            "system": self.system_name,
+            "query": query,
+            "final_response": f"System error: {str(error)}",
+            "retrieved_docs": [],
+            "status": "system_error",
+            "error": str(error)
+        }
     
     def get_system_info(self) -> Dict:
         """Information about the complete system"""
@@ -83,6 +364,8 @@ class MultiAgentSystem:
             "description": "Multi-agent RAG system with search and generation",
             "agents": {
                 "retriever": self.retriever_agent.get_info(),
+                "router": self.router_agent.get_info(),
                 "responder": self.responder_agent.get_info()
-            }
+            },
+            "request_coalescing": self.single_flight.stats() if self.single_flight else None
         }
\ No newline at end of file
@@ -1,52 +1,171 @@
 # src/agents/responder_agent.py
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
+from src.rag.context_builder import BuiltContext
+from src.rag.conversation import Turn
 from src.rag.generator import ResponseGenerator
+from src.rag.registry import get_response_cache
+from src.rag.response_cache import SemanticResponseCache
+from src.utils.concurrency import run_in_executor
+from src.utils.config import Config
+from src.utils.logger import get_logger
+from src.utils.metrics import record_error
+
+logger = get_logger(__name__)
 
 class ResponderAgent:
     """
     Agent specialized in generating responses based on documents
     """
-    def __init__(self):
+    def __init__(self, response_cache: Optional[SemanticResponseCache] = None):
         self.generator = ResponseGenerator()
         self.agent_name = "ResponderAgent"
+        if response_cache is None and Config.RESPONSE_CACHE_ENABLED:
+            response_cache = get_response_cache()
+        self.response_cache = response_cache
+    
+    def run(self, query: str, retrieved_docs: List[Dict], query_embedding: Optional[List[float]] = None,
+            index_version: str = "", history: Optional[List[Turn]] = None) -> Dict:
+        """
+        Executes response generation. When the query embedding is given, a
+        cached answer for an equivalent query over the same documents is
+        returned instead of calling the LLM. History holds the earlier turns
+        a follow-up query refers to.
+        """
+        logger.debug("Generating response", extra={"agent": self.agent_name, "query": query})
+        
+        try:
+            cached = self._cache_lookup(query_embedding, retrieved_docs, index_version)
+            if cached is not None:
+                return self._success_result(query, cached, retrieved_docs, cache_hit=True)
+            
+            # Generate response using the documents that fit the token budget
+            context = self.generator.build_context(retrieved_docs)
+            response = self.generator.generate_response(query, retrieved_docs, context, history)
+            self._cache_store(query_embedding, retrieved_docs, index_version, response)
+            return self._success_result(query, response, retrieved_docs, context=context)
+        
+        except Exception as e:
+            return self._error_result(query, e)
     
-    def run(self, query: str, retrieved_docs: List[Dict]) -> Dict:
+    async def arun(self, query: str, retrieved_docs: List[Dict], query_embedding: Optional[List[float]] = None,
+                   index_version: str = "", history: Optional[List[Turn]] = None) -> Dict:
         """
-        Executes response generation
+        Async variant of run using the non-blocking OpenAI client
         """
-        print(f"{self.agent_name}: Generating response for '{query}'")
+        logger.debug("Generating response", extra={"agent": self.agent_name, "query": query})
         
         try:
-            # Generate response using documents
-            response = self.generator.generate_response(query, retrieved_docs)
+            cached = self._cache_lookup(query_embedding, retrieved_docs, index_version)
+            if cached is not None:
+                return self._success_result(query, cached, retrieved_docs, cache_hit=True)
             
-            # Prepare result
-            result = {
-                "agent": self.agent_name,
-                "query": query,
-                "response": response,
-                "status": "success",
-                "docs_used": len(retrieved_docs)
-            }
+            # Token counting over every document is CPU-bound: keep it off the event loop
+            context = await run_in_executor(self.generator.build_context, retrieved_docs)
+            response = await self.generator.agenerate_response(query, retrieved_docs, context, history)
+            self._cache_store(query_embedding, retrieved_docs, index_version, response)
+            return self._success_result(query, response, retrieved_docs, context=context)
+        
+        except Exception as e:
+            return self._error_result(query, e)
+    
+    async def astream(self, query: str, retrieved_docs: List[Dict],
+                      query_embedding: Optional[List[float]] = None, index_version: str = "",
+                      history: Optional[List[Turn]] = None) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of run. Yields {"type": "token"} events as text
+        arrives, then a single {"type": "result"} event carrying the same
+        dictionary run would have returned.
+        """
+        logger.debug("Streaming response", extra={"agent": self.agent_name, "query": query})
+        
+        parts = []
+        try:
+            cached = self._cache_lookup(query_embedding, retrieved_docs, index_version)
+            if cached is not None:
+                yield {"type": "token", "content": cached}
+                yield {"type": "result", "result": self._success_result(query, cached, retrieved_docs, cache_hit=True)}
+                return
             
-            print(f"{self.agent_name}: Response generated successfully")
-            return result
+            context = await run_in_executor(self.generator.build_context, retrieved_docs)
+            async for token in self.generator.astream_response(query, retrieved_docs, context, history):
+                parts.append(token)
+                yield {"type": "token", "content": token}
             
+            response = "".join(parts).strip()
+            self._cache_store(query_embedding, retrieved_docs, index_version, response)
+            result = self._success_result(query, response, retrieved_docs, context=context)
+        
         except Exception as e:
-            print(f"{self.agent_name}: Error - {e}")
-            return {
-                "agent": self.agent_name,
-                "query": query,
-                "response": f"Sorry, I couldn't generate a response. Error: {str(e)}",
-                "status": "error",
-                "error": str(e),
-                "docs_used": 0
-            }
+            result = self._error_result(query, e)
+        
+        yield {"type": "result", "result": result}
+    
+    def _cache_lookup(self, query_embedding: Optional[List[float]], retrieved_docs: List[Dict],
+                      index_version: str) -> Optional[str]:
+        """Cached response for this query and documents, if any"""
+        if self.response_cache is None or query_embedding is None or not retrieved_docs:
+            return None
+        doc_ids = [doc["id"] for doc in retrieved_docs]
+        return self.response_cache.lookup(query_embedding, doc_ids, index_version)
+    
+    def _cache_store(self, query_embedding: Optional[List[float]], retrieved_docs: List[Dict],
+                     index_version: str, response: str):
+        """Caches a generated response"""
+        if self.response_cache is None or query_embedding is None or not retrieved_docs or not response:
+            return
+        doc_ids = [doc["id"] for doc in retrieved_docs]
+        self.response_cache.store(query_embedding, doc_ids, index_version, response)
+    
+    def _success_result(self, query: str, response: str, retrieved_docs: List[Dict],
+                        cache_hit: bool = False, context: Optional[BuiltContext] = None) -> Dict:
+        """
+        Prepares the result of a successful generation. Cached answers build
+        no prompt, so they report zero context tokens.
+        """
+        result = {
+            "agent": self.agent_name,
+            "query": query,
+            "response": response,
+            "status": "success",
+            "docs_used": context.docs_used if context else len(retrieved_docs),
+            "context_tokens": context.tokens if context else 0,
+            "context_truncated": context.truncated if context else False,
+            "cache_hit": cache_hit
+        }
+        
+        logger.debug(
+            "Response served from cache" if cache_hit else "Response generated",
+            extra={"agent": self.agent_name, "context_tokens": result["context_tokens"]}
+        )
+        return result
+    
+    def _error_result(self, query: str, error: Exception) -> Dict:
+        """
+        Prepares the result of a failed generation, with the HTTP status an
+        LLMError calls for (500 for anything else) and its Retry-After
+        """
+        record_error("generation")
+        logger.error("Generation failed", extra={"agent": self.agent_name, "query": query, "error": str(error)})
+        return {
+            "agent": self.agent_name,
+            "query": query,
+            "response": f"Sorry, I couldn't generate a response. Error: {str(error)}",
+            "status": "error",
+            "error": str(error),
+            "status_code": getattr(error, "status_code", 500),
+            "retry_after": getattr(error, "retry_after", None),
+            "docs_used": 0,
+            "context_tokens": 0,
+            "context_truncated": False,
+            "cache_hit": False
+        }
     
     def get_info(self) -> Dict:
         """Agent information"""
         return {
             "agent_name": self.agent_name,
-            "description": "Generates responses using OpenAI based on retrieved documents",
-            "model": self.generator.config.MODEL_NAME
-        }
\ No newline at end of file
+            "description": "Generates responses from retrieved documents with the configured generator backend",
+            "generator": self.generator.backend.info(),
+            "context_max_tokens": self.generator.context_builder.max_tokens,
+            "response_cache": self.response_cache.stats() if self.response_cache else None
+        }
@@ -1,47 +1,174 @@
 # src/agents/retriever_agent.py
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from src.rag.conversation import refers_to
+from src.rag.fields import SearchFilters
 from src.rag.retriever import DocumentRetriever
+from src.rag.registry import get_retriever
+from src.rag.reranker import CrossEncoderReranker
+from src.utils.config import Config
+from src.utils.concurrency import run_in_executor
+from src.utils.logger import get_logger
+from src.utils.metrics import record_docs, record_error, record_follow_up
+
+logger = get_logger(__name__)
 
 class RetrieverAgent:
     """
     Agent specialized in searching for relevant documents
     """
-    def __init__(self, shared_retriever: Optional[DocumentRetriever] = None):
-        self.retriever = shared_retriever if shared_retriever else DocumentRetriever()
+    def __init__(self, shared_retriever: Optional[DocumentRetriever] = None,
+                 reranker: Optional[CrossEncoderReranker] = None):
+        self.retriever = shared_retriever if shared_retriever else get_retriever()
+        # Optional second stage: retrieve RERANK_CANDIDATES, keep the top_k best by cross-encoder score
+        if reranker is None and Config.RERANK_ENABLED:
+            reranker = CrossEncoderReranker()
+        self.reranker = reranker
         self.agent_name = "RetrieverAgent"
     
-    def run(self, query: str, top_k: int = 3) -> Dict:
+    def run(self, query: str, top_k: int = 3, filters: Optional[SearchFilters] = None,
+            doc_ids: Optional[List[str]] = None) -> Dict:
         """
-        Executes document search
+        Executes document search, restricted to documents matching filters.
+        Given doc_ids (a follow-up to an earlier turn), those documents are
+        fetched instead, falling back to search if none is left or the query
+        names something they don't mention.
         """
-        print(f"{self.agent_name}: Searching documents for '{query}'")
+        logger.debug("Searching documents", extra={"agent": self.agent_name, "query": query})
         
         try:
             # Search for relevant documents
-            retrieved_docs = self.retriever.search(query, top_k)
+            retrieved_docs, query_embedding = self._search(query, top_k, filters, doc_ids)
+            return self._success_result(query, retrieved_docs, query_embedding)
             
-            # Prepare result
-            result = {
-                "agent": self.agent_name,
-                "query": query,
-                "retrieved_docs": retrieved_docs,
-                "status": "success",
-                "doc_count": len(retrieved_docs)
-            }
+        except Exception as e:
+            return self._error_result(query, e)
+    
+    async def arun(self, query: str, top_k: int = 3, filters: Optional[SearchFilters] = None,
+                   doc_ids: Optional[List[str]] = None) -> Dict:
+        """
+        Async variant of run; embedding and vector search are CPU-bound, so
+        they run on the bounded executor instead of the event loop
+        """
+        logger.debug("Searching documents", extra={"agent": self.agent_name, "query": query})
+        
+        try:
+            retrieved_docs, query_embedding = await run_in_executor(self._search, query, top_k, filters, doc_ids)
+            return self._success_result(query, retrieved_docs, query_embedding)
             
-            print(f"{self.agent_name}: Found {len(retrieved_docs)} documents")
-            return result
+        except Exception as e:
+            return self._error_result(query, e)
+    
+    def run_batch(self, queries: List[str], top_k: int = 3, filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """
+        Executes document search for many queries with a single vectorized
+        search. Returns one result per query, in input order.
+        """
+        logger.debug("Searching documents", extra={"agent": self.agent_name, "queries": len(queries)})
+        
+        try:
+            batch_docs, embeddings = self._search_batch(queries, top_k, filters)
+            return [
+                self._success_result(query, docs, embedding)
+                for query, docs, embedding in zip(queries, batch_docs, embeddings)
+            ]
+            
+        except Exception as e:
+            return [self._error_result(query, e) for query in queries]
+    
+    async def arun_batch(self, queries: List[str], top_k: int = 3,
+                         filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """Async variant of run_batch; the search runs on the bounded executor"""
+        logger.debug("Searching documents", extra={"agent": self.agent_name, "queries": len(queries)})
+        
+        try:
+            batch_docs, embeddings = await run_in_executor(self._search_batch, queries, top_k, filters)
+            return [
+                self._success_result(query, docs, embedding)
+                for query, docs, embedding in zip(queries, batch_docs, embeddings)
+            ]
             
         except Exception as e:
-            print(f"{self.agent_name}: Error - {e}")
-            return {
-                "agent": self.agent_name,
-                "query": query,
-                "retrieved_docs": [],
-                "status": "error",
-                "error": str(e),
-                "doc_count": 0
-            }
+            return [self._error_result(query, e) for query in queries]
+    
+    def _search_batch(self, queries: List[str], top_k: int,
+                      filters: Optional[SearchFilters] = None) -> Tuple[List[List[Dict]], List[List[float]]]:
+        """Batch counterpart of _search"""
+        batch_docs = self.retriever.search_batch(queries, self._candidates(top_k), filters=filters)
+        if self.reranker is not None:
+            batch_docs = self.reranker.rerank_batch(queries, batch_docs, top_k)
+        return batch_docs, self.retriever.embed_queries(queries)
+    
+    def _search(self, query: str, top_k: int, filters: Optional[SearchFilters] = None,
+                doc_ids: Optional[List[str]] = None) -> Tuple[List[Dict], Optional[List[float]]]:
+        """
+        Searches and returns the query embedding alongside the documents; the
+        embedding is served from the encoder's LRU cache, not recomputed.
+        With a reranker, a wider candidate set is retrieved and rescored.
+        Documents fetched by doc_ids come without an embedding: the query is
+        not embedded at all, and its answer is not cached.
+        """
+        if doc_ids:
+            retrieved_docs = self.retriever.get_documents(doc_ids)
+            if retrieved_docs and refers_to(query, retrieved_docs):
+                record_follow_up()
+                return retrieved_docs, None
+        retrieved_docs = self.retriever.search(query, self._candidates(top_k), filters=filters)
+        if self.reranker is not None:
+            retrieved_docs = self.reranker.rerank(query, retrieved_docs, top_k)
+        return retrieved_docs, self.retriever.embed_query(query)
+    
+    def _candidates(self, top_k: int) -> int:
+        """Documents to retrieve for top_k results"""
+        return max(top_k, Config.RERANK_CANDIDATES) if self.reranker is not None else top_k
+    
+    def _success_result(self, query: str, retrieved_docs: List[Dict],
+                        query_embedding: Optional[List[float]]) -> Dict:
+        """Prepares the result of a successful search"""
+        result = {
+            "agent": self.agent_name,
+            "query": query,
+            "retrieved_docs": retrieved_docs,
+            "status": "success",
+            "doc_count": len(retrieved_docs),
+            # Documents reused from the previous turn are the only ones without an embedding
+            "follow_up": query_embedding is None,
+            # Keys for the response cache
+            "query_embedding": query_embedding,
+            "index_version": self.retriever.index_version
+        }
+        
+        record_docs(len(retrieved_docs))
+        logger.debug("Documents found", extra={"agent": self.agent_name, "docs": len(retrieved_docs)})
+        return result
+    
+    def _error_result(self, query: str, error: Exception) -> Dict:
+        """
+        Prepares the result of a failed search, with the HTTP status the
+        error calls for: 503 by default, since the index is unavailable
+        """
+        record_error("retrieval")
+        logger.error("Retrieval failed", extra={"agent": self.agent_name, "query": query, "error": str(error)})
+        return {
+            "agent": self.agent_name,
+            "query": query,
+            "retrieved_docs": [],
+            "status": "error",
+            "error": str(error),
+            "status_code": getattr(error, "status_code", 503),
+            "retry_after": getattr(error, "retry_after", None),
+            "doc_count": 0,
+            "follow_up": False,
+            "query_embedding": None,
+            "index_version": ""
+        }
+    
+    @staticmethod
+    def summarize_docs(retrieved_docs: List[Dict]) -> List[Dict]:
+        """Document metadata without content, sent to clients ahead of the answer"""
+        return [
+            {"id": doc["id"], "metadata": doc["metadata"], "distance": doc["distance"]}
+            for doc in retrieved_docs
+        ]
     
     def get_info(self) -> Dict:
         """Agent information"""
@@ -49,5 +176,10 @@ class RetrieverAgent:
         return {
             "agent_name": self.agent_name,
             "description": "Searches for relevant documents using semantic embeddings",
-            "collection_info": collection_info
+            "collection_info": collection_info,
+            "reranker": {
+                "model": Config.RERANK_MODEL,
+                "candidates": Config.RERANK_CANDIDATES,
+                "budget_ms": self.reranker.budget_ms
+            } if self.reranker is not None else None
         }
\ No newline at end of file
@@ -0,0 +1,149 @@
+# src/agents/router_agent.py
+import re
+from typing import Dict, List, Optional, Tuple
+from src.rag.fields import field_lines
+from src.rag.lexical import tokenize
+from src.utils.config import Config
+from src.utils.logger import get_logger
+from src.utils.metrics import record_route
+
+logger = get_logger(__name__)
+
+# Single-field questions the router can answer without the LLM
+INTENT_PATTERNS = {
+    "price": re.compile(r"\b(price[sd]?|costs?|how much)\b"),
+    "ingredients": re.compile(r"\b(ingredients?|contains?|made (of|with)|composition)\b"),
+    "usage": re.compile(r"\b(usage|directions|instructions|how (do|should|can|to) (i |you |we )?(use|apply|take))\b")
+}
+# Comparisons and recommendations need reasoning over several documents
+OPEN_ENDED = re.compile(r"\b(which|compare|recommend\w*|suggest\w*|best|better|cheap\w*|vs|versus|or|than|difference)\b")
+# Words that describe the question rather than the product it is about
+QUESTION_WORDS = {
+    "a", "an", "and", "the", "is", "are", "of", "for", "to", "in", "on", "it", "its", "this", "that", "these",
+    "those", "they", "them", "their", "what", "whats", "how", "much", "do", "does", "did", "i", "you", "we",
+    "me", "my", "your", "s", "please", "tell", "about", "can", "could", "should", "would", "there", "product",
+    "with", "made", "price", "prices", "priced", "cost", "costs", "ingredient", "ingredients", "contain",
+    "contains", "composition", "use", "apply", "take", "usage", "directions", "instructions"
+}
+
+class RouterAgent:
+    """
+    Agent that decides whether a query needs the LLM. Questions asking for
+    one field (price, ingredients or usage) of a product that clearly
+    matches a single retrieved document are answered from that document's
+    fields directly; everything else goes to the ResponderAgent.
+    """
+    def __init__(self, min_confidence: float = None, enabled: bool = None):
+        self.agent_name = "RouterAgent"
+        self.enabled = Config.FAST_PATH_ENABLED if enabled is None else enabled
+        self.min_confidence = Config.FAST_PATH_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    
+    def run(self, query: str, retrieved_docs: List[Dict]) -> Dict:
+        """
+        Routes the query. A "fast_path" result also carries the answer under
+        the same keys as a ResponderAgent result, so it can stand in for one.
+        """
+        intent = self._intent(query)
+        doc, confidence = self._resolve(query, retrieved_docs) if intent else (None, 0.0)
+        answer = self._answer(intent, doc) if doc is not None and confidence >= self.min_confidence else None
+        
+        if not self.enabled or answer is None:
+            return self._route_result(query, "llm", intent, confidence, None)
+        
+        result = self._route_result(query, "fast_path", intent, confidence, doc["id"])
+        result.update({
+            "response": answer,
+            "status": "success",
+            "docs_used": 1,
+            "context_tokens": 0,
+            "context_truncated": False,
+            "cache_hit": False
+        })
+        return result
+    
+    @staticmethod
+    def _intent(query: str) -> Optional[str]:
+        """The single field the query asks for, or None"""
+        text = " ".join(tokenize(query))
+        if OPEN_ENDED.search(text):
+            return None
+        intents = [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(text)]
+        return intents[0] if len(intents) == 1 else None
+    
+    @staticmethod
+    def _resolve(query: str, retrieved_docs: List[Dict]) -> Tuple[Optional[Dict], float]:
+        """
+        The retrieved document whose product name the query refers to, and a
+        confidence in [0, 1]: the share of the query's product words that
+        match its name and no other retrieved document's name. A query naming
+        no product (a follow-up like "how much is it?") can only refer to
+        the document when there is just one.
+        """
+        terms = set(tokenize(query)) - QUESTION_WORDS
+        if not terms and len(retrieved_docs) == 1:
+            return retrieved_docs[0], 1.0
+        if not terms or not retrieved_docs:
+            return None, 0.0
+        
+        hits = sorted(
+            ((len(terms & set(tokenize(RouterAgent._title(doc)))), position) for position, doc in enumerate(retrieved_docs)),
+            key=lambda hit: (-hit[0], hit[1])
+        )
+        best, position = hits[0]
+        runner_up = hits[1][0] if len(hits) > 1 else 0
+        if best == 0:
+            return None, 0.0
+        return retrieved_docs[position], (best - runner_up) / len(terms)
+    
+    @staticmethod
+    def _title(doc: Dict) -> str:
+        """Product name: the chunk title if stored, else the document's first line"""
+        return doc["metadata"].get("title") or doc["content"].split("\n", 1)[0]
+    
+    def _answer(self, intent: str, doc: Dict) -> Optional[str]:
+        """Templated answer from the document's fields, None if the field is missing"""
+        title = self._title(doc)
+        lines = field_lines(doc["content"])
+        
+        if intent == "price":
+            price = doc["metadata"].get("price")
+            if price is not None:
+                return f"The {title} costs ${price:.2f}."
+            return f"The {title} costs {lines['price']}." if "price" in lines else None
+        if intent == "ingredients" and "ingredients" in lines:
+            return f"The {title} contains: {lines['ingredients']}."
+        if intent == "usage" and "usage" in lines:
+            return f"How to use the {title}: {lines['usage']}."
+        return None
+    
+    def _route_result(self, query: str, path: str, intent: Optional[str],
+                      confidence: float, doc_id: Optional[str]) -> Dict:
+        """Prepares the routing decision"""
+        record_route(path)
+        logger.debug(
+            "Query routed",
+            extra={"agent": self.agent_name, "path": path, "intent": intent, "confidence": round(confidence, 3)}
+        )
+        return {
+            "agent": self.agent_name,
+            "query": query,
+            "path": path,
+            "intent": intent,
+            "confidence": round(confidence, 3),
+            "doc_id": doc_id
+        }
+    
+    @staticmethod
+    def summarize(route_result: Dict) -> Dict:
+        """Routing decision as reported in agent_results"""
+        return {key: route_result[key] for key in ("path", "intent", "confidence", "doc_id")}
+    
+    def get_info(self) -> Dict:
+        """Agent information"""
+        return {
+            "agent_name": self.agent_name,
+            "description": "Answers single-field product questions from parsed fields, bypassing the LLM",
+            "enabled": self.enabled,
+            "min_confidence": self.min_confidence,
+            "intents": list(INTENT_PATTERNS)
+        }
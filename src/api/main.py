@@ -1,14 +1,29 @@
 # src/api/main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
+from typing import AsyncIterator, Dict, List, Optional
 import uvicorn
+import hmac
+import json
+import math
 import os
-from src.agents.multi_agent_system import MultiAgentSystem
+from src.rag.fields import SearchFilters
+from src.rag import registry
+from src.rag.watcher import CatalogWatcher
+from src.api.startup import StartupTracker, import_heavy_modules
+from src.utils.config import Config
+from src.utils.concurrency import run_in_executor, shutdown_executor
+from src.utils.http_client import close_async_http_client
+from src.utils.logger import get_logger
+from src.utils.metrics import render_metrics
 
 # Load environment variables
 load_dotenv()
 
+logger = get_logger(__name__)
+
 app = FastAPI(
     title="Product Query Bot",
     description="RAG-based chatbot for product queries with multi-agent architecture",
@@ -18,33 +33,74 @@ app = FastAPI(
 # Initialize multi-agent systems (only once)
 multi_agent_system = None
 langgraph_system = None
+catalog_watcher = None
+
+def _startup_tracker() -> StartupTracker:
+    return StartupTracker(
+        ["imports", "embedding_model", "index", "multi_agent_system", "langgraph_system"],
+        optional=["langgraph_system"]
+    )
+
+startup = _startup_tracker()
+
+def _initialize(startup: StartupTracker):
+    """Loads the heavy components in order, recording each one's state for /ready"""
+    global multi_agent_system, langgraph_system, catalog_watcher
+    with startup.stage("imports"):
+        import_heavy_modules()
+        from src.agents.multi_agent_system import MultiAgentSystem
+    with startup.stage("embedding_model"):
+        registry.get_embedding_model()
+    with startup.stage("index"):
+        # Both systems resolve the same retriever and embedding model
+        retriever = registry.get_retriever()
+    with startup.stage("multi_agent_system"):
+        multi_agent_system = MultiAgentSystem()
+    with startup.stage("langgraph_system"):
+        from src.agents.langgraph_system import LangGraphMultiAgentSystem
+        langgraph_system = LangGraphMultiAgentSystem()
+    
+    if Config.INDEX_WATCH_INTERVAL > 0:
+        if retriever.read_only and retriever.artifact is None:
+            logger.warning("Catalog watcher disabled: a read-only index can only be reloaded from an INDEX_ARTIFACT")
+        else:
+            catalog_watcher = CatalogWatcher(retriever)
+            catalog_watcher.start()
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize the system on startup"""
-    global multi_agent_system, langgraph_system
-    try:
-        print("Initializing multi-agent system...")
-        multi_agent_system = MultiAgentSystem()
-        print("Multi-agent system ready")
-        
-        # Initialize LangGraph system if available
-        try:
-            from src.agents.langgraph_system import LangGraphMultiAgentSystem
-            langgraph_system = LangGraphMultiAgentSystem()
-            print("LangGraph system ready")
-        except ImportError as e:
-            print(f"LangGraph system not available: {e}")
-            langgraph_system = None
-        
-    except Exception as e:
-        print(f"Error initializing system: {e}")
-        raise
+    """Starts loading the systems in the background; /ready reports when they are up"""
+    logger.info("Initializing multi-agent system")
+    startup.start(_initialize)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled connections, worker threads and shared models"""
+    global multi_agent_system, langgraph_system, catalog_watcher, startup
+    if catalog_watcher is not None:
+        catalog_watcher.stop()
+        catalog_watcher = None
+    await close_async_http_client()
+    shutdown_executor()
+    multi_agent_system = None
+    langgraph_system = None
+    startup = _startup_tracker()
+    registry.shutdown()
 
 # Pydantic models for validation
+class QueryFilters(BaseModel):
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    ingredient: Optional[str] = None
+    skin_type: Optional[str] = None
+    
+    def to_search_filters(self) -> SearchFilters:
+        return SearchFilters(**self.model_dump())
+
 class QueryRequest(BaseModel):
     user_id: str
     query: str
+    filters: Optional[QueryFilters] = None
 
 class QueryResponse(BaseModel):
     user_id: str
@@ -53,13 +109,72 @@ class QueryResponse(BaseModel):
     retrieved_docs: list = []
     agent_info: dict = {}
 
+class BatchQueryRequest(BaseModel):
+    user_id: str
+    queries: List[str]
+    filters: Optional[QueryFilters] = None
+
+class BatchItemResult(BaseModel):
+    index: int
+    query: str
+    status: str
+    response: str = ""
+    retrieved_docs: list = []
+    agent_info: dict = {}
+    error: Optional[str] = None
+    # HTTP status the query would have failed with on its own
+    status_code: Optional[int] = None
+
+class BatchQueryResponse(BaseModel):
+    user_id: str
+    total: int
+    succeeded: int
+    results: List[BatchItemResult]
+
+def _filters(request) -> Optional[SearchFilters]:
+    return request.filters.to_search_filters() if request.filters else None
+
 @app.get("/")
 async def root():
-    return {"message": "Product Query Bot API is running!", "endpoints": ["/query", "/query-langgraph", "/health", "/system/info"]}
+    return {"message": "Product Query Bot API is running!", "endpoints": ["/query", "/query/stream", "/query/batch", "/query-langgraph", "/query-langgraph/stream", "/health", "/ready", "/system/info", "/metrics", "/admin/reindex"]}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "product-query-bot"}
+    """Liveness: the process answers, even while the systems are still loading"""
+    if startup.failed:
+        return JSONResponse(status_code=503, content={"status": "unhealthy", "service": "product-query-bot"})
+    return {"status": "healthy", "service": "product-query-bot", "ready": startup.ready}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 200 once every required component is loaded, 503 before; with per-component state and timing"""
+    report = startup.report()
+    return JSONResponse(status_code=200 if startup.ready else 503, content=report)
+
+def _unavailable(detail: str) -> HTTPException:
+    """503 while startup is still loading the systems, 500 once it has given up"""
+    if startup.loading:
+        return HTTPException(status_code=503, detail="Service is starting up, see /ready", headers={"Retry-After": "5"})
+    return HTTPException(status_code=500, detail=detail)
+
+def _failed(result: Dict) -> HTTPException:
+    """
+    Error for a failed pipeline result: the status its error calls for (504
+    for an LLM timeout, 503 when overloaded or the circuit is open, 502 for
+    other LLM API failures, 500 otherwise), with Retry-After when known
+    """
+    retry_after = result.get("retry_after")
+    return HTTPException(
+        status_code=result.get("status_code") or 500,
+        detail=result.get("error", "Error processing query"),
+        headers={"Retry-After": str(math.ceil(retry_after))} if retry_after else None
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms and error/document counters"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/system/info")
 async def system_info():
@@ -69,8 +184,30 @@ async def system_info():
         info["primary_system"] = multi_agent_system.get_system_info()
     if langgraph_system:
         info["langgraph_system"] = langgraph_system.get_system_info()
+    if info and Config.RESPONSE_CACHE_ENABLED:
+        info["response_cache"] = registry.get_response_cache().stats()
+    if info:
+        # Counts the SQLite rows with CONVERSATION_BACKEND=sqlite
+        info["conversations"] = await run_in_executor(registry.get_conversation_store().stats)
     return info if info else {"error": "No systems initialized"}
 
+@app.post("/admin/reindex")
+async def reindex(x_admin_token: Optional[str] = Header(None)):
+    """
+    Applies catalog changes to the live index without a restart. In-flight
+    queries finish on the previous snapshot. Disabled unless ADMIN_TOKEN is set.
+    """
+    if not Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled: ADMIN_TOKEN is not set")
+    if not hmac.compare_digest(x_admin_token or "", Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not multi_agent_system:
+        raise _unavailable("Multi-agent system not initialized")
+    try:
+        return await run_in_executor(registry.get_retriever().reload)
+    except (RuntimeError, FileNotFoundError) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.post("/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """
@@ -78,13 +215,15 @@ async def process_query(request: QueryRequest):
     """
     try:
         if not multi_agent_system:
-            raise HTTPException(status_code=500, detail="Multi-agent system not initialized")
+            raise _unavailable("Multi-agent system not initialized")
         
         # Process query using the multi-agent system
-        result = multi_agent_system.process_query(request.query)
+        result = await multi_agent_system.aprocess_query(
+            request.query, filters=_filters(request), user_id=request.user_id
+        )
         
         if result["status"] == "error" or result["status"] == "system_error":
-            raise HTTPException(status_code=500, detail=result.get("error", "Error processing query"))
+            raise _failed(result)
         
         return QueryResponse(
             user_id=request.user_id,
@@ -99,6 +238,47 @@ async def process_query(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def process_query_batch(request: BatchQueryRequest):
+    """
+    Process many queries in one request: vectorized retrieval for the whole
+    batch, then LLM calls with bounded concurrency. Results keep input order
+    and carry their own status.
+    """
+    if not multi_agent_system:
+        raise _unavailable("Multi-agent system not initialized")
+    
+    if len(request.queries) > Config.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.queries)} queries (max {Config.BATCH_MAX_QUERIES})"
+        )
+    
+    try:
+        results = await multi_agent_system.aprocess_batch(request.queries, filters=_filters(request))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+    
+    items = [
+        BatchItemResult(
+            index=i,
+            query=query,
+            status="success" if result["status"] == "success" else "error",
+            response=result["final_response"] if result["status"] == "success" else "",
+            retrieved_docs=result["retrieved_docs"],
+            agent_info=result.get("agent_results", {}),
+            error=result.get("error"),
+            status_code=None if result["status"] == "success" else result.get("status_code") or 500
+        )
+        for i, (query, result) in enumerate(zip(request.queries, results))
+    ]
+    return BatchQueryResponse(
+        user_id=request.user_id,
+        total=len(items),
+        succeeded=sum(1 for item in items if item.status == "success"),
+        results=items
+    )
+
 @app.post("/query-langgraph", response_model=QueryResponse)
 async def process_query_langgraph(request: QueryRequest):
     """
@@ -106,13 +286,13 @@ async def process_query_langgraph(request: QueryRequest):
     """
     try:
         if not langgraph_system:
-            raise HTTPException(status_code=500, detail="LangGraph system not available")
+            raise _unavailable("LangGraph system not available")
         
         # Process query using the LangGraph system
-        result = langgraph_system.process_query(request.query, request.user_id)
+        result = await langgraph_system.aprocess_query(request.query, request.user_id, _filters(request))
         
         if result["status"] == "error":
-            raise HTTPException(status_code=500, detail=result.get("error", "Error processing query"))
+            raise _failed(result)
         
         return QueryResponse(
             user_id=request.user_id,
@@ -127,10 +307,68 @@ async def process_query_langgraph(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing LangGraph query: {str(e)}")
 
+def _sse(event: str, data: Dict) -> str:
+    """Formats a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _sse_stream(events: AsyncIterator[Dict], request: QueryRequest) -> AsyncIterator[str]:
+    """Translates pipeline events into SSE: retrieval, token..., then done or error"""
+    async for event in events:
+        if event["type"] == "retrieval":
+            yield _sse("retrieval", {
+                "user_id": request.user_id,
+                "query": request.query,
+                "retrieved_docs": event["docs"]
+            })
+        elif event["type"] == "token":
+            yield _sse("token", {"content": event["content"]})
+        elif event["type"] == "done":
+            result = event["result"]
+            yield _sse("done", {
+                "status": result["status"],
+                "response": result["final_response"],
+                "agent_info": result.get("agent_results", {})
+            })
+        else:
+            result = event["result"]
+            yield _sse("error", {
+                "detail": result.get("error", "Error processing query"),
+                "status_code": result.get("status_code") or 500,
+                "retry_after": result.get("retry_after")
+            })
+
+def _sse_response(events: AsyncIterator[Dict], request: QueryRequest) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_stream(events, request),
+        media_type="text/event-stream",
+        # Disable proxy buffering so tokens reach the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/stream")
+async def process_query_stream(request: QueryRequest):
+    """
+    Stream the multi-agent RAG pipeline response as Server-Sent Events
+    """
+    if not multi_agent_system:
+        raise _unavailable("Multi-agent system not initialized")
+    
+    events = multi_agent_system.astream_query(request.query, filters=_filters(request), user_id=request.user_id)
+    return _sse_response(events, request)
+
+@app.post("/query-langgraph/stream")
+async def process_query_langgraph_stream(request: QueryRequest):
+    """
+    Stream the LangGraph pipeline response as Server-Sent Events
+    """
+    if not langgraph_system:
+        raise _unavailable("LangGraph system not available")
+    
+    return _sse_response(langgraph_system.astream_query(request.query, request.user_id, _filters(request)), request)
+
 if __name__ == "__main__":
     uvicorn.run(
         "src.api.main:app",
         host="0.0.0.0",
-        port=8000,
-        reload=True
+        port=8000
     )
@@ -0,0 +1,167 @@
+# src/api/serve.py
+"""
+Production entry point: several uvicorn workers pre-forked from one parent.
+
+The parent loads the embedding model and imports the app, then forks:
+- an index builder, which creates or syncs the on-disk index and exits
+  (skipped when INDEX_ARTIFACT names a prebuilt artifact)
+- the workers, which open that index read-only and share the model weights
+  and imported code with the parent copy-on-write
+
+All workers accept connections from one listening socket. The parent only
+supervises: it restarts workers that die and forwards SIGTERM/SIGINT.
+`python -m src.api.main` remains the single-process development server.
+
+Usage:
+    python -m src.api.serve --workers 4
+    WORKERS=4 python -m src.api.serve
+"""
+import argparse
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Set
+from src.utils.config import Config
+from src.utils.logger import configure_logging, get_logger, shutdown_logging
+
+logger = get_logger(__name__)
+
+def _prepare_metrics_dir() -> str:
+    """
+    Points prometheus_client at a fresh directory for per-process samples.
+    Must run before prometheus_client is imported, which fixes its value
+    storage at import time.
+    """
+    if "prometheus_client" in sys.modules and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        raise RuntimeError("serve() must be called before the app and its metrics are imported")
+    path = tempfile.mkdtemp(prefix="pqb-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+def _fork(target, *args) -> int:
+    """Runs target(*args) in a forked child and returns the child's pid"""
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 1
+    try:
+        # The parent's log writer thread does not exist in the child
+        configure_logging()
+        target(*args)
+        code = 0
+    except BaseException:
+        logger.exception("Child process failed", extra={"pid": os.getpid()})
+    finally:
+        shutdown_logging()
+        os._exit(code)
+
+def _build_index():
+    """Creates or syncs the persistent index (runs in a child, see serve)"""
+    from src.rag.retriever import DocumentRetriever
+    
+    retriever = DocumentRetriever(read_only=False)
+    logger.info(
+        "Index ready",
+        extra={"documents": retriever.collection.count(), "index_version": retriever.index_version}
+    )
+
+def _run_worker(sock: socket.socket, workers: int, host: str, port: int):
+    """Serves the app on the inherited socket until told to stop"""
+    import uvicorn
+    from src.api.main import app
+    
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    Config.INDEX_READ_ONLY = True
+    # Split the cores between workers instead of each using all of them
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_config=None))
+    server.run(sockets=[sock])
+
+def _listen(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    return sock
+
+def serve(workers: int = None, host: str = None, port: int = None):
+    """Builds the index, then runs and supervises the workers until SIGTERM/SIGINT"""
+    workers = Config.WORKERS if workers is None else workers
+    host = Config.HOST if host is None else host
+    port = Config.PORT if port is None else port
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    
+    metrics_dir = _prepare_metrics_dir()
+    # Every process shares the on-disk index
+    Config.CHROMA_PERSISTENT = True
+    # Load the weights and import the app once, before any fork. Nothing
+    # here runs inference, so no torch thread pools exist yet.
+    # src.api.main imports none of the heavy modules itself, so load them here.
+    from src.api.startup import import_heavy_modules
+    from src.rag import registry
+    import_heavy_modules()
+    registry.get_embedding_model()
+    import src.api.main  # noqa: F401
+    
+    if not Config.INDEX_ARTIFACT:
+        builder = _fork(_build_index)
+        _, status = os.waitpid(builder, 0)
+        if os.waitstatus_to_exitcode(status) != 0:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+            raise RuntimeError("Index build failed, see the log above")
+    
+    sock = _listen(host, port)
+    children: Set[int] = set()
+    stopping = False
+    
+    def spawn():
+        children.add(_fork(_run_worker, sock, workers, host, port))
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    logger.info("Serving", extra={"workers": workers, "host": host, "port": port, "pid": os.getpid()})
+    
+    from prometheus_client import multiprocess
+    try:
+        while children:
+            pid, status = os.wait()
+            children.discard(pid)
+            multiprocess.mark_process_dead(pid)
+            if not stopping:
+                logger.warning("Worker exited, restarting", extra={"pid": pid, "exit_code": os.waitstatus_to_exitcode(status)})
+                # Don't spin if workers die on startup
+                time.sleep(1)
+                spawn()
+    finally:
+        sock.close()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        logger.info("Stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=Config.WORKERS, help="Worker processes (default: WORKERS)")
+    parser.add_argument("--host", default=Config.HOST)
+    parser.add_argument("--port", type=int, default=Config.PORT)
+    args = parser.parse_args()
+    serve(args.workers, args.host, args.port)
+
+if __name__ == "__main__":
+    main()
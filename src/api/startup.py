@@ -0,0 +1,113 @@
+# src/api/startup.py
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence
+from src.utils.config import Config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Imported when the app starts (or before fork by src.api.serve), never when
+# src.api.main itself is imported: torch, sentence-transformers and Chroma
+# alone take seconds. Chroma is only loaded for VECTOR_STORE=chroma.
+HEAVY_MODULES = ("sentence_transformers", "src.agents.multi_agent_system")
+OPTIONAL_MODULES = ("src.agents.langgraph_system",)
+
+def import_heavy_modules():
+    """Imports the model, index and agent code; optional modules may be missing"""
+    modules = HEAVY_MODULES + (("chromadb",) if Config.VECTOR_STORE.lower() == "chroma" else ())
+    for name in modules:
+        importlib.import_module(name)
+    for name in OPTIONAL_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Optional module not available", extra={"module": name, "error": str(e)})
+
+class StartupTracker:
+    """
+    Load state and timing of the components initialized at startup. They
+    load one after another in a background thread, so the port answers
+    (and /health reports liveness) while /ready reports progress.
+    A failed optional component is marked unavailable and does not block
+    readiness.
+    """
+    
+    def __init__(self, components: Sequence[str], optional: Sequence[str] = ()):
+        self.optional = set(optional)
+        self.components: Dict[str, Dict] = {name: {"status": "pending"} for name in components}
+        self.elapsed_s: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def ready(self) -> bool:
+        return all(
+            state["status"] == "ready" or (name in self.optional and state["status"] == "unavailable")
+            for name, state in self.components.items()
+        )
+    
+    @property
+    def failed(self) -> bool:
+        return any(state["status"] == "failed" for state in self.components.values())
+    
+    @property
+    def loading(self) -> bool:
+        return self._thread is not None and self.elapsed_s is None
+    
+    def _set(self, name: str, **state):
+        with self._lock:
+            self.components[name] = state
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Times loading one component and records whether it succeeded"""
+        self._set(name, status="loading")
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            elapsed = round(time.perf_counter() - start, 3)
+            if name not in self.optional:
+                self._set(name, status="failed", elapsed_s=elapsed, error=str(e))
+                raise
+            self._set(name, status="unavailable", elapsed_s=elapsed, error=str(e))
+            logger.warning("Optional component not available", extra={"component": name, "error": str(e)})
+        else:
+            self._set(name, status="ready", elapsed_s=round(time.perf_counter() - start, 3))
+    
+    def start(self, target: Callable[["StartupTracker"], None]):
+        """Runs target(self) in a background thread, once"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(target,), name="startup", daemon=True)
+        self._thread.start()
+    
+    def _run(self, target: Callable[["StartupTracker"], None]):
+        start = time.perf_counter()
+        try:
+            target(self)
+        except Exception:
+            logger.exception("Startup failed")
+        finally:
+            self.elapsed_s = round(time.perf_counter() - start, 3)
+            logger.info("Startup finished", extra={"ready": self.ready, "elapsed_s": self.elapsed_s})
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until startup has finished; True if the app is ready"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+    
+    def report(self) -> Dict:
+        if self.failed:
+            status = "failed"
+        elif self.ready:
+            status = "ready"
+        else:
+            status = "loading" if self._thread is not None else "not_started"
+        with self._lock:
+            components = {name: dict(state) for name, state in self.components.items()}
+        return {"status": status, "elapsed_s": self.elapsed_s, "components": components}
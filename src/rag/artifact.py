@@ -0,0 +1,65 @@
+# src/rag/artifact.py
+"""
+Versioned index artifacts written by src.rag.build_index.
+
+An artifact root holds one directory per build plus a CURRENT file naming
+the build to serve:
+
+    indexes/
+        CURRENT                  # "20260101T120000Z"
+        20260101T120000Z/
+            manifest.json        # settings, counts and build stats
+            chroma/              # Chroma persistent collection, or
+            vectors/             # NumPy store (VECTOR_STORE=numpy)
+            lexical.npz          # BM25 postings
+
+manifest.json is written last and CURRENT is replaced atomically after it,
+so an interrupted build is never picked up.
+"""
+import json
+import os
+from typing import Dict
+
+ARTIFACT_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+def chroma_path(artifact: str) -> str:
+    return os.path.join(artifact, "chroma")
+
+def store_path(artifact: str, vector_store: str) -> str:
+    """Where a build keeps its collection; the manifest records the backend"""
+    return chroma_path(artifact) if vector_store == "chroma" else os.path.join(artifact, "vectors")
+
+def lexical_path(artifact: str) -> str:
+    return os.path.join(artifact, "lexical.npz")
+
+def resolve_artifact(path: str) -> str:
+    """The build directory for path: path itself, or the build its CURRENT file names"""
+    if os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+        return path
+    current = os.path.join(path, CURRENT_FILE)
+    if os.path.isfile(current):
+        with open(current) as f:
+            build = os.path.join(path, f.read().strip())
+        if os.path.isfile(os.path.join(build, MANIFEST_FILE)):
+            return build
+    raise FileNotFoundError(f"No index artifact in {path}; build one with python -m src.rag.build_index")
+
+def read_manifest(artifact: str) -> Dict:
+    with open(os.path.join(artifact, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Index artifact {artifact} has format {manifest.get('format')}, expected {ARTIFACT_FORMAT}")
+    return manifest
+
+def write_manifest(artifact: str, manifest: Dict):
+    with open(os.path.join(artifact, MANIFEST_FILE), "w") as f:
+        json.dump({"format": ARTIFACT_FORMAT, **manifest}, f, indent=2)
+
+def publish(root: str, version: str):
+    """Points root/CURRENT at the given build"""
+    staging = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(staging, "w") as f:
+        f.write(version + "\n")
+    os.replace(staging, os.path.join(root, CURRENT_FILE))
@@ -0,0 +1,176 @@
+# src/rag/build_index.py
+"""
+Builds a versioned index artifact offline, separately from server startup.
+
+Files in DOCS_PATH are read by a thread pool one batch ahead of the
+embedding model, chunked, embedded in batches and streamed into a new
+collection of the VECTOR_STORE backend (recorded in the manifest). The BM25 index is saved next to it, then the manifest,
+then the artifact root's CURRENT file is pointed at the new build. Serve it
+with INDEX_ARTIFACT=<root>; startup then opens the artifact without reading
+DOCS_PATH.
+
+Usage:
+    python -m src.rag.build_index --output indexes
+    python -m src.rag.build_index --docs docs/products --output indexes --batch-size 512 --read-workers 16
+    python -m src.rag.build_index --output indexes --vector-store numpy
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+from src.rag.artifact import lexical_path, publish, store_path, write_manifest
+from src.rag.chunker import DocumentChunker
+from src.rag.documents import chunk_document, collection_metadata, fingerprint, lexical_text, read_document
+from src.rag.embeddings import EmbeddingEncoder
+from src.rag.lexical import BM25Index
+from src.rag.registry import get_embedding_model
+from src.rag.retriever import DocumentRetriever
+from src.rag.vector_store import create_client, persist
+from src.utils.config import Config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+def directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(folder, name))
+        for folder, _, names in os.walk(path)
+        for name in names
+    )
+
+class IndexBuilder:
+    """Streams a document folder into a new build under an artifact root"""
+    
+    def __init__(self, docs_path: str = None, output: str = None, batch_size: int = 256,
+                 read_workers: int = 8, embedding_model=None, vector_store: str = None):
+        self.docs_path = docs_path or Config.DOCS_PATH
+        self.output = output or Config.INDEX_ARTIFACT or "indexes"
+        self.batch_size = batch_size
+        self.read_workers = read_workers
+        self.vector_store = (vector_store or Config.VECTOR_STORE).lower()
+        self.encoder = EmbeddingEncoder(embedding_model or get_embedding_model())
+        self.chunker = DocumentChunker()
+        self.timings = {"read_wait_s": 0.0, "embed_s": 0.0, "write_s": 0.0}
+    
+    def _read_batches(self, doc_files: List[str]) -> Iterator[List[Tuple[str, str, Dict]]]:
+        """
+        Yields the documents batch by batch, in file order. The next batch
+        is already being read while the caller embeds the current one.
+        """
+        batches = [doc_files[start:start + self.batch_size] for start in range(0, len(doc_files), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.read_workers) as pool:
+            pending = [pool.submit(read_document, doc_file) for doc_file in batches[0]] if batches else []
+            for position in range(len(batches)):
+                upcoming = []
+                if position + 1 < len(batches):
+                    upcoming = [pool.submit(read_document, doc_file) for doc_file in batches[position + 1]]
+                start = time.perf_counter()
+                documents = [future.result() for future in pending]
+                self.timings["read_wait_s"] += time.perf_counter() - start
+                yield documents
+                pending = upcoming
+    
+    def _write(self, collection, ids: List[str], texts: List[str], embed_texts: List[str], metadatas: List[Dict]):
+        start = time.perf_counter()
+        embeddings = self.encoder.encode_documents(embed_texts)
+        self.timings["embed_s"] += time.perf_counter() - start
+        
+        start = time.perf_counter()
+        collection.add(ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas)
+        self.timings["write_s"] += time.perf_counter() - start
+    
+    def build(self) -> Dict:
+        """Writes and publishes a new build, returning its manifest"""
+        doc_files = sorted(glob.glob(os.path.join(self.docs_path, "*.txt")))
+        if not doc_files:
+            raise FileNotFoundError(f"No documents found in {self.docs_path}")
+        
+        started = time.perf_counter()
+        built_at = datetime.now(timezone.utc)
+        version = built_at.strftime("%Y%m%dT%H%M%S%fZ")
+        artifact = os.path.join(self.output, version)
+        collection = create_client(store_path(artifact, self.vector_store), self.vector_store).create_collection(
+            name="products",
+            metadata=collection_metadata(self.chunker)
+        )
+        
+        chunks = 0
+        for documents in self._read_batches(doc_files):
+            ids, texts, embed_texts, metadatas = [], [], [], []
+            for doc_id, content, metadata in documents:
+                chunk_ids, chunk_texts, chunk_embed_texts, chunk_metas = chunk_document(self.chunker, doc_id, content, metadata)
+                ids.extend(chunk_ids)
+                texts.extend(chunk_texts)
+                embed_texts.extend(chunk_embed_texts)
+                metadatas.extend(chunk_metas)
+            self._write(collection, ids, texts, embed_texts, metadatas)
+            chunks += len(ids)
+            logger.info("Indexed batch", extra={"documents": len(documents), "chunks": len(ids)})
+        start = time.perf_counter()
+        persist(collection)
+        self.timings["write_s"] += time.perf_counter() - start
+        
+        # In collection order, which is the order serving builds its local indexes in
+        start = time.perf_counter()
+        stored = collection.get(include=["documents", "metadatas"])
+        lexical = BM25Index().build(
+            stored["ids"],
+            (lexical_text(document, metadata) for document, metadata in zip(stored["documents"], stored["metadatas"]))
+        )
+        lexical.save(lexical_path(artifact))
+        self.timings["lexical_s"] = time.perf_counter() - start
+        
+        elapsed = time.perf_counter() - started
+        manifest = {
+            "version": version,
+            "built_at": built_at.isoformat(timespec="seconds"),
+            "docs_path": os.path.abspath(self.docs_path),
+            "index_version": fingerprint(stored["metadatas"]),
+            "vector_store": self.vector_store,
+            **{key: value for key, value in collection_metadata(self.chunker).items() if key != "description"},
+            "documents": len(doc_files),
+            "chunks": chunks,
+            "stats": {
+                **{key: round(value, 3) for key, value in self.timings.items()},
+                "total_s": round(elapsed, 3),
+                "documents_per_s": round(len(doc_files) / elapsed, 1),
+                "chunks_per_s": round(chunks / elapsed, 1),
+                "size_bytes": directory_bytes(artifact)
+            }
+        }
+        write_manifest(artifact, manifest)
+        
+        # Open it the way the server will, before anything is pointed at it
+        start = time.perf_counter()
+        DocumentRetriever(embedding_model=self.encoder.model, artifact=artifact)
+        manifest["stats"]["open_s"] = round(time.perf_counter() - start, 3)
+        write_manifest(artifact, manifest)
+        
+        publish(self.output, version)
+        logger.info("Index artifact published", extra={"path": artifact, **manifest["stats"]})
+        return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default=Config.DOCS_PATH, help="Folder of product .txt files (default: DOCS_PATH)")
+    parser.add_argument("--output", default=Config.INDEX_ARTIFACT or "indexes", help="Artifact root (default: INDEX_ARTIFACT or ./indexes)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Documents read and embedded per batch")
+    parser.add_argument("--read-workers", type=int, default=8, help="Threads reading files")
+    parser.add_argument("--vector-store", default=Config.VECTOR_STORE, help="chroma | numpy (default: VECTOR_STORE)")
+    args = parser.parse_args()
+    
+    manifest = IndexBuilder(args.docs, args.output, args.batch_size, args.read_workers, vector_store=args.vector_store).build()
+    stats = manifest["stats"]
+    print(f"Built {os.path.join(args.output, manifest['version'])}")
+    print(f"  {manifest['documents']} documents, {manifest['chunks']} chunks, {stats['size_bytes'] / 1e6:.1f} MB")
+    print(f"  {stats['total_s']}s total: {stats['documents_per_s']} documents/s, {stats['chunks_per_s']} chunks/s")
+    print(
+        f"  read wait {stats['read_wait_s']}s, embedding {stats['embed_s']}s, {manifest['vector_store']} writes {stats['write_s']}s, "
+        f"BM25 {stats['lexical_s']}s, server open {stats['open_s']}s"
+    )
+
+if __name__ == "__main__":
+    main()
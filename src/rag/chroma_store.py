@@ -0,0 +1,41 @@
+# src/rag/chroma_store.py
+"""
+Chroma backend of src.rag.vector_store. Imported only when a Chroma client
+is created, so the NumPy backend never loads chromadb.
+"""
+import os
+from typing import Optional
+import chromadb
+from chromadb.api.client import SharedSystemClient
+from chromadb.config import Settings
+from chromadb.telemetry.product import ProductTelemetryClient, ProductTelemetryEvent
+from overrides import override
+
+class NoopProductTelemetry(ProductTelemetryClient):
+    """
+    Replaces Chroma's default telemetry client, which batches events in an
+    unlocked dict and makes concurrent queries fail with a KeyError
+    """
+    @override
+    def capture(self, event: ProductTelemetryEvent) -> None:
+        pass
+
+def create_chroma_client(path: Optional[str] = None):
+    """Chroma client stored under path, in memory if path is None"""
+    settings = Settings(
+        anonymized_telemetry=False,
+        chroma_product_telemetry_impl=f"{__name__}.NoopProductTelemetry"
+    )
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+        return chromadb.PersistentClient(path=path, settings=settings)
+    return chromadb.Client(settings)
+
+def close_chroma_client(client):
+    """
+    Frees a persistent client's segments. Chroma keeps one system per path
+    alive for the whole process, so dropping the client alone is not enough.
+    """
+    system = SharedSystemClient._identifer_to_system.pop(client._identifier, None)
+    if system is not None:
+        system.stop()
@@ -0,0 +1,143 @@
+# src/rag/chunker.py
+import re
+from typing import Dict, List, NamedTuple, Tuple
+from src.utils.config import Config
+
+class Chunk(NamedTuple):
+    """A span of a parent document; text == content[start:end]"""
+    text: str
+    embed_text: str
+    start: int
+    end: int
+
+class DocumentChunker:
+    """
+    Splits product documents into chunks before indexing.
+    
+    Strategies:
+    - "none": the whole document is one chunk (original behaviour)
+    - "fields": one chunk per field line ("Ingredients:", "Price:", ...) plus
+      the header; fields longer than chunk_size are split into token windows
+    - "tokens": sliding windows of chunk_size tokens overlapping by overlap
+    
+    Tokens are whitespace-delimited words. Chunks other than the header are
+    embedded with the document title prepended, so "Price: $18.75" still
+    carries which product it belongs to.
+    """
+    STRATEGIES = ("none", "fields", "tokens")
+    FIELD_PATTERN = re.compile(r"^[A-Z][A-Za-z /&()-]{0,40}:")
+    TOKEN_PATTERN = re.compile(r"\S+")
+    
+    def __init__(self, strategy: str = None, chunk_size: int = None, overlap: int = None):
+        self.strategy = (strategy or Config.CHUNK_STRATEGY).lower()
+        self.chunk_size = chunk_size or Config.CHUNK_SIZE
+        self.overlap = overlap if overlap is not None else Config.CHUNK_OVERLAP
+        
+        if self.strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown chunk strategy '{self.strategy}', expected one of {self.STRATEGIES}")
+        if not 0 <= self.overlap < self.chunk_size:
+            raise ValueError("CHUNK_OVERLAP must be smaller than CHUNK_SIZE")
+    
+    @property
+    def enabled(self) -> bool:
+        return self.strategy != "none"
+    
+    def describe(self) -> str:
+        """Identifies the chunking setup; a change requires re-indexing"""
+        if not self.enabled:
+            return "none"
+        return f"{self.strategy}:{self.chunk_size}:{self.overlap}"
+    
+    def chunk(self, content: str) -> List[Chunk]:
+        if not content:
+            return []
+        if self.strategy == "fields":
+            return self._chunk_fields(content)
+        if self.strategy == "tokens":
+            return self._chunk_tokens(content, 0, len(content), self.title(content))
+        return [Chunk(content, content, 0, len(content))]
+    
+    @staticmethod
+    def title(content: str) -> str:
+        """First line of the document (the product name)"""
+        return content.strip().split("\n", 1)[0].strip()
+    
+    def _chunk_fields(self, content: str) -> List[Chunk]:
+        """Header section plus one section per field line"""
+        title = self.title(content)
+        boundaries = [0]
+        for match in re.finditer(r"^.*$", content, re.MULTILINE):
+            if match.start() > 0 and self.FIELD_PATTERN.match(match.group(0)):
+                boundaries.append(match.start())
+        boundaries.append(len(content))
+        
+        chunks = []
+        for start, end in zip(boundaries, boundaries[1:]):
+            # Trim surrounding whitespace but keep offsets exact
+            section = content[start:end]
+            start += len(section) - len(section.lstrip())
+            end = start + len(section.strip())
+            if start >= end:
+                continue
+            
+            prefix = "" if start == 0 else title
+            if len(self.TOKEN_PATTERN.findall(content, start, end)) > self.chunk_size:
+                chunks.extend(self._chunk_tokens(content, start, end, prefix))
+            else:
+                chunks.append(self._make_chunk(content, start, end, prefix))
+        return chunks
+    
+    def _chunk_tokens(self, content: str, start: int, end: int, prefix: str) -> List[Chunk]:
+        """Sliding token windows over content[start:end]"""
+        spans = [m.span() for m in self.TOKEN_PATTERN.finditer(content, start, end)]
+        if not spans:
+            return []
+        
+        chunks = []
+        step = self.chunk_size - self.overlap
+        for first in range(0, len(spans), step):
+            window = spans[first:first + self.chunk_size]
+            chunk_prefix = "" if window[0][0] == 0 else prefix
+            chunks.append(self._make_chunk(content, window[0][0], window[-1][1], chunk_prefix))
+            if first + self.chunk_size >= len(spans):
+                break
+        return chunks
+    
+    @staticmethod
+    def _make_chunk(content: str, start: int, end: int, prefix: str) -> Chunk:
+        text = content[start:end]
+        embed_text = f"{prefix}\n{text}" if prefix else text
+        return Chunk(text, embed_text, start, end)
+
+def merge_chunk_texts(spans: List[Tuple[int, int, str]]) -> str:
+    """
+    Stitches chunks of one parent document back together in document order,
+    using their offsets to drop overlapping text
+    """
+    pieces = []
+    covered = -1
+    for start, end, text in sorted(spans):
+        if start >= covered:
+            if pieces:
+                pieces.append("\n")
+            pieces.append(text)
+        elif end > covered:
+            pieces.append(text[covered - start:])
+        covered = max(covered, end)
+    return "".join(pieces)
+
+# Metadata keys describing a chunk rather than its parent document
+CHUNK_KEYS = ("parent_id", "chunk_index", "chunk_count", "start_offset", "end_offset")
+
+def chunk_metadata(parent: Dict, chunk: Chunk, index: int, count: int, title: str) -> Dict:
+    """Parent metadata plus the chunk's position within the parent"""
+    metadata = dict(parent)
+    metadata.update({
+        "title": title,
+        "parent_id": parent["doc_id"],
+        "chunk_index": index,
+        "chunk_count": count,
+        "start_offset": chunk.start,
+        "end_offset": chunk.end
+    })
+    return metadata
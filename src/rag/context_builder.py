@@ -0,0 +1,166 @@
+# src/rag/context_builder.py
+import re
+from typing import Dict, List, NamedTuple, Optional
+from src.utils.config import Config
+from src.utils.logger import get_logger
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to an approximate count
+    tiktoken = None
+
+logger = get_logger(__name__)
+
+class TokenCounter:
+    """
+    Counts prompt tokens with the model's tiktoken encoding. When tiktoken is
+    not installed or its encoding can't be loaded (it is downloaded on first
+    use), an approximation of one token per word or punctuation mark is used.
+    """
+    APPROX_PATTERN = re.compile(r"\w+|[^\w\s]")
+    
+    def __init__(self, model_name: str = None):
+        self.model_name = model_name or Config.MODEL_NAME
+        self.encoding = self._load_encoding(self.model_name)
+    
+    @staticmethod
+    def _load_encoding(model_name: str):
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            # Unknown model name (e.g. a self-hosted model): use the GPT-4 encoding
+            pass
+        except Exception as e:
+            logger.warning("tiktoken unavailable, approximating token counts", extra={"error": str(e)})
+            return None
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning("tiktoken unavailable, approximating token counts", extra={"error": str(e)})
+            return None
+    
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+    
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return len(self.APPROX_PATTERN.findall(text))
+
+class BuiltContext(NamedTuple):
+    """Prompt context packed into the token budget"""
+    text: str
+    tokens: int
+    docs_used: int
+    truncated: bool
+
+class ContextBuilder:
+    """
+    Packs retrieved documents, best match first, into a token budget.
+    
+    Lines already included from an earlier document are skipped, and the
+    document that crosses the budget is cut at the last line (or, failing
+    that, the last word) that still fits. Documents after it are dropped.
+    """
+    EMPTY_CONTEXT = "No relevant documents found."
+    
+    def __init__(self, max_tokens: int = None, counter: Optional[TokenCounter] = None,
+                 deduplicate: bool = None):
+        self.max_tokens = max_tokens or Config.CONTEXT_MAX_TOKENS
+        self.counter = counter or TokenCounter()
+        self.deduplicate = Config.CONTEXT_DEDUPLICATE if deduplicate is None else deduplicate
+    
+    def build(self, retrieved_docs: List[Dict]) -> BuiltContext:
+        if not retrieved_docs:
+            return BuiltContext(self.EMPTY_CONTEXT, self.counter.count(self.EMPTY_CONTEXT), 0, False)
+        
+        seen_lines = set()
+        parts = []
+        used = 0
+        truncated = False
+        
+        for doc in self._rank(retrieved_docs):
+            header = f"Document {len(parts) + 1}:\n"
+            # Parts are joined by a newline and each ends with one
+            remaining = self.max_tokens - used - self.counter.count(header + "\n\n")
+            if remaining <= 0:
+                truncated = True
+                break
+            
+            lines = self._unique_lines(doc["content"], seen_lines)
+            if not lines:
+                continue
+            
+            body, complete = self._fit_lines(lines, remaining)
+            if body:
+                part = f"{header}{body}\n"
+                parts.append(part)
+                used += self.counter.count(part + "\n")
+            if not complete:
+                truncated = True
+                break
+        
+        if not parts:
+            return BuiltContext(self.EMPTY_CONTEXT, self.counter.count(self.EMPTY_CONTEXT), 0, truncated)
+        
+        text = "\n".join(parts)
+        return BuiltContext(text, self.counter.count(text), len(parts), truncated)
+    
+    @staticmethod
+    def _rank(retrieved_docs: List[Dict]) -> List[Dict]:
+        """
+        Best documents first: as given when a reranker already ordered them,
+        by fused score when retrieval provided one (hybrid search), otherwise
+        closest first, with documents lacking a distance kept in order at the end
+        """
+        if any("rerank_score" in doc for doc in retrieved_docs):
+            return list(retrieved_docs)
+        if all("score" in doc for doc in retrieved_docs):
+            return sorted(retrieved_docs, key=lambda doc: -doc["score"])
+        return sorted(
+            retrieved_docs,
+            key=lambda doc: (doc.get("distance") is None, doc.get("distance") or 0.0)
+        )
+    
+    def _unique_lines(self, content: str, seen_lines: set) -> List[str]:
+        """Non-empty lines of a document, minus those already in the context"""
+        lines = []
+        for line in content.strip().split("\n"):
+            key = " ".join(line.lower().split())
+            if not key:
+                continue
+            if self.deduplicate:
+                if key in seen_lines:
+                    continue
+                seen_lines.add(key)
+            lines.append(line.rstrip())
+        return lines
+    
+    def _fit_lines(self, lines: List[str], budget: int):
+        """Longest prefix of lines within budget, and whether all lines fit"""
+        kept = []
+        for line in lines:
+            candidate = "\n".join(kept + [line])
+            if self.counter.count(candidate) <= budget:
+                kept.append(line)
+                continue
+            
+            # Keep as many whole words of the overflowing line as fit
+            words = line.split(" ")
+            low, high = 0, len(words)
+            while low < high:
+                mid = (low + high + 1) // 2
+                if self.counter.count("\n".join(kept + [" ".join(words[:mid]) + " ..."])) <= budget:
+                    low = mid
+                else:
+                    high = mid - 1
+            if low:
+                kept.append(" ".join(words[:low]) + " ...")
+            return "\n".join(kept), False
+        
+        return "\n".join(kept), True
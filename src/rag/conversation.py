@@ -0,0 +1,337 @@
+# src/rag/conversation.py
+"""
+Per-user conversation memory (CONVERSATION_*).
+
+Each user id has a session holding its last CONVERSATION_MAX_TURNS turns:
+the query, the answer cut to CONVERSATION_MAX_RESPONSE_CHARS and the ids of
+the documents the answer came from. A follow-up like "and how much is it?"
+names no product, so searching for it finds little; instead it is answered
+from the previous turn's documents, with the earlier turns in the prompt.
+
+Sessions are kept in memory, the least recently used evicted beyond
+CONVERSATION_MAX_SESSIONS sessions or CONVERSATION_MAX_BYTES bytes, and
+expire after CONVERSATION_TTL_SECONDS without a query. With
+CONVERSATION_BACKEND=sqlite every session is also written to a local SQLite
+file, so it outlives evictions from memory and restarts; the async paths run
+that I/O on the executor, and never under the lock guarding the memory.
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+from src.rag.lexical import tokenize
+from src.utils.concurrency import run_in_executor
+from src.utils.config import Config
+
+CONVERSATION_BACKENDS = ("memory", "sqlite")
+# Words that refer back to something named in an earlier turn. "this",
+# "that" and "one" are left out: "which one is best for dandruff?" or
+# "anything that helps acne?" are new questions far more often than not.
+ANAPHORS = {"it", "its", "these", "those", "they", "them", "their"}
+# Words that say what is asked rather than what it is asked about
+QUESTION_WORDS = {
+    "a", "an", "and", "the", "is", "are", "be", "of", "for", "to", "in", "on", "at", "by", "with", "or", "s",
+    "what", "whats", "which", "how", "much", "many", "do", "does", "did", "can", "could", "should", "would",
+    "i", "you", "we", "me", "my", "your", "there", "any", "about", "please", "tell", "also", "then", "so",
+    "price", "cost", "costs", "ingredients", "ingredient", "contain", "contains", "use", "apply", "usage",
+    "good", "best", "better", "safe", "work", "works", "help", "helps"
+}
+
+def own_terms(query: str) -> Set[str]:
+    """The words of a query that say what it is about, besides anaphors and question words"""
+    return set(tokenize(query)) - ANAPHORS - QUESTION_WORDS
+
+def is_follow_up(query: str, max_terms: int = None) -> bool:
+    """
+    Whether the query refers back to the conversation: it has a word like
+    "it" or "those" and at most max_terms words of its own besides
+    question words, e.g. "and how much is it?" or "what are its ingredients?"
+    """
+    max_terms = Config.CONVERSATION_FOLLOW_UP_MAX_TERMS if max_terms is None else max_terms
+    if not set(tokenize(query)) & ANAPHORS:
+        return False
+    return len(own_terms(query)) <= max_terms
+
+def refers_to(query: str, docs: Sequence[Dict]) -> bool:
+    """
+    Whether a follow-up is about the given documents: it has no words of
+    its own, or one of them appears in their content. "is it good for
+    dandruff?" after a sunscreen is a new question, to be searched for.
+    """
+    terms = own_terms(query)
+    return not terms or any(not terms.isdisjoint(tokenize(doc["content"])) for doc in docs)
+
+class Turn(NamedTuple):
+    """One answered query of a session"""
+    query: str
+    response: str
+    doc_ids: Sequence[str]
+    at: float
+
+def _turn_bytes(turn: Turn) -> int:
+    """Memory held by a turn: the tuple, its strings and its doc id tuple"""
+    return (
+        sys.getsizeof(turn) + sys.getsizeof(turn.query) + sys.getsizeof(turn.response) + sys.getsizeof(turn.at)
+        + sys.getsizeof(turn.doc_ids) + sum(sys.getsizeof(doc_id) for doc_id in turn.doc_ids)
+    )
+
+class _Session:
+    __slots__ = ("turns", "updated_at", "size")
+    
+    def __init__(self, max_turns: int, turns: Sequence[Turn] = (), updated_at: float = None):
+        self.turns = deque(turns, maxlen=max_turns)
+        self.updated_at = updated_at if updated_at is not None else time.time()
+        self.size = 0
+    
+    def measure(self, user_id: str) -> int:
+        self.size = (
+            sys.getsizeof(self) + sys.getsizeof(self.turns) + sys.getsizeof(user_id)
+            + sum(_turn_bytes(turn) for turn in self.turns)
+        )
+        return self.size
+
+class _SQLiteSessions:
+    """Sessions as JSON rows of one table, written through on every turn"""
+    def __init__(self, path: str):
+        self.path = path
+        # One connection used from any thread, serialized by its own lock so
+        # that ConversationStore's lock is never held during I/O
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, updated_at REAL NOT NULL, turns TEXT NOT NULL)"
+        )
+        self._db.commit()
+    
+    def load(self, user_id: str, since: float) -> Optional[List[Turn]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT turns FROM sessions WHERE user_id = ? AND updated_at >= ?", (user_id, since)
+            ).fetchone()
+        return [Turn(query, response, tuple(doc_ids), at) for query, response, doc_ids, at in json.loads(row[0])] if row else None
+    
+    def save(self, user_id: str, turns: Sequence[Turn], updated_at: float):
+        """Writes the session unless a newer one was written meanwhile by a concurrent turn"""
+        rows = json.dumps([[turn.query, turn.response, list(turn.doc_ids), turn.at] for turn in turns])
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions (user_id, updated_at, turns) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET updated_at = excluded.updated_at, turns = excluded.turns "
+                "WHERE excluded.updated_at >= sessions.updated_at",
+                (user_id, updated_at, rows)
+            )
+            self._db.commit()
+    
+    def delete(self, user_id: str, updated_at: float = None):
+        """Deletes the session, or only the version of it last written at updated_at or before"""
+        with self._lock:
+            if updated_at is None:
+                self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            else:
+                self._db.execute("DELETE FROM sessions WHERE user_id = ? AND updated_at <= ?", (user_id, updated_at))
+            self._db.commit()
+    
+    def prune(self, before: float) -> int:
+        """Deletes the sessions idle since before; returns how many"""
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (before,)).rowcount
+            self._db.commit()
+        return deleted
+    
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class ConversationStore:
+    """
+    LRU of user sessions with a TTL, bounded in sessions and in bytes. The
+    byte count of a session is what its Python objects take (sys.getsizeof
+    of the session, its turns and their strings), kept up to date on every
+    turn, so max_bytes bounds the real footprint rather than a guess.
+    """
+    def __init__(self, max_turns: int = None, max_sessions: int = None, max_bytes: int = None,
+                 ttl_seconds: float = None, max_response_chars: int = None, backend: str = None,
+                 db_path: str = None):
+        self.max_turns = max_turns if max_turns is not None else Config.CONVERSATION_MAX_TURNS
+        self.max_sessions = max_sessions if max_sessions is not None else Config.CONVERSATION_MAX_SESSIONS
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CONVERSATION_MAX_BYTES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.CONVERSATION_TTL_SECONDS
+        self.max_response_chars = (
+            max_response_chars if max_response_chars is not None else Config.CONVERSATION_MAX_RESPONSE_CHARS
+        )
+        self.backend = (backend or Config.CONVERSATION_BACKEND).lower()
+        if self.backend not in CONVERSATION_BACKENDS:
+            raise ValueError(f"Unknown conversation backend '{self.backend}', expected one of {CONVERSATION_BACKENDS}")
+        
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._persisted = None
+        if self.backend == "sqlite":
+            self._persisted = _SQLiteSessions(db_path or Config.CONVERSATION_DB_PATH)
+            self._persisted.prune(time.time() - self.ttl_seconds)
+        
+        self.follow_ups = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def _drop(self, user_id: str) -> _Session:
+        session = self._sessions.pop(user_id)
+        self._bytes -= session.size
+        return session
+    
+    def _cached(self, user_id: str, now: float) -> Tuple[Optional[_Session], Optional[_Session]]:
+        """The user's live session in memory, and the one just dropped if it expired; call under the lock"""
+        session = self._sessions.get(user_id)
+        if session is None:
+            return None, None
+        if now - session.updated_at > self.ttl_seconds:
+            self._drop(user_id)
+            self.expirations += 1
+            return None, session
+        self._sessions.move_to_end(user_id)
+        return session, None
+    
+    def _session(self, user_id: str) -> Optional[_Session]:
+        """
+        The user's live session, loaded from SQLite if it was evicted from
+        memory. The lock only covers the memory; SQLite is read and written
+        without it, so one slow query doesn't hold up every other user.
+        """
+        now = time.time()
+        with self._lock:
+            session, expired = self._cached(user_id, now)
+        persisted = self._persisted
+        if persisted is None or session is not None:
+            return session
+        if expired is not None:
+            # Leaves the row alone if a concurrent turn has rewritten it since
+            persisted.delete(user_id, expired.updated_at)
+            return None
+        
+        turns = persisted.load(user_id, now - self.ttl_seconds)
+        if not turns:
+            return None
+        with self._lock:
+            # A concurrent request may have loaded or recorded the session meanwhile
+            session, _ = self._cached(user_id, now)
+            if session is None:
+                session = _Session(self.max_turns, turns, turns[-1].at)
+                self._insert(user_id, session)
+            return session
+    
+    def _insert(self, user_id: str, session: _Session):
+        self._sessions[user_id] = session
+        self._bytes += session.measure(user_id)
+        # The newest session always stays, even if it alone is over max_bytes
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._sessions)))
+            self.evictions += 1
+    
+    def history(self, user_id: Optional[str]) -> List[Turn]:
+        """The user's turns, oldest first; empty without a live session"""
+        if not user_id:
+            return []
+        session = self._session(user_id)
+        if session is None:
+            return []
+        with self._lock:
+            return list(session.turns)
+    
+    def recall(self, user_id: Optional[str], query: str) -> Optional[List[Turn]]:
+        """
+        The user's turns if the query is a follow-up to the last one, which
+        must have found documents; None when it is to be answered afresh.
+        The retriever still searches if the query doesn't match those documents.
+        """
+        if not user_id or self.max_turns <= 0 or not is_follow_up(query):
+            return None
+        turns = self.history(user_id)
+        if not turns or not turns[-1].doc_ids:
+            return None
+        return turns
+    
+    def record(self, user_id: Optional[str], query: str, response: str, doc_ids: Sequence[str],
+               follow_up: bool = False):
+        """Appends an answered query to the user's session; follow_up if it reused the previous documents"""
+        if not user_id or self.max_turns <= 0:
+            return
+        if len(response) > self.max_response_chars:
+            response = response[:self.max_response_chars].rstrip() + "..."
+        turn = Turn(query, response, tuple(doc_ids), time.time())
+        loaded = self._session(user_id)
+        
+        with self._lock:
+            if follow_up:
+                self.follow_ups += 1
+            session, _ = self._cached(user_id, turn.at)
+            if session is not None:
+                self._drop(user_id)
+            else:
+                # The session may have been evicted again since it was loaded
+                session = loaded if loaded is not None else _Session(self.max_turns)
+            session.turns.append(turn)
+            session.updated_at = turn.at
+            self._insert(user_id, session)
+            turns = list(session.turns)
+        
+        persisted = self._persisted
+        if persisted is not None:
+            persisted.save(user_id, turns, turn.at)
+    
+    async def arecall(self, user_id: Optional[str], query: str) -> Optional[List[Turn]]:
+        """Async variant of recall; SQLite is read on the executor instead of the event loop"""
+        if self._persisted is None:
+            return self.recall(user_id, query)
+        return await run_in_executor(self.recall, user_id, query)
+    
+    async def arecord(self, user_id: Optional[str], query: str, response: str, doc_ids: Sequence[str],
+                      follow_up: bool = False):
+        """Async variant of record; SQLite is written on the executor instead of the event loop"""
+        if self._persisted is None:
+            self.record(user_id, query, response, doc_ids, follow_up)
+        else:
+            await run_in_executor(self.record, user_id, query, response, doc_ids, follow_up)
+    
+    def forget(self, user_id: str):
+        """Deletes the user's session"""
+        with self._lock:
+            if user_id in self._sessions:
+                self._drop(user_id)
+        persisted = self._persisted
+        if persisted is not None:
+            persisted.delete(user_id)
+    
+    def close(self):
+        with self._lock:
+            if self._persisted is not None:
+                self._persisted.close()
+                self._persisted = None
+    
+    def stats(self) -> Dict:
+        """Session and memory counters for /system/info"""
+        persisted = self._persisted
+        persisted_sessions = persisted.count() if persisted is not None else None
+        with self._lock:
+            sizes = [session.size for session in self._sessions.values()]
+            return {
+                "backend": self.backend,
+                "sessions": len(sizes),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "mean_session_bytes": round(self._bytes / len(sizes)) if sizes else 0,
+                "max_session_bytes": max(sizes, default=0),
+                "persisted_sessions": persisted_sessions,
+                "follow_ups": self.follow_ups,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
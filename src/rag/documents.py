@@ -0,0 +1,71 @@
+# src/rag/documents.py
+import hashlib
+import os
+from typing import Dict, List, Tuple
+from src.rag.chunker import DocumentChunker, chunk_metadata
+from src.rag.fields import FIELD_SCHEMA_VERSION, parse_product_fields
+from src.utils.config import Config
+
+# Collection metadata that must match for stored vectors to be usable
+INDEX_SETTINGS = ("embedding_model", "chunking", "field_schema")
+
+def collection_metadata(chunker: DocumentChunker) -> Dict:
+    """Metadata stored on the products collection"""
+    return {
+        "description": "Product documents for RAG",
+        "embedding_model": Config.EMBEDDING_MODEL,
+        "chunking": chunker.describe(),
+        "field_schema": FIELD_SCHEMA_VERSION
+    }
+
+def document_id(doc_file: str) -> str:
+    return os.path.basename(doc_file).replace('.txt', '')
+
+def read_document(doc_file: str) -> Tuple[str, str, Dict]:
+    """Reads a document file and builds its id and metadata"""
+    with open(doc_file, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    
+    doc_id = document_id(doc_file)
+    metadata = {
+        "filename": os.path.basename(doc_file),
+        "source": doc_file,
+        "doc_id": doc_id,
+        "content_hash": hashlib.sha256(content.encode('utf-8')).hexdigest(),
+        "mtime": os.path.getmtime(doc_file)
+    }
+    metadata.update(parse_product_fields(content))
+    return doc_id, content, metadata
+
+def chunk_document(chunker: DocumentChunker, doc_id: str, content: str, metadata: Dict) -> Tuple[List, List, List, List]:
+    """
+    Splits a document into the ids, stored texts, texts to embed and
+    metadatas of its chunks. Without chunking the document is a single
+    chunk whose id is the document id.
+    """
+    chunks = chunker.chunk(content)
+    title = chunker.title(content)
+    
+    ids, texts, embed_texts, metadatas = [], [], [], []
+    for index, chunk in enumerate(chunks):
+        ids.append(f"{doc_id}#{index}" if chunker.enabled else doc_id)
+        texts.append(chunk.text)
+        embed_texts.append(chunk.embed_text)
+        metadatas.append(chunk_metadata(metadata, chunk, index, len(chunks), title))
+    return ids, texts, embed_texts, metadatas
+
+def lexical_text(document: str, metadata: Dict) -> str:
+    """
+    Text indexed for lexical search: the stored text plus the file name
+    words (e.g. "shampoo anticaspa") and, for chunks past the header, the
+    product name
+    """
+    parts = [metadata.get("doc_id", "").replace("_", " "), document]
+    if metadata.get("start_offset", 0) > 0:
+        parts.insert(0, metadata.get("title", ""))
+    return "\n".join(parts)
+
+def fingerprint(metadatas: List[Dict]) -> str:
+    """Identifies the indexed content; changes whenever a document does"""
+    entries = sorted({f"{m['doc_id']}:{m['content_hash']}" for m in metadatas})
+    return hashlib.sha256("\n".join(entries).encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,94 @@
+# src/rag/embeddings.py
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List
+from src.utils.config import Config
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+class EmbeddingEncoder:
+    """
+    Embedding layer on top of the configured SentenceTransformer: batched
+    encoding for ingestion and an LRU cache of query embeddings
+    """
+    def __init__(self, model: "SentenceTransformer", batch_size: int = None, cache_size: int = None):
+        self.model = model
+        self.batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+        self.cache_size = cache_size if cache_size is not None else Config.QUERY_EMBEDDING_CACHE_SIZE
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Cache key: case- and whitespace-insensitive query text"""
+        return " ".join(query.lower().split())
+    
+    def encode_documents(self, texts: List[str]) -> List[List[float]]:
+        """Encodes documents in batches of batch_size"""
+        if not texts:
+            return []
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        return embeddings.tolist()
+    
+    def encode_query(self, query: str) -> List[float]:
+        """Encodes a query, skipping the model for repeated questions"""
+        return self.encode_queries([query])[0]
+    
+    def encode_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Encodes many queries at once: cached ones are served from the LRU
+        cache and all the others go through the model in a single batched pass
+        """
+        keys = [self.normalize_query(query) for query in queries]
+        embeddings: List[List[float]] = [None] * len(keys)
+        missing: Dict[str, List[int]] = {}
+        
+        with self._lock:
+            for position, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    embeddings[position] = self._cache[key]
+                else:
+                    self.misses += 1
+                    missing.setdefault(key, []).append(position)
+        
+        if missing:
+            texts = list(missing)
+            vectors = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            ).tolist()
+            
+            with self._lock:
+                for key, vector in zip(texts, vectors):
+                    for position in missing[key]:
+                        embeddings[position] = vector
+                    if self.cache_size > 0:
+                        self._cache[key] = vector
+                        self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        return embeddings
+    
+    def cache_info(self) -> Dict:
+        """Query embedding cache statistics"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "max_size": self.cache_size
+        }
@@ -0,0 +1,149 @@
+# src/rag/fields.py
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence
+import numpy as np
+from src.rag.lexical import tokenize
+
+# Bump when parsing changes, so persistent indexes re-read their documents
+FIELD_SCHEMA_VERSION = 1
+
+# Document field label -> metadata key holding its normalized items
+LIST_FIELDS = {"ingredients": "ingredients", "indicated for": "indicated_for"}
+PRICE_PATTERN = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+def normalize_item(text: str) -> str:
+    """Lowercased, accent-folded words of a field item ("Ketoconazole 2%" -> "ketoconazole 2%")"""
+    return " ".join(tokenize(text))
+
+def field_lines(content: str) -> Dict[str, str]:
+    """Raw values of the "Label: value" lines, keyed by lowercased label (first occurrence wins)"""
+    lines = {}
+    for line in content.splitlines():
+        label, sep, value = line.partition(":")
+        if sep:
+            lines.setdefault(label.strip().lower(), value.strip())
+    return lines
+
+def parse_product_fields(content: str) -> Dict:
+    """
+    Typed metadata from the "Label: value" lines of a product document:
+    price as a float, ingredients and indicated_for as comma-separated
+    normalized items. Missing or unparsable fields are left out, since
+    Chroma metadata can't hold None.
+    """
+    lines = field_lines(content)
+    fields = {}
+    
+    match = PRICE_PATTERN.search(lines.get("price", ""))
+    if match:
+        fields["price"] = float(match.group(0).replace(",", ""))
+    for label, key in LIST_FIELDS.items():
+        if label in lines:
+            items = [normalize_item(item) for item in lines[label].split(",")]
+            fields[key] = ", ".join(item for item in items if item)
+    return fields
+
+class SearchFilters(NamedTuple):
+    """
+    Structured constraints applied before ranking. Prices are inclusive;
+    ingredient and skin_type match any item containing the given words
+    (e.g. "zinc" matches "zinc oxide", "dry skin" matches "especially dry skin").
+    """
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    ingredient: Optional[str] = None
+    skin_type: Optional[str] = None
+    
+    def is_empty(self) -> bool:
+        return all(value is None for value in self)
+
+class FieldIndex:
+    """
+    In-memory index of the parsed fields, one entry per collection id (the
+    same order as the lexical index). Item lists map each distinct item to
+    the positions holding it, so "contains" filters only scan the distinct
+    items, not the documents.
+    """
+    
+    def __init__(self):
+        self.ids: List[str] = []
+        self.parents: List[str] = []
+        self.price = np.zeros(0, dtype=np.float64)
+        self.items: Dict[str, Dict[str, np.ndarray]] = {key: {} for key in LIST_FIELDS.values()}
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def build(self, ids: Sequence[str], metadatas: Sequence[Dict]) -> "FieldIndex":
+        """Indexes the fields of each collection entry, replacing any previous content"""
+        self.ids = list(ids)
+        self.parents = [metadata.get("doc_id", doc_id) for doc_id, metadata in zip(ids, metadatas)]
+        # Entries without a price never match a price filter
+        self.price = np.array([metadata.get("price", np.nan) for metadata in metadatas], dtype=np.float64)
+        
+        for key in self.items:
+            positions: Dict[str, List[int]] = {}
+            for position, metadata in enumerate(metadatas):
+                for item in filter(None, metadata.get(key, "").split(", ")):
+                    positions.setdefault(item, []).append(position)
+            self.items[key] = {item: np.asarray(found, dtype=np.int32) for item, found in positions.items()}
+        return self
+    
+    def _containing(self, key: str, text: str) -> np.ndarray:
+        """Mask of entries with an item containing text"""
+        needle = normalize_item(text)
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for item, positions in self.items[key].items():
+            if needle in item:
+                mask[positions] = True
+        return mask
+    
+    def _term_mask(self, filters: SearchFilters) -> Optional[np.ndarray]:
+        """Mask for the ingredient and skin type filters, None if neither is set"""
+        mask = None
+        for key, text in (("ingredients", filters.ingredient), ("indicated_for", filters.skin_type)):
+            if text is not None:
+                found = self._containing(key, text)
+                mask = found if mask is None else mask & found
+        return mask
+    
+    def matches(self, filters: SearchFilters) -> np.ndarray:
+        """Boolean mask over the indexed entries that satisfy every filter"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        with np.errstate(invalid="ignore"):
+            if filters.min_price is not None:
+                mask &= self.price >= filters.min_price
+            if filters.max_price is not None:
+                mask &= self.price <= filters.max_price
+        term_mask = self._term_mask(filters)
+        return mask if term_mask is None else mask & term_mask
+    
+    def where(self, filters: SearchFilters) -> Optional[Dict]:
+        """
+        Equivalent Chroma where clause: the price range on the typed price
+        metadata, and the term filters resolved here to their parent doc_ids
+        (Chroma can't match substrings of metadata values)
+        """
+        conditions = []
+        if filters.min_price is not None:
+            conditions.append({"price": {"$gte": float(filters.min_price)}})
+        if filters.max_price is not None:
+            conditions.append({"price": {"$lte": float(filters.max_price)}})
+        
+        term_mask = self._term_mask(filters)
+        if term_mask is not None:
+            parents = sorted({self.parents[position] for position in np.flatnonzero(term_mask)})
+            conditions.append({"doc_id": {"$in": parents}})
+        
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    
+    def describe(self) -> Dict:
+        """Index stats for collection info"""
+        return {
+            "entries": len(self.ids),
+            "priced": int(np.count_nonzero(~np.isnan(self.price))),
+            "ingredients": len(self.items["ingredients"]),
+            "skin_types": len(self.items["indicated_for"])
+        }
@@ -1,62 +1,112 @@
 # src/rag/generator.py
-from openai import OpenAI
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional
 from src.utils.config import Config
+from src.rag.context_builder import BuiltContext, ContextBuilder
+from src.rag.conversation import Turn
+from src.rag.generator_backends import GenerationRequest, create_backend
+from src.utils.logger import get_logger
+from src.utils.metrics import observe_generation, observe_stage, record_first_token
+
+logger = get_logger(__name__)
 
 class ResponseGenerator:
-    def __init__(self):
+    """
+    Builds the prompt for a query and its documents and has the generator
+    backend (GENERATOR_BACKEND, see src.rag.generator_backends) answer it
+    """
+    def __init__(self, backend=None):
         self.config = Config()
-        self.client = OpenAI(api_key=self.config.OPENAI_API_KEY)
+        self.backend = backend if backend is not None else create_backend()
+        self.context_builder = ContextBuilder()
+    
+    def build_context(self, retrieved_docs: List[Dict]) -> BuiltContext:
+        """Packs the documents into the context token budget"""
+        with observe_stage("context_build"):
+            return self.context_builder.build(retrieved_docs)
+    
+    def _build_messages(self, query: str, retrieved_docs: List[Dict], context: Optional[BuiltContext] = None,
+                        history: Optional[List[Turn]] = None) -> List[Dict]:
+        """
+        Builds the chat messages for a query and its documents, after the
+        earlier turns of the conversation when the query follows up on them
+        """
+        # Build context from documents unless the caller already did
+        if context is None:
+            context = self.build_context(retrieved_docs)
+        
+        # Create prompt
+        prompt = self._create_prompt(query, context.text)
         
-    def generate_response(self, query: str, retrieved_docs: List[Dict]) -> str:
+        turns = [
+            message
+            for turn in history or []
+            for message in ({"role": "user", "content": turn.query}, {"role": "assistant", "content": turn.response})
+        ]
+        return [
+            {
+                "role": "system", 
+                "content": "You are an expert assistant in health and beauty products. Respond helpfully and accurately based only on the information provided."
+            },
+            *turns,
+            {
+                "role": "user", 
+                "content": prompt
+            }
+        ]
+    
+    def _request(self, query: str, retrieved_docs: List[Dict], context: Optional[BuiltContext] = None,
+                 history: Optional[List[Turn]] = None) -> GenerationRequest:
+        """What the backend answers; the context is built unless given"""
+        if context is None:
+            context = self.build_context(retrieved_docs)
+        return GenerationRequest(query, context, self._build_messages(query, retrieved_docs, context, history))
+    
+    def generate_response(self, query: str, retrieved_docs: List[Dict],
+                          context: Optional[BuiltContext] = None, history: Optional[List[Turn]] = None) -> str:
         """
-        Generates response using OpenAI based on retrieved documents
+        Generates the response to a query from the retrieved documents.
+        Raises LLMError when the backend fails for good or the guard refuses the call.
         """
-        try:
-            # Build context from documents
-            context = self._build_context(retrieved_docs)
-            
-            # Create prompt
-            prompt = self._create_prompt(query, context)
-            
-            # Call OpenAI
-            response = self.client.chat.completions.create(
-                model=self.config.MODEL_NAME,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are an expert assistant in health and beauty products. Respond helpfully and accurately based only on the information provided."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=300
-            )
-            
-            generated_response = response.choices[0].message.content.strip()
-            print(f"Response generated for: '{query}'")
-            return generated_response
-            
-        except Exception as e:
-            print(f"Error generating response: {e}")
-            return f"Sorry, I couldn't process your query at this time. Error: {str(e)}"
+        request = self._request(query, retrieved_docs, context, history)
+        with observe_stage("llm"), observe_generation(self.backend.name):
+            response = self.backend.generate(request)
+        
+        logger.debug("Response generated", extra={"query": query, "backend": self.backend.name})
+        return response
     
-    def _build_context(self, retrieved_docs: List[Dict]) -> str:
-        """Builds context from retrieved documents"""
-        if not retrieved_docs:
-            return "No relevant documents found."
+    async def agenerate_response(self, query: str, retrieved_docs: List[Dict],
+                                 context: Optional[BuiltContext] = None, history: Optional[List[Turn]] = None) -> str:
+        """
+        Async variant of generate_response that doesn't block the event loop
+        """
+        request = self._request(query, retrieved_docs, context, history)
+        with observe_stage("llm"), observe_generation(self.backend.name):
+            response = await self.backend.agenerate(request)
         
-        context_parts = []
-        for i, doc in enumerate(retrieved_docs, 1):
-            context_parts.append(f"Document {i}:\n{doc['content']}\n")
+        logger.debug("Response generated", extra={"query": query, "backend": self.backend.name})
+        return response
+    
+    async def astream_response(self, query: str, retrieved_docs: List[Dict],
+                               context: Optional[BuiltContext] = None,
+                               history: Optional[List[Turn]] = None) -> AsyncIterator[str]:
+        """
+        Streams the response as the backend produces it, one text delta at a
+        time. Raises LLMError like generate_response, possibly mid-stream.
+        """
+        request = self._request(query, retrieved_docs, context, history)
+        # Covers the whole stream, as that is how long the backend is busy with it
+        with observe_stage("llm"), observe_generation(self.backend.name) as started:
+            first = True
+            async for token in self.backend.astream(request):
+                if first:
+                    record_first_token(self.backend.name, started)
+                    first = False
+                yield token
         
-        return "\n".join(context_parts)
+        logger.debug("Response streamed", extra={"query": query, "backend": self.backend.name})
     
     def _create_prompt(self, query: str, context: str) -> str:
-        """Creates the prompt for OpenAI"""
+        """Creates the prompt for chat model backends"""
         prompt = f"""
 Available product information:
 {context}
@@ -0,0 +1,108 @@
+# src/rag/generator_backends.py
+"""
+Backends that write the answer for ResponseGenerator (GENERATOR_BACKEND):
+- openai: chat completions from api.openai.com or any OpenAI-compatible
+  server at OPENAI_BASE_URL (src.rag.openai_backend), behind the LLMGuard
+- extractive: in-process answers assembled from the context lines that
+  best match the query; no network and no model, for offline serving, CI
+  and benchmarking the rest of the stack
+
+A backend has a `name` used to label its metrics, and:
+- generate(request) -> str
+- agenerate(request) -> str
+- astream(request) -> AsyncIterator[str], the answer in text deltas
+- info() -> Dict, reported by /system/info
+where request is a GenerationRequest. Failures are raised as LLMError.
+"""
+import re
+from collections import Counter
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+from src.rag.context_builder import BuiltContext, ContextBuilder
+from src.rag.fields import field_lines
+from src.rag.lexical import tokenize
+from src.utils.config import Config
+
+GENERATOR_BACKENDS = ("openai", "extractive")
+# Query words that say nothing about which lines answer it
+STOPWORDS = {
+    "a", "an", "and", "the", "is", "are", "be", "of", "for", "to", "in", "on", "at", "by", "with", "or",
+    "it", "its", "this", "that", "these", "those", "what", "which", "how", "much", "many", "do", "does",
+    "can", "could", "should", "would", "i", "you", "we", "me", "my", "your", "there", "any", "some", "s"
+}
+
+class GenerationRequest(NamedTuple):
+    """What a backend answers: the query, its packed context and the chat prompt built from them"""
+    query: str
+    context: BuiltContext
+    messages: List[Dict]
+
+class ExtractiveBackend:
+    """
+    Answers from the prompt context alone. Documents are scored by the query
+    words they contain, each word weighted by how few context lines contain
+    it, so words found everywhere count for little. For each of the best
+    `max_docs` documents the answer gives its name, its price and the
+    `max_lines` lines matching the query best. It can't reason across
+    documents or rephrase, only quote.
+    """
+    name = "extractive"
+    NO_ANSWER = "I don't have that specific information."
+    DOCUMENT_HEADER = re.compile(r"^Document \d+:\n", re.MULTILINE)
+    
+    def __init__(self, max_docs: int = 3, max_lines: int = 2):
+        self.max_docs = max_docs
+        self.max_lines = max_lines
+    
+    def _documents(self, context: BuiltContext) -> List[List[str]]:
+        """Non-empty lines of each document in the context, in context order"""
+        if context.text == ContextBuilder.EMPTY_CONTEXT:
+            return []
+        blocks = self.DOCUMENT_HEADER.split(context.text)
+        return [lines for lines in ([line for line in block.split("\n") if line.strip()] for block in blocks) if lines]
+    
+    def generate(self, request: GenerationRequest) -> str:
+        documents = self._documents(request.context)
+        terms = set(tokenize(request.query)) - STOPWORDS
+        line_terms = [[terms.intersection(tokenize(line)) for line in lines] for lines in documents]
+        frequency = Counter(term for lines in line_terms for found in lines for term in found)
+        
+        def weight(found: set) -> float:
+            return sum(1 / frequency[term] for term in found)
+        
+        scores = [weight(set().union(*lines)) for lines in line_terms]
+        best = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])[:self.max_docs]
+        if not best:
+            return self.NO_ANSWER
+        
+        answers = []
+        for i in best:
+            title, *lines = documents[i]
+            price = field_lines("\n".join(lines)).get("price")
+            # Matching lines after the title (the price is given anyway), best first, then in document order
+            matching = [j for j, line in enumerate(lines) if line_terms[i][j + 1] and not line.lower().startswith("price:")]
+            picked = sorted(sorted(matching, key=lambda j: -weight(line_terms[i][j + 1]))[:self.max_lines])
+            details = "; ".join(lines[j].rstrip(" .") for j in picked)
+            answers.append(f"- {title}{f' ({price})' if price else ''}{f': {details}' if details else ''}")
+        return "Based on the available information:\n" + "\n".join(answers)
+    
+    async def agenerate(self, request: GenerationRequest) -> str:
+        return self.generate(request)
+    
+    async def astream(self, request: GenerationRequest) -> AsyncIterator[str]:
+        """The answer one line at a time; it is ready at once"""
+        lines = self.generate(request).split("\n")
+        for i, line in enumerate(lines):
+            yield line if i == 0 else f"\n{line}"
+    
+    def info(self) -> Dict:
+        return {"backend": self.name, "max_docs": self.max_docs, "max_lines": self.max_lines}
+
+def create_backend(name: Optional[str] = None):
+    """Generator backend by name, GENERATOR_BACKEND by default"""
+    name = (name or Config.GENERATOR_BACKEND).lower()
+    if name == "openai":
+        from src.rag.openai_backend import OpenAIBackend
+        return OpenAIBackend()
+    if name == "extractive":
+        return ExtractiveBackend()
+    raise ValueError(f"Unknown generator backend '{name}', expected one of {GENERATOR_BACKENDS}")
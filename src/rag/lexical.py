@@ -0,0 +1,146 @@
+# src/rag/lexical.py
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.%+][a-z0-9]*)*")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased, accent-folded tokens. Numbers keep their decimal point,
+    percent and plus signs, so "2%", "50+" and "18.75" stay searchable.
+    """
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return [token.rstrip(".") for token in TOKEN_PATTERN.findall(folded)]
+
+class BM25Index:
+    """
+    Okapi BM25 over an in-memory inverted index.
+    
+    Postings are stored CSR-style in flat NumPy arrays: the postings of term
+    t are doc_index[offsets[t]:offsets[t + 1]] with matching term_freq
+    entries. Besides the vocabulary dict this costs 6 bytes per posting and
+    8 bytes per document.
+    """
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self.vocabulary: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_index = np.zeros(0, dtype=np.int32)
+        self.term_freq = np.zeros(0, dtype=np.uint16)
+        self.doc_length = np.zeros(0, dtype=np.int32)
+        self.length_norm = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.avg_length = 0.0
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def build(self, ids: Sequence[str], texts: Iterable[str]) -> "BM25Index":
+        """Indexes texts under the given ids, replacing any previous content"""
+        self.ids = list(ids)
+        self.vocabulary = {}
+        term_ids, doc_indexes, freqs, lengths = [], [], [], []
+        
+        for index, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            counts: Dict[int, int] = {}
+            for token in tokens:
+                term = self.vocabulary.setdefault(token, len(self.vocabulary))
+                counts[term] = counts.get(term, 0) + 1
+            term_ids.extend(counts.keys())
+            doc_indexes.extend([index] * len(counts))
+            freqs.extend(counts.values())
+        
+        terms = np.asarray(term_ids, dtype=np.int32)
+        # Group postings by term; stable so each list stays in document order
+        order = np.argsort(terms, kind="stable")
+        self.doc_index = np.asarray(doc_indexes, dtype=np.int32)[order]
+        self.term_freq = np.minimum(np.asarray(freqs, dtype=np.int64)[order], np.iinfo(np.uint16).max).astype(np.uint16)
+        doc_freq = np.bincount(terms, minlength=len(self.vocabulary))
+        self.offsets = np.concatenate([[0], np.cumsum(doc_freq)]).astype(np.int64)
+        
+        self.doc_length = np.asarray(lengths, dtype=np.int32)
+        self.avg_length = float(self.doc_length.mean()) if len(self.ids) else 0.0
+        # Document-length part of the BM25 denominator, fixed once indexed
+        self.length_norm = (self.k1 * (1 - self.b + self.b * self.doc_length / max(self.avg_length, 1e-9))).astype(np.float32)
+        n_docs = len(self.ids)
+        self.idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        return self
+    
+    def search(self, query: str, top_k: int, allowed: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """
+        (id, score) pairs of the best matching documents, best first.
+        allowed is an optional boolean mask over the indexed documents.
+        """
+        terms = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not terms or top_k <= 0:
+            return []
+        
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs = self.doc_index[start:end]
+            tf = self.term_freq[start:end].astype(np.float32)
+            # A term occurs once per posting list entry, so plain indexing is safe
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+        if allowed is not None:
+            scores[~allowed] = 0
+        
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        best = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in best]
+    
+    def memory_bytes(self) -> int:
+        """Size of the posting and document arrays (the vocabulary is not counted)"""
+        arrays = (self.offsets, self.doc_index, self.term_freq, self.doc_length, self.length_norm, self.idf)
+        return int(sum(array.nbytes for array in arrays))
+    
+    def save(self, path: str):
+        """Writes the index to an .npz file"""
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez(
+            path,
+            params=np.array([self.k1, self.b, self.avg_length]),
+            ids=np.array(self.ids, dtype=str),
+            terms=np.array(terms, dtype=str),
+            offsets=self.offsets,
+            doc_index=self.doc_index,
+            term_freq=self.term_freq,
+            doc_length=self.doc_length,
+            length_norm=self.length_norm,
+            idf=self.idf
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Reads an index written by save"""
+        with np.load(path) as data:
+            k1, b, avg_length = data["params"].tolist()
+            index = cls(k1, b)
+            index.avg_length = avg_length
+            index.ids = data["ids"].tolist()
+            index.vocabulary = {term: position for position, term in enumerate(data["terms"].tolist())}
+            for name in ("offsets", "doc_index", "term_freq", "doc_length", "length_norm", "idf"):
+                setattr(index, name, data[name])
+        return index
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuses ranked id lists: each id scores sum(1 / (k + rank)) over the
+    lists it appears in. Returns (id, score) pairs, best first; ties keep
+    the order in which ids were first seen.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
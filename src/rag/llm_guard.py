@@ -0,0 +1,363 @@
+# src/rag/llm_guard.py
+"""
+Resilience for the LLM calls of the openai generator backend. Every call
+goes through the process-wide LLMGuard (registry.get_llm_guard), which applies:
+- a timeout per attempt (LLM_TIMEOUT) and a deadline for the whole call,
+  retries and backoff included (LLM_DEADLINE)
+- up to LLM_MAX_RETRIES retries of retryable errors (timeouts, connection
+  errors, rate limiting, 5xx) with jittered exponential backoff, waiting at
+  least as long as the API's Retry-After
+- a limit on calls in flight (LLM_MAX_CONCURRENCY); a call waits at most
+  LLM_QUEUE_TIMEOUT seconds for a slot, and is refused after that
+- a circuit breaker: after LLM_BREAKER_THRESHOLD consecutive failed calls,
+  calls are refused for LLM_BREAKER_COOLDOWN seconds without reaching the
+  API, then a single probe call decides whether the circuit closes again
+Failures are raised as LLMError subclasses carrying the HTTP status the
+API answers with. The OpenAI client is not imported here: the caller
+passes the function that maps its exceptions to LLMError.
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from src.utils.config import Config
+from src.utils.logger import get_logger
+from src.utils.metrics import record_llm_rejected, record_llm_retry
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+class LLMError(Exception):
+    """A failed LLM call; status_code is the HTTP status the API answers with"""
+    status_code = 502
+    
+    def __init__(self, message: str, reason: str = "error", retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        # Short label for logs and metrics: timeout, connection, rate_limited, ...
+        self.reason = reason
+        self.retryable = retryable
+        # Seconds the client should wait before trying again, when known
+        self.retry_after = retry_after
+
+class LLMTimeoutError(LLMError):
+    status_code = 504
+
+class LLMOverloadedError(LLMError):
+    """Rate limited by the API, or no free slot for the call in time"""
+    status_code = 503
+
+class LLMCircuitOpenError(LLMError):
+    """Refused without calling the API while the circuit is open"""
+    status_code = 503
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures (0 disables it). While
+    open, calls are refused until `cooldown` seconds have passed; the next
+    call is then let through as a probe, and its success closes the circuit
+    while its failure opens it for another cooldown. Other calls are
+    refused while the probe runs, for at most one more cooldown.
+    """
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._probing else "open"
+    
+    def before_call(self):
+        """Raises LLMCircuitOpenError unless the call may go ahead"""
+        if not self.threshold:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if remaining <= 0:
+                # This call is the probe; the cooldown restarts for the others
+                self._opened_at = time.monotonic()
+                self._probing = True
+                return
+        record_llm_rejected("circuit_open")
+        raise LLMCircuitOpenError(
+            "LLM calls suspended after repeated failures", reason="circuit_open", retry_after=remaining
+        )
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+    
+    def record_failure(self) -> bool:
+        """Counts a failed call; True when it opened the circuit"""
+        if not self.threshold:
+            return False
+        with self._lock:
+            self._failures += 1
+            # Calls started before the circuit opened may still fail afterwards
+            if self._probing or (self._opened_at is None and self._failures >= self.threshold):
+                self._opened_at = time.monotonic()
+                self._probing = False
+                return True
+            return False
+
+class _Waiter:
+    """A call queued for a slot; notify() wakes it once the slot is granted"""
+    __slots__ = ("notify", "granted")
+    
+    def __init__(self, notify: Callable[[], None]):
+        self.notify = notify
+        self.granted = False
+
+class ConcurrencyLimiter:
+    """
+    At most `limit` calls in flight (0 = no limit), shared by threads and
+    coroutines on any event loop. Waiting calls get the freed slots in
+    arrival order, and fail with LLMOverloadedError after `wait_timeout`.
+    """
+    def __init__(self, limit: int, wait_timeout: float):
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+    
+    @property
+    def active(self) -> int:
+        return self._active
+    
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+    
+    def _try_acquire(self) -> bool:
+        """Takes a free slot unless calls are already queued for one; caller holds the lock"""
+        if self.limit <= 0 or (self._active < self.limit and not self._waiters):
+            self._active += 1
+            return True
+        return False
+    
+    def _overloaded(self) -> LLMOverloadedError:
+        record_llm_rejected("overloaded")
+        return LLMOverloadedError(
+            f"Too many LLM calls in flight (max {self.limit})", reason="overloaded", retry_after=self.wait_timeout
+        )
+    
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # The slot passes straight to the next waiter
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.notify()
+            else:
+                self._active -= 1
+    
+    @contextmanager
+    def slot(self):
+        """Holds a slot for the block, blocking the thread while waiting for one"""
+        with self._lock:
+            if not self._try_acquire():
+                event = threading.Event()
+                waiter = _Waiter(event.set)
+                self._waiters.append(waiter)
+            else:
+                waiter = None
+        
+        if waiter is not None and not event.wait(self.wait_timeout):
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if not granted:
+                raise self._overloaded()
+        try:
+            yield
+        finally:
+            self.release()
+    
+    @asynccontextmanager
+    async def aslot(self):
+        """Async variant of slot that waits without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._try_acquire():
+                future = loop.create_future()
+                waiter = _Waiter(lambda: loop.call_soon_threadsafe(_resolve, future))
+                self._waiters.append(waiter)
+            else:
+                waiter = None
+        
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(future, self.wait_timeout)
+            except BaseException as e:
+                with self._lock:
+                    granted = waiter.granted
+                    if not granted:
+                        self._waiters.remove(waiter)
+                if not granted:
+                    raise self._overloaded() if isinstance(e, asyncio.TimeoutError) else e
+                if not isinstance(e, asyncio.TimeoutError):
+                    # Cancelled just as the slot was granted: hand it on
+                    self.release()
+                    raise
+        try:
+            yield
+        finally:
+            self.release()
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+class LLMGuard:
+    """
+    Runs LLM calls under the timeouts, retries, concurrency limit and
+    circuit breaker described in the module docstring. Each method takes
+    the call as a function of the attempt's timeout in seconds, and
+    `classify`, which maps the exceptions it raises to LLMError.
+    """
+    def __init__(self, timeout: float = None, deadline: float = None, max_retries: int = None,
+                 base_delay: float = None, max_delay: float = None, max_concurrency: int = None,
+                 queue_timeout: float = None, breaker_threshold: int = None, breaker_cooldown: float = None):
+        self.timeout = Config.LLM_TIMEOUT if timeout is None else timeout
+        self.deadline = Config.LLM_DEADLINE if deadline is None else deadline
+        self.max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = Config.LLM_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = Config.LLM_RETRY_MAX_DELAY if max_delay is None else max_delay
+        self.limiter = ConcurrencyLimiter(
+            Config.LLM_MAX_CONCURRENCY if max_concurrency is None else max_concurrency,
+            Config.LLM_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        )
+        self.breaker = CircuitBreaker(
+            Config.LLM_BREAKER_THRESHOLD if breaker_threshold is None else breaker_threshold,
+            Config.LLM_BREAKER_COOLDOWN if breaker_cooldown is None else breaker_cooldown
+        )
+    
+    def backoff(self, attempt: int, error: LLMError) -> float:
+        """Full-jitter exponential delay before retry number attempt + 1, no shorter than Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, error.retry_after or 0)
+    
+    def _attempt_timeout(self, deadline: float) -> float:
+        return max(0.0, min(self.timeout, deadline - time.monotonic()))
+    
+    def _failed(self, error: Exception, classify: Callable[[Exception], LLMError]) -> LLMError:
+        """Classifies a failed attempt and reports it to the circuit breaker"""
+        if not isinstance(error, LLMError):
+            cause, error = error, classify(error)
+            error.__cause__ = cause
+        if not error.retryable:
+            # The API answered; only this request was refused
+            self.breaker.record_success()
+        elif self.breaker.record_failure():
+            logger.warning("LLM circuit opened", extra={
+                "reason": error.reason, "cooldown_s": self.breaker.cooldown, "error": str(error)
+            })
+        return error
+    
+    def _retry_delay(self, error: LLMError, attempt: int, deadline: float) -> Optional[float]:
+        """Seconds to wait before retrying, or None when the call fails with error"""
+        if not error.retryable or attempt >= self.max_retries:
+            return None
+        delay = self.backoff(attempt, error)
+        if time.monotonic() + delay >= deadline:
+            return None
+        record_llm_retry(error.reason)
+        logger.debug("Retrying LLM call", extra={"reason": error.reason, "attempt": attempt + 1, "delay_s": round(delay, 3)})
+        return delay
+    
+    def call(self, func: Callable[[float], T], classify: Callable[[Exception], LLMError]) -> T:
+        """
+        Runs func(timeout) until it succeeds or fails for good. The timeout
+        is handed to the client; a blocking call can't be cut short here.
+        """
+        deadline = time.monotonic() + self.deadline
+        for attempt in itertools.count():
+            self.breaker.before_call()
+            with self.limiter.slot():
+                try:
+                    result = func(self._attempt_timeout(deadline))
+                except Exception as e:
+                    error = self._failed(e, classify)
+                else:
+                    self.breaker.record_success()
+                    return result
+            delay = self._retry_delay(error, attempt, deadline)
+            if delay is None:
+                raise error
+            time.sleep(delay)
+    
+    async def acall(self, func: Callable[[float], Awaitable[T]], classify: Callable[[Exception], LLMError]) -> T:
+        """Async variant of call; an attempt is cancelled once its timeout expires"""
+        deadline = time.monotonic() + self.deadline
+        for attempt in itertools.count():
+            self.breaker.before_call()
+            async with self.limiter.aslot():
+                timeout = self._attempt_timeout(deadline)
+                try:
+                    result = await asyncio.wait_for(func(timeout), timeout)
+                except Exception as e:
+                    error = self._failed(e, classify)
+                else:
+                    self.breaker.record_success()
+                    return result
+            delay = self._retry_delay(error, attempt, deadline)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+    
+    async def astream(self, open_stream: Callable[[float], Awaitable[AsyncIterable[T]]],
+                      classify: Callable[[Exception], LLMError]) -> AsyncIterator[T]:
+        """
+        Yields the items of the stream opened by open_stream(timeout),
+        holding a slot until it is consumed. Opening the stream is retried;
+        once an item has been yielded, a failure is raised as is.
+        """
+        deadline = time.monotonic() + self.deadline
+        for attempt in itertools.count():
+            self.breaker.before_call()
+            started = False
+            async with self.limiter.aslot():
+                timeout = self._attempt_timeout(deadline)
+                try:
+                    stream = await asyncio.wait_for(open_stream(timeout), timeout)
+                    async for item in stream:
+                        started = True
+                        yield item
+                except Exception as e:
+                    error = self._failed(e, classify)
+                else:
+                    self.breaker.record_success()
+                    return
+            delay = None if started else self._retry_delay(error, attempt, deadline)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+    
+    def stats(self) -> Dict:
+        return {
+            "circuit": self.breaker.state,
+            "in_flight": self.limiter.active,
+            "waiting": self.limiter.waiting,
+            "max_concurrency": self.limiter.limit,
+            "max_retries": self.max_retries,
+            "timeout_s": self.timeout,
+            "deadline_s": self.deadline
+        }
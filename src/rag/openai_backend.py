@@ -0,0 +1,120 @@
+# src/rag/openai_backend.py
+"""
+OpenAI-compatible generator backend of src.rag.generator_backends. Talks to
+api.openai.com, or to any server with the same chat completions API (vLLM,
+llama.cpp, Ollama, ...) at OPENAI_BASE_URL. Imported only when the backend
+is created, so the extractive backend never loads the OpenAI client.
+"""
+import openai
+from openai import OpenAI, AsyncOpenAI
+from typing import AsyncIterator, Dict, Optional
+from src.rag.generator_backends import GenerationRequest
+from src.rag.llm_guard import LLMError, LLMGuard, LLMOverloadedError, LLMTimeoutError
+from src.rag.registry import get_llm_guard
+from src.utils.config import Config
+from src.utils.http_client import get_async_http_client
+
+def _retry_after(response) -> Optional[float]:
+    """Seconds from a Retry-After header, if it holds a number"""
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, ValueError):
+        return None
+
+def classify_error(error: Exception) -> LLMError:
+    """Maps an OpenAI client exception to the LLMError the guard retries (or not) and the API reports"""
+    if isinstance(error, (openai.APITimeoutError, TimeoutError)):
+        return LLMTimeoutError("LLM call timed out", reason="timeout", retryable=True)
+    if isinstance(error, openai.APIConnectionError):
+        return LLMError(f"LLM API unreachable: {error}", reason="connection", retryable=True)
+    if isinstance(error, openai.RateLimitError):
+        return LLMOverloadedError(f"LLM API rate limit: {error}", reason="rate_limited", retryable=True,
+                                  retry_after=_retry_after(error.response))
+    if isinstance(error, openai.APIStatusError):
+        retryable = error.status_code >= 500
+        return LLMError(f"LLM API error {error.status_code}: {error}",
+                        reason="server_error" if retryable else "rejected", retryable=retryable,
+                        retry_after=_retry_after(error.response))
+    return LLMError(f"LLM call failed: {error}")
+
+def completion_text(response) -> str:
+    """
+    The text of a chat completion. Refusals, tool calls and filtered
+    completions come back without content, which is an LLMError rather
+    than an empty answer.
+    """
+    choice = response.choices[0] if response.choices else None
+    content = ((choice.message.content if choice is not None else None) or "").strip()
+    if not content:
+        finish_reason = choice.finish_reason if choice is not None else None
+        raise LLMError(f"LLM returned an empty completion (finish_reason: {finish_reason})", reason="empty")
+    return content
+
+class OpenAIBackend:
+    """Chat completions over HTTP, every call run under the LLMGuard"""
+    name = "openai"
+    
+    def __init__(self, guard: Optional[LLMGuard] = None, model: str = None, base_url: str = None):
+        self.model = model or Config.MODEL_NAME
+        self.base_url = base_url or Config.OPENAI_BASE_URL or None
+        # Retries are left to the guard, which also bounds them with a deadline
+        self.client = OpenAI(api_key=Config.OPENAI_API_KEY, base_url=self.base_url, max_retries=0)
+        self.guard = guard if guard is not None else get_llm_guard()
+        self._async_client = None
+        self._async_http_client = None
+    
+    def _get_async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client bound to the shared pooled HTTP client"""
+        http_client = get_async_http_client()
+        if self._async_client is None or self._async_http_client is not http_client:
+            self._async_client = AsyncOpenAI(
+                api_key=Config.OPENAI_API_KEY,
+                base_url=self.base_url,
+                http_client=http_client,
+                max_retries=0
+            )
+            self._async_http_client = http_client
+        return self._async_client
+    
+    def _completion_params(self, request: GenerationRequest) -> Dict:
+        """Parameters shared by every chat completion call"""
+        return {
+            "model": self.model,
+            "messages": request.messages,
+            "temperature": 0.7,
+            "max_tokens": 300
+        }
+    
+    def generate(self, request: GenerationRequest) -> str:
+        params = self._completion_params(request)
+        response = self.guard.call(
+            lambda timeout: self.client.chat.completions.create(**params, timeout=timeout),
+            classify_error
+        )
+        return completion_text(response)
+    
+    async def agenerate(self, request: GenerationRequest) -> str:
+        params = self._completion_params(request)
+        response = await self.guard.acall(
+            lambda timeout: self._get_async_client().chat.completions.create(**params, timeout=timeout),
+            classify_error
+        )
+        return completion_text(response)
+    
+    async def astream(self, request: GenerationRequest) -> AsyncIterator[str]:
+        params = self._completion_params(request)
+        
+        def open_stream(timeout: float):
+            return self._get_async_client().chat.completions.create(**params, stream=True, timeout=timeout)
+        
+        async for chunk in self.guard.astream(open_stream, classify_error):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def info(self) -> Dict:
+        return {
+            "backend": self.name,
+            "model": self.model,
+            "base_url": self.base_url or "https://api.openai.com/v1",
+            "llm_guard": self.guard.stats()
+        }
@@ -0,0 +1,154 @@
+# src/rag/quantization.py
+"""
+Compressed embeddings for the NumPy vector store (VECTOR_QUANTIZATION).
+
+A quantizer is fitted on a collection's normalized embeddings and encodes
+them into compact codes that are scanned for every query; only a short
+list of the best approximate matches is then rescored with the float
+embeddings. Two schemes:
+- int8: one signed byte per dimension with a per-dimension scale, 4x smaller
+- pq: product quantization. The vector is cut into sub-vectors of
+  PQ_SUBVECTOR_DIM dimensions and each is replaced by the id (one byte) of
+  its nearest of 256 centroids learned with k-means, 4 * PQ_SUBVECTOR_DIM
+  times smaller. Scores are summed from per-query lookup tables.
+"""
+from typing import Dict, Optional
+import numpy as np
+from src.utils.config import Config
+
+QUANTIZATIONS = ("none", "int8", "pq")
+# Rows scored per step, so a scan never materializes a float copy of the codes
+BLOCK_ROWS = 16384
+
+class Int8Quantizer:
+    """Symmetric int8 codes: x[d] ~ code[d] * scale[d]"""
+    kind = "int8"
+    
+    def __init__(self, scale: Optional[np.ndarray] = None):
+        self.scale = scale
+    
+    def fit(self, matrix: np.ndarray) -> "Int8Quantizer":
+        peak = np.abs(matrix).max(axis=0) if len(matrix) else np.ones(matrix.shape[1], dtype=np.float32)
+        self.scale = (np.where(peak > 0, peak, 1) / 127).astype(np.float32)
+        return self
+    
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(matrix / self.scale), -127, 127).astype(np.int8)
+    
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate dot products of queries (rows) with every coded vector"""
+        scaled = queries * self.scale
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block = codes[start:start + BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = scaled @ block.T
+        return scores
+    
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"scale": self.scale}
+    
+    def matches(self) -> bool:
+        """Whether this quantizer was built with the current settings"""
+        return True
+
+class ProductQuantizer:
+    """Product quantization with 256 centroids per sub-vector (one byte each)"""
+    kind = "pq"
+    
+    def __init__(self, subvector_dim: int = None, centroids: Optional[np.ndarray] = None,
+                 iterations: int = 12, train_size: int = 10000, seed: int = 0):
+        self.subvector_dim = subvector_dim or Config.PQ_SUBVECTOR_DIM
+        # (subvectors, clusters, subvector_dim)
+        self.centroids = centroids
+        self.iterations = iterations
+        self.train_size = train_size
+        self.seed = seed
+    
+    def _split(self, matrix: np.ndarray) -> np.ndarray:
+        """(rows, subvectors, subvector_dim) view, zero-padded to whole sub-vectors"""
+        padding = -matrix.shape[1] % self.subvector_dim
+        if padding:
+            matrix = np.pad(matrix, ((0, 0), (0, padding)))
+        return matrix.reshape(len(matrix), -1, self.subvector_dim)
+    
+    def fit(self, matrix: np.ndarray) -> "ProductQuantizer":
+        """k-means per sub-vector space, on a sample of at most train_size rows"""
+        rng = np.random.default_rng(self.seed)
+        if len(matrix) > self.train_size:
+            matrix = matrix[np.sort(rng.choice(len(matrix), self.train_size, replace=False))]
+        parts = self._split(np.asarray(matrix, dtype=np.float32))
+        clusters = min(256, len(parts))
+        
+        centroids = []
+        for subspace in range(parts.shape[1]):
+            data = parts[:, subspace]
+            centers = data[rng.choice(len(data), clusters, replace=False)].copy()
+            for _ in range(self.iterations):
+                assignment = self._nearest(data, centers)
+                counts = np.bincount(assignment, minlength=clusters)
+                sums = np.stack([
+                    np.bincount(assignment, weights=data[:, dim], minlength=clusters) for dim in range(data.shape[1])
+                ], axis=1)
+                # Empty clusters keep their previous center
+                filled = counts > 0
+                centers[filled] = sums[filled] / counts[filled, None]
+            centroids.append(centers)
+        self.centroids = np.stack(centroids)
+        return self
+    
+    @staticmethod
+    def _nearest(data: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        distances = (centers ** 2).sum(axis=1) - 2 * data @ centers.T
+        return distances.argmin(axis=1)
+    
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(matrix), len(self.centroids)), dtype=np.uint8)
+        for start in range(0, len(matrix), BLOCK_ROWS):
+            parts = self._split(np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32))
+            for subspace, centers in enumerate(self.centroids):
+                codes[start:start + len(parts), subspace] = self._nearest(parts[:, subspace], centers)
+        return codes
+    
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate dot products, summed from each query's sub-vector lookup table"""
+        # (queries, subvectors, clusters)
+        tables = np.einsum("qms,mks->qmk", self._split(queries), self.centroids)
+        scores = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            # One contiguous row of codes per sub-vector
+            block = np.ascontiguousarray(codes[start:start + BLOCK_ROWS].T)
+            target = scores[:, start:start + block.shape[1]]
+            for subspace, column in enumerate(block):
+                target += tables[:, subspace, column]
+        return scores
+    
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids, "subvector_dim": np.array(self.subvector_dim)}
+    
+    def matches(self) -> bool:
+        return self.subvector_dim == Config.PQ_SUBVECTOR_DIM
+
+def create_quantizer(kind: str):
+    """Unfitted quantizer of the given kind"""
+    if kind == "int8":
+        return Int8Quantizer()
+    if kind == "pq":
+        return ProductQuantizer()
+    raise ValueError(f"Unknown quantization '{kind}', expected one of {QUANTIZATIONS}")
+
+def save_codes(path: str, quantizer, codes: np.ndarray):
+    """Writes a fitted quantizer and its codes to an .npz file"""
+    with open(path, "wb") as f:
+        np.savez(f, kind=np.array(quantizer.kind), codes=codes, **quantizer.state())
+
+def load_codes(path: str):
+    """(quantizer, codes) written by save_codes"""
+    with np.load(path) as data:
+        kind = str(data["kind"])
+        if kind == "int8":
+            quantizer = Int8Quantizer(data["scale"])
+        elif kind == "pq":
+            quantizer = ProductQuantizer(int(data["subvector_dim"]), data["centroids"])
+        else:
+            raise ValueError(f"Unknown quantization '{kind}' in {path}")
+        return quantizer, data["codes"]
@@ -0,0 +1,96 @@
+# src/rag/registry.py
+import threading
+from typing import TYPE_CHECKING, Optional
+from src.utils.config import Config
+from src.utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = get_logger(__name__)
+
+# Process-wide instances shared by both multi-agent systems and every agent.
+# Loading the embedding model and indexing the corpus are the most expensive
+# parts of startup, so they must happen exactly once per process.
+_lock = threading.RLock()
+_embedding_model: Optional["SentenceTransformer"] = None
+_cross_encoder = None
+_retriever = None
+_response_cache = None
+_llm_guard = None
+_conversation_store = None
+
+def get_embedding_model() -> "SentenceTransformer":
+    """Returns the shared SentenceTransformer, loading it on first use"""
+    global _embedding_model
+    with _lock:
+        if _embedding_model is None:
+            # Imported here: torch alone takes seconds, and importing the app must stay cheap
+            from sentence_transformers import SentenceTransformer
+            logger.info("Loading embedding model", extra={"model": Config.EMBEDDING_MODEL})
+            _embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
+        return _embedding_model
+
+def get_cross_encoder():
+    """Returns the shared reranking CrossEncoder, loading it on first use"""
+    global _cross_encoder
+    with _lock:
+        if _cross_encoder is None:
+            from sentence_transformers import CrossEncoder
+            logger.info("Loading rerank model", extra={"model": Config.RERANK_MODEL})
+            _cross_encoder = CrossEncoder(Config.RERANK_MODEL, max_length=Config.RERANK_MAX_LENGTH)
+        return _cross_encoder
+
+def get_retriever():
+    """Returns the shared DocumentRetriever, building the index on first use"""
+    global _retriever
+    # Imported here because DocumentRetriever resolves its model from this module
+    from src.rag.retriever import DocumentRetriever
+    
+    with _lock:
+        if _retriever is None:
+            _retriever = DocumentRetriever()
+        return _retriever
+
+def get_response_cache():
+    """Returns the semantic response cache shared by both systems"""
+    global _response_cache
+    from src.rag.response_cache import SemanticResponseCache
+    
+    with _lock:
+        if _response_cache is None:
+            _response_cache = SemanticResponseCache()
+        return _response_cache
+
+def get_llm_guard():
+    """Returns the LLM call guard; its concurrency limit and circuit breaker cover the whole process"""
+    global _llm_guard
+    from src.rag.llm_guard import LLMGuard
+    
+    with _lock:
+        if _llm_guard is None:
+            _llm_guard = LLMGuard()
+        return _llm_guard
+
+def get_conversation_store():
+    """Returns the per-user conversation memory shared by both systems"""
+    global _conversation_store
+    from src.rag.conversation import ConversationStore
+    
+    with _lock:
+        if _conversation_store is None:
+            _conversation_store = ConversationStore()
+        return _conversation_store
+
+def shutdown():
+    """Drops the shared instances (FastAPI shutdown, tests)"""
+    global _embedding_model, _cross_encoder, _retriever, _response_cache, _llm_guard, _conversation_store
+    with _lock:
+        _retriever = None
+        _embedding_model = None
+        _cross_encoder = None
+        _response_cache = None
+        _llm_guard = None
+        if _conversation_store is not None:
+            _conversation_store.close()
+        _conversation_store = None
@@ -0,0 +1,79 @@
+# src/rag/reranker.py
+import time
+from typing import Dict, List, Tuple
+from src.rag.registry import get_cross_encoder
+from src.utils.config import Config
+from src.utils.logger import get_logger
+from src.utils.metrics import observe_stage, record_rerank_truncated
+
+logger = get_logger(__name__)
+
+class CrossEncoderReranker:
+    """
+    Rescores retrieval candidates with a cross-encoder, which reads the query
+    and each document together and orders them far better than embedding
+    distance, at an inference cost per candidate.
+    
+    Pairs are scored in batches, best retrieved first. When the next batch
+    would overrun the time budget, scoring stops and the candidates left
+    keep their retrieval order after the scored ones. Returned documents
+    carry a rerank_score (None if they were not scored) and are in final
+    order.
+    """
+    
+    def __init__(self, model=None, batch_size: int = None, budget_ms: float = None):
+        self.model = model or get_cross_encoder()
+        self.batch_size = batch_size or Config.RERANK_BATCH_SIZE
+        self.budget_ms = Config.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+    
+    def rerank(self, query: str, docs: List[Dict], top_k: int) -> List[Dict]:
+        """The top_k best of docs for the query"""
+        return self.rerank_batch([query], [docs], top_k)[0]
+    
+    def rerank_batch(self, queries: List[str], batch_docs: List[List[Dict]], top_k: int) -> List[List[Dict]]:
+        """
+        rerank for many queries, with their pairs sharing inference batches.
+        The budget scales with the number of queries; pairs are taken rank by
+        rank across queries, so a cut drops the weakest candidates of each.
+        """
+        pairs = [
+            (position, rank)
+            for rank in range(max((len(docs) for docs in batch_docs), default=0))
+            for position, docs in enumerate(batch_docs)
+            if rank < len(docs)
+        ]
+        scores = self._score(queries, batch_docs, pairs, self.budget_ms / 1000 * len(queries))
+        
+        results = []
+        for position, docs in enumerate(batch_docs):
+            scored = [(scores[(position, rank)], rank) for rank in range(len(docs)) if (position, rank) in scores]
+            # Stable: equal scores keep retrieval order
+            order = [rank for _, rank in sorted(scored, key=lambda item: -item[0])]
+            order += [rank for rank in range(len(docs)) if (position, rank) not in scores]
+            results.append([
+                {**docs[rank], "rerank_score": scores.get((position, rank))}
+                for rank in order[:top_k]
+            ])
+        return results
+    
+    def _score(self, queries: List[str], batch_docs: List[List[Dict]],
+               pairs: List[Tuple[int, int]], budget_s: float) -> Dict[Tuple[int, int], float]:
+        """Scores pairs batch by batch until done or out of budget (0 = no limit)"""
+        scores = {}
+        start = time.perf_counter()
+        with observe_stage("rerank"):
+            for batch, begin in enumerate(range(0, len(pairs), self.batch_size)):
+                elapsed = time.perf_counter() - start
+                # Predict the next batch from the average so far; the first always runs
+                if budget_s > 0 and batch and elapsed + elapsed / batch > budget_s:
+                    record_rerank_truncated()
+                    logger.debug("Rerank budget exhausted", extra={"scored": len(scores), "candidates": len(pairs)})
+                    break
+                chunk = pairs[begin:begin + self.batch_size]
+                values = self.model.predict(
+                    [(queries[position], batch_docs[position][rank]["content"]) for position, rank in chunk],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+                scores.update(zip(chunk, (float(value) for value in values)))
+        return scores
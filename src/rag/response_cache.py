@@ -0,0 +1,125 @@
+# src/rag/response_cache.py
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional
+from src.utils.config import Config
+
+class _CacheEntry:
+    __slots__ = ("embedding", "doc_key", "response", "created_at")
+    
+    def __init__(self, embedding: np.ndarray, doc_key: FrozenSet[str], response: str):
+        self.embedding = embedding
+        self.doc_key = doc_key
+        self.response = response
+        self.created_at = time.monotonic()
+
+class SemanticResponseCache:
+    """
+    Response cache in front of the LLM call. An entry is reused when the new
+    query embedding is within the cosine similarity threshold of a cached one
+    AND retrieval returned exactly the same documents. Entries expire after a
+    TTL, the least recently used are evicted beyond max_entries, and the whole
+    cache is dropped when the document index changes.
+    """
+    def __init__(self, threshold: float = None, max_entries: int = None, ttl_seconds: float = None):
+        self.threshold = threshold if threshold is not None else Config.RESPONSE_CACHE_THRESHOLD
+        self.max_entries = max_entries if max_entries is not None else Config.RESPONSE_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.RESPONSE_CACHE_TTL_SECONDS
+        
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        # Entries grouped by retrieved doc ids, so lookups only compare
+        # embeddings of queries that retrieved the same documents
+        self._buckets: Dict[FrozenSet[str], List[int]] = {}
+        self._next_id = 0
+        self._index_version = None
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _check_index_version(self, index_version: str):
+        """Drops every entry if the index changed since they were stored"""
+        if index_version != self._index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._buckets.clear()
+            self._index_version = index_version
+    
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets[entry.doc_key]
+        bucket.remove(entry_id)
+        if not bucket:
+            del self._buckets[entry.doc_key]
+    
+    def lookup(self, query_embedding: List[float], doc_ids: List[str], index_version: str) -> Optional[str]:
+        """Returns a cached response for an equivalent query, or None"""
+        doc_key = frozenset(doc_ids)
+        query = self._normalize(query_embedding)
+        now = time.monotonic()
+        
+        with self._lock:
+            self._check_index_version(index_version)
+            
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._buckets.get(doc_key, [])):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(query, entry.embedding))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            
+            if best_id is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id].response
+    
+    def store(self, query_embedding: List[float], doc_ids: List[str], index_version: str, response: str):
+        """Caches the response generated for a query and its documents"""
+        if self.max_entries <= 0:
+            return
+        
+        entry = _CacheEntry(self._normalize(query_embedding), frozenset(doc_ids), response)
+        
+        with self._lock:
+            self._check_index_version(index_version)
+            
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._buckets.setdefault(entry.doc_key, []).append(entry_id)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for /system/info"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+            "threshold": self.threshold
+        }
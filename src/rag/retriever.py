@@ -1,23 +1,144 @@
 # src/rag/retriever.py
 import os
 import glob
-import chromadb
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from src.utils.config import Config
+from src.rag.registry import get_embedding_model
+from src.rag.embeddings import EmbeddingEncoder
+from src.rag.artifact import lexical_path, read_manifest, resolve_artifact, store_path
+from src.rag.chunker import CHUNK_KEYS, DocumentChunker, merge_chunk_texts
+from src.rag.documents import (
+    INDEX_SETTINGS, chunk_document, collection_metadata, document_id, fingerprint, lexical_text, read_document
+)
+from src.rag.lexical import BM25Index, reciprocal_rank_fusion
+from src.rag.fields import FieldIndex, SearchFilters
+from src.rag.snapshot import IndexSnapshot
+from src.rag.vector_store import VECTOR_STORES, close_client, create_client, describe, persist
+from src.utils.logger import get_logger
+from src.utils.metrics import observe_stage
+
+logger = get_logger(__name__)
 
 class DocumentRetriever:
-    def __init__(self):
+    RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+    
+    def __init__(self, embedding_model: Optional[SentenceTransformer] = None, read_only: Optional[bool] = None,
+                 artifact: Optional[str] = None):
         self.config = Config()
-        self.embedding_model = SentenceTransformer(self.config.EMBEDDING_MODEL)
-        self.client = chromadb.Client()
-        self.collection = None
-        self._setup_collection()
-        self._load_documents()
+        # A prebuilt artifact (src.rag.build_index) is served as is, without reading DOCS_PATH
+        self.artifact_source = artifact or self.config.INDEX_ARTIFACT
+        self.artifact = resolve_artifact(self.artifact_source) if self.artifact_source else None
+        self.manifest = read_manifest(self.artifact) if self.artifact else None
+        self.persistent = self.artifact is not None or self.config.CHROMA_PERSISTENT
+        # An artifact is opened with the backend it was built with
+        self.vector_store = self._artifact_store(self.manifest) if self.artifact else self.config.VECTOR_STORE.lower()
+        if self.vector_store not in VECTOR_STORES:
+            raise ValueError(f"Unknown vector store '{self.vector_store}', expected one of {VECTOR_STORES}")
+        if self.vector_store != "numpy" and self.config.VECTOR_QUANTIZATION.lower() != "none":
+            logger.warning("VECTOR_QUANTIZATION only applies to the numpy vector store", extra={"vector_store": self.vector_store})
+        self.persist_dir = store_path(self.artifact, self.vector_store) if self.artifact else self.config.CHROMA_PERSIST_DIR
+        # Serving workers open an index built beforehand and never write to it
+        self.read_only = self.artifact is not None or (self.config.INDEX_READ_ONLY if read_only is None else read_only)
+        if self.read_only and not self.persistent:
+            raise ValueError("A read-only index requires CHROMA_PERSISTENT=True or INDEX_ARTIFACT")
+        # Resolve the process-wide model so it is only ever loaded once
+        self.embedding_model = embedding_model or get_embedding_model()
+        # Embeddings are always computed here and handed to the store precomputed,
+        # so EMBEDDING_MODEL is what actually defines the vector space
+        self.encoder = EmbeddingEncoder(self.embedding_model)
+        self.chunker = DocumentChunker()
+        self.client = self._create_client()
+        self.sync_stats = {}
+        self.reload_stats = {}
+        self.retrieval_mode = self.config.RETRIEVAL_MODE.lower()
+        if self.retrieval_mode not in self.RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{self.retrieval_mode}', expected one of {self.RETRIEVAL_MODES}")
+        # Queries read one snapshot for their whole duration; reload() swaps in a new one
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._drop_lock = threading.Lock()
+        self.snapshot = self._build_snapshot(self._setup_collection())
+    
+    @property
+    def collection(self):
+        return self.snapshot.collection
+    
+    @property
+    def lexical_index(self) -> BM25Index:
+        """Lexical index over the same ids as the collection, for exact names and ingredients"""
+        return self.snapshot.lexical_index
+    
+    @property
+    def field_index(self) -> FieldIndex:
+        """Parsed price/ingredient/skin type fields, for filtered search"""
+        return self.snapshot.field_index
+    
+    @property
+    def index_version(self) -> str:
+        return self.snapshot.index_version
+    
+    def _build_snapshot(self, collection, generation: int = 0) -> IndexSnapshot:
+        """Loads documents into the collection and builds its local indexes"""
+        index_version = self._load_documents(collection)
+        # Quantized codes are built now, not by the first query
+        persist(collection)
+        field_index, lexical_index = self._build_local_indexes(collection)
+        return IndexSnapshot(collection, lexical_index, field_index, index_version, generation)
+    
+    @contextmanager
+    def _reading(self):
+        """The current snapshot, held until the block exits"""
+        with self._swap_lock:
+            snapshot = self.snapshot.acquire()
+        try:
+            yield snapshot
+        finally:
+            snapshot.release()
+    
+    @staticmethod
+    def _artifact_store(manifest: Dict) -> str:
+        # Builds from before VECTOR_STORE existed are Chroma
+        return manifest.get("vector_store", "chroma")
+    
+    def _create_client(self):
+        """Creates an on-disk client in persistent mode, in-memory otherwise"""
+        return create_client(self.persist_dir if self.persistent else None, self.vector_store)
     
     def _setup_collection(self):
-        """Sets up the ChromaDB collection"""
+        """Sets up the products collection in the vector store"""
         try:
+            if self.read_only:
+                return self._open_read_only()
+            
+            if self.config.CHROMA_PERSISTENT:
+                # Vectors from a different model or chunking are not comparable: start over
+                try:
+                    existing = self.client.get_collection("products")
+                    stored = existing.metadata or {}
+                    expected = self._collection_metadata()
+                    if any(stored.get(key) != expected[key] for key in INDEX_SETTINGS):
+                        logger.info("Embedding model, chunking or field schema changed, rebuilding persistent collection")
+                        self.client.delete_collection("products")
+                except ValueError:
+                    pass
+                # Shadow collections left behind by a reload that never finished
+                for leftover in self.client.list_collections():
+                    if leftover.name.startswith("products_"):
+                        self.client.delete_collection(leftover.name)
+                
+                # Reuse the existing index; _load_documents syncs it with disk
+                collection = self.client.get_or_create_collection(
+                    name="products",
+                    metadata=self._collection_metadata()
+                )
+                logger.info("Persistent collection opened", extra={"path": self.persist_dir, "vector_store": self.vector_store})
+                return collection
+            
             # Delete collection if it exists (for testing)
             try:
                 self.client.delete_collection("products")
@@ -25,99 +146,559 @@ class DocumentRetriever:
                 pass
             
             # Create new collection
-            self.collection = self.client.create_collection(
+            collection = self.client.create_collection(
                 name="products",
-                metadata={"description": "Product documents for RAG"}
+                metadata=self._collection_metadata()
             )
-            print("ChromaDB collection created")
+            logger.info("Collection created", extra={"vector_store": self.vector_store})
+            return collection
         except Exception as e:
-            print(f"Error creating collection: {e}")
+            logger.error("Error creating collection", extra={"error": str(e)})
             raise
     
-    def _load_documents(self):
-        """Loads documents from the docs/products folder"""
+    def _open_read_only(self):
+        """Opens the prebuilt collection, which must match the current settings"""
         try:
-            docs_pattern = os.path.join(self.config.DOCS_PATH, "*.txt")
-            doc_files = glob.glob(docs_pattern)
+            collection = self.client.get_collection("products")
+        except ValueError:
+            raise FileNotFoundError(f"No index in {self.persist_dir}; build it before serving read-only")
+        
+        stored = collection.metadata or {}
+        expected = self._collection_metadata()
+        mismatched = [key for key in INDEX_SETTINGS if stored.get(key) != expected[key]]
+        if mismatched:
+            raise ValueError(f"Index in {self.persist_dir} was built with different {', '.join(mismatched)}")
+        logger.info("Collection opened read-only", extra={"path": self.persist_dir, "vector_store": self.vector_store})
+        return collection
+    
+    def _collection_metadata(self) -> Dict:
+        return collection_metadata(self.chunker)
+    
+    def _doc_files(self) -> List[str]:
+        docs_pattern = os.path.join(self.config.DOCS_PATH, "*.txt")
+        doc_files = glob.glob(docs_pattern)
+        
+        if not doc_files:
+            raise FileNotFoundError(f"No documents found in {self.config.DOCS_PATH}")
+        return doc_files
+    
+    def _load_documents(self, collection) -> str:
+        """Loads documents from the docs/products folder, returning the index version"""
+        try:
+            if self.read_only:
+                # Serve the index as built, even if the files changed since
+                if self.manifest:
+                    return self.manifest["index_version"]
+                return fingerprint(collection.get(include=["metadatas"])["metadatas"])
             
-            if not doc_files:
-                raise FileNotFoundError(f"No documents found in {self.config.DOCS_PATH}")
+            doc_files = self._doc_files()
+            if self.config.CHROMA_PERSISTENT:
+                return self._sync_documents(collection, doc_files)
             
             documents = []
+            embed_texts = []
             metadatas = []
             ids = []
             
             for doc_file in doc_files:
-                with open(doc_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                
-                doc_id = os.path.basename(doc_file).replace('.txt', '')
-                
-                documents.append(content)
-                metadatas.append({
-                    "filename": os.path.basename(doc_file),
-                    "source": doc_file,
-                    "doc_id": doc_id
-                })
-                ids.append(doc_id)
-            
-            # Add to ChromaDB
-            self.collection.add(
+                doc_id, content, metadata = read_document(doc_file)
+                chunk_ids, chunk_texts, chunk_embed_texts, chunk_metas = chunk_document(self.chunker, doc_id, content, metadata)
+                documents.extend(chunk_texts)
+                embed_texts.extend(chunk_embed_texts)
+                metadatas.extend(chunk_metas)
+                ids.extend(chunk_ids)
+            
+            # Add to the vector store
+            collection.add(
                 documents=documents,
+                embeddings=self.encoder.encode_documents(embed_texts),
                 metadatas=metadatas,
                 ids=ids
             )
             
-            print(f"Loaded {len(documents)} documents into ChromaDB")
-            return len(documents)
-            
+            logger.info("Loaded documents into the vector store", extra={"documents": len(doc_files), "chunks": len(ids)})
+            return fingerprint(metadatas)
+        
         except Exception as e:
-            print(f"Error loading documents: {e}")
+            logger.error("Error loading documents", extra={"error": str(e)})
+            raise
+    
+    def _sync_documents(self, collection, doc_files: List[str]) -> str:
+        """
+        Brings a collection in line with the files on disk and returns its
+        index version.
+        Files whose mtime is unchanged are skipped without being read, files
+        whose content hash is unchanged only get their mtime refreshed, and
+        chunks of deleted files are removed. Only new or modified documents
+        are re-embedded.
+        """
+        existing = collection.get(include=["metadatas"])
+        existing_metas = dict(zip(existing["ids"], existing["metadatas"]))
+        
+        # Chunks grouped by parent document; any chunk carries the parent's hash and mtime
+        indexed: Dict[str, Dict] = {}
+        indexed_chunks: Dict[str, List[str]] = {}
+        for chunk_id, metadata in existing_metas.items():
+            indexed[metadata["doc_id"]] = metadata
+            indexed_chunks.setdefault(metadata["doc_id"], []).append(chunk_id)
+        
+        seen = set()
+        changed_docs = 0
+        upsert_ids, upsert_docs, upsert_embed_texts, upsert_metas = [], [], [], []
+        touched_ids, touched_metas = [], []
+        stale_ids = []
+        
+        for doc_file in doc_files:
+            doc_id = document_id(doc_file)
+            seen.add(doc_id)
+            previous = indexed.get(doc_id)
+            
+            if previous and previous.get("mtime") == os.path.getmtime(doc_file):
+                continue
+            
+            doc_id, content, metadata = read_document(doc_file)
+            if previous and previous.get("content_hash") == metadata["content_hash"]:
+                for chunk_id in indexed_chunks[doc_id]:
+                    touched_ids.append(chunk_id)
+                    touched_metas.append({**existing_metas[chunk_id], "mtime": metadata["mtime"]})
+                continue
+            
+            changed_docs += 1
+            chunk_ids, chunk_texts, chunk_embed_texts, chunk_metas = chunk_document(self.chunker, doc_id, content, metadata)
+            upsert_ids.extend(chunk_ids)
+            upsert_docs.extend(chunk_texts)
+            upsert_embed_texts.extend(chunk_embed_texts)
+            upsert_metas.extend(chunk_metas)
+            # A shorter document leaves chunks behind
+            stale_ids.extend(set(indexed_chunks.get(doc_id, [])) - set(chunk_ids))
+        
+        removed_docs = [doc_id for doc_id in indexed if doc_id not in seen]
+        for doc_id in removed_docs:
+            stale_ids.extend(indexed_chunks[doc_id])
+        
+        if upsert_ids:
+            collection.upsert(
+                ids=upsert_ids,
+                documents=upsert_docs,
+                embeddings=self.encoder.encode_documents(upsert_embed_texts),
+                metadatas=upsert_metas
+            )
+        if touched_ids:
+            collection.update(ids=touched_ids, metadatas=touched_metas)
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        persist(collection)
+        
+        added = len({m["doc_id"] for m in upsert_metas} - set(indexed))
+        self.sync_stats = {
+            "added": added,
+            "reembedded": changed_docs - added,
+            "removed": len(removed_docs),
+            "unchanged": len(seen) - changed_docs
+        }
+        logger.info("Index synced", extra=self.sync_stats)
+        return fingerprint(collection.get(include=["metadatas"])["metadatas"])
+    
+    def _build_local_indexes(self, collection) -> Tuple[FieldIndex, BM25Index]:
+        """
+        Builds the field and BM25 indexes from the collection, so they cover
+        exactly the documents (or chunks) it holds, whether loaded or synced,
+        in the same order. An artifact's saved BM25 index is loaded
+        instead of rebuilt when it covers the same ids.
+        """
+        saved = self._load_saved_lexical_index() if self.retrieval_mode != "vector" else None
+        include = ["metadatas"] if saved is not None or self.retrieval_mode == "vector" else ["documents", "metadatas"]
+        stored = collection.get(include=include)
+        field_index = FieldIndex().build(stored["ids"], stored["metadatas"])
+        if self.retrieval_mode == "vector":
+            return field_index, BM25Index()
+        
+        if saved is not None and saved.ids == stored["ids"]:
+            logger.info("Lexical index loaded", extra={"entries": len(saved), "path": lexical_path(self.artifact)})
+            return field_index, saved
+        if saved is not None:
+            stored = collection.get(include=["documents", "metadatas"])
+        
+        texts = (
+            lexical_text(document, metadata)
+            for document, metadata in zip(stored["documents"], stored["metadatas"])
+        )
+        lexical_index = BM25Index().build(stored["ids"], texts)
+        logger.info(
+            "Lexical index built",
+            extra={
+                "entries": len(lexical_index),
+                "terms": len(lexical_index.vocabulary),
+                "postings_bytes": lexical_index.memory_bytes()
+            }
+        )
+        return field_index, lexical_index
+    
+    def _load_saved_lexical_index(self) -> Optional[BM25Index]:
+        """The BM25 index stored in the artifact, if any"""
+        if self.artifact is None or not os.path.isfile(lexical_path(self.artifact)):
+            return None
+        return BM25Index.load(lexical_path(self.artifact))
+    
+    def reload(self) -> Dict:
+        """
+        Applies catalog changes without a restart. Changed documents are
+        upserted into a shadow copy of the live collection (unchanged ones
+        keep their embeddings), the local indexes are rebuilt from it and
+        the new snapshot is swapped in at once. Queries already running
+        finish on the old snapshot, which is dropped when they are done.
+        With an artifact root, the build its CURRENT file names is opened.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            live = self.snapshot
+            if self.artifact is not None:
+                snapshot, cleanup = self._reload_artifact(live)
+            elif self.read_only:
+                raise RuntimeError("A read-only index can only be reloaded from an INDEX_ARTIFACT")
+            else:
+                snapshot, cleanup = self._reload_documents(live)
+            
+            if snapshot is not None:
+                with self._swap_lock:
+                    self.snapshot = snapshot
+                live.retire(cleanup)
+            self.reload_stats = {
+                "reloaded": snapshot is not None,
+                "generation": self.snapshot.generation,
+                "index_version": self.index_version,
+                "elapsed_s": round(time.perf_counter() - start, 3)
+            }
+            if snapshot is not None and self.artifact is None:
+                self.reload_stats.update(self.sync_stats)
+            logger.info("Index reload", extra=self.reload_stats)
+            return self.reload_stats
+    
+    def _reload_documents(self, live: IndexSnapshot):
+        """New snapshot with the changes in DOCS_PATH, or (None, None) if there are none"""
+        doc_files = self._doc_files()
+        indexed = {m["doc_id"]: m.get("mtime") for m in live.collection.get(include=["metadatas"])["metadatas"]}
+        if indexed == {document_id(doc_file): os.path.getmtime(doc_file) for doc_file in doc_files}:
+            return None, None
+        
+        name = f"products_{live.generation + 1}"
+        try:
+            self.client.delete_collection(name)
+        except ValueError:
+            pass
+        shadow = self.client.create_collection(name=name, metadata=self._collection_metadata())
+        self._copy_collection(live.collection, shadow)
+        index_version = self._sync_documents(shadow, doc_files)
+        field_index, lexical_index = self._build_local_indexes(shadow)
+        snapshot = IndexSnapshot(shadow, lexical_index, field_index, index_version, live.generation + 1)
+        return snapshot, lambda: self._drop_collection(live.collection)
+    
+    @staticmethod
+    def _copy_collection(source, target, page_size: int = 1000):
+        """Copies every entry with its stored embedding, so nothing is re-embedded"""
+        offset = 0
+        while True:
+            page = source.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            target.add(ids=page["ids"], documents=page["documents"], metadatas=page["metadatas"], embeddings=page["embeddings"])
+            offset += len(page["ids"])
+    
+    def _drop_collection(self, collection):
+        """Deletes a retired collection and gives the live one the canonical name a restart looks for"""
+        with self._drop_lock:
+            self.client.delete_collection(collection.name)
+            live = self.snapshot.collection
+            if live.name != "products" and all(c.name != "products" for c in self.client.list_collections()):
+                live.modify(name="products")
+    
+    def _reload_artifact(self, live: IndexSnapshot):
+        """Snapshot of the build CURRENT now names, or (None, None) if it is the one served"""
+        build = resolve_artifact(self.artifact_source)
+        if build == self.artifact:
+            return None, None
+        
+        previous = (self.artifact, self.manifest, self.vector_store, self.persist_dir, self.client)
+        self.artifact, self.manifest = build, read_manifest(build)
+        self.vector_store = self._artifact_store(self.manifest)
+        self.persist_dir = store_path(build, self.vector_store)
+        self.client = self._create_client()
+        try:
+            snapshot = self._build_snapshot(self._open_read_only(), live.generation + 1)
+        except Exception:
+            self.artifact, self.manifest, self.vector_store, self.persist_dir, self.client = previous
             raise
+        return snapshot, lambda: close_client(previous[4])
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Query embedding as used by search (served from the LRU cache)"""
+        return self.encoder.encode_query(query)
     
-    def search(self, query: str, top_k: int = None) -> List[Dict]:
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Query embeddings for a batch (served from the LRU cache)"""
+        return self.encoder.encode_queries(queries)
+    
+    def search(self, query: str, top_k: int = None, merge_chunks: Optional[bool] = None,
+               filters: Optional[SearchFilters] = None) -> List[Dict]:
         """
-        Searches for documents similar to the query
+        Searches for documents similar to the query. With chunking enabled,
+        matching chunks are merged back into one result per parent document
+        unless merge_chunks is False. Filters restrict the candidates before
+        ranking, so fewer than top_k documents may come back.
         """
         if top_k is None:
             top_k = self.config.TOP_K_DOCUMENTS
+        merge = self._should_merge(merge_chunks)
         
         try:
-            # Perform search
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=top_k
-            )
+            with observe_stage("embedding"):
+                query_embedding = self.embed_query(query)
             
-            # Format results
-            retrieved_docs = []
+            # Perform search
+            with self._reading() as snapshot:
+                retrieved_docs = self._retrieve(snapshot, [query], [query_embedding], self._candidate_count(top_k, merge), filters)[0]
+            if merge:
+                retrieved_docs = self._merge_by_parent(retrieved_docs, top_k)
+            logger.debug("Search completed", extra={"query": query, "docs": len(retrieved_docs)})
+            return retrieved_docs
             
-            if results['documents'] and results['documents'][0]:
-                for i in range(len(results['documents'][0])):
-                    doc = {
-                        "content": results['documents'][0][i],
-                        "metadata": results['metadatas'][0][i],
-                        "distance": results['distances'][0][i] if results['distances'] else None,
-                        "id": results['ids'][0][i]
-                    }
-                    retrieved_docs.append(doc)
+        except Exception as e:
+            logger.error("Error in search", extra={"query": query, "error": str(e)})
+            return []
+    
+    def search_batch(self, queries: List[str], top_k: int = None, merge_chunks: Optional[bool] = None,
+                     filters: Optional[SearchFilters] = None) -> List[List[Dict]]:
+        """
+        Searches for many queries at once: one encoder pass for all query
+        embeddings and one multi-query vector search. Results are in input
+        order; filters apply to every query.
+        """
+        if top_k is None:
+            top_k = self.config.TOP_K_DOCUMENTS
+        if not queries:
+            return []
+        merge = self._should_merge(merge_chunks)
+        
+        try:
+            with observe_stage("embedding"):
+                query_embeddings = self.embed_queries(queries)
             
-            print(f"Found {len(retrieved_docs)} documents for: '{query}'")
-            return retrieved_docs
+            with self._reading() as snapshot:
+                batch_docs = self._retrieve(snapshot, queries, query_embeddings, self._candidate_count(top_k, merge), filters)
+            if merge:
+                batch_docs = [self._merge_by_parent(docs, top_k) for docs in batch_docs]
+            logger.debug("Batch search completed", extra={"queries": len(queries)})
+            return batch_docs
             
         except Exception as e:
-            print(f"Error in search: {e}")
+            logger.error("Error in batch search", extra={"queries": len(queries), "error": str(e)})
+            return [[] for _ in queries]
+    
+    def get_documents(self, ids: List[str]) -> List[Dict]:
+        """
+        Documents by the ids search returned, in the given order and without
+        a distance; ids no longer in the index are skipped. With chunking,
+        search returns parent ids, so every chunk of those parents is
+        fetched and merged back into the whole document.
+        """
+        if not ids:
             return []
+        with self._reading() as snapshot:
+            if self._should_merge(None):
+                stored = snapshot.collection.get(where={"parent_id": {"$in": list(ids)}}, include=["documents", "metadatas"])
+            else:
+                stored = snapshot.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        docs = [
+            {"content": document, "metadata": metadata, "distance": None, "id": doc_id}
+            for doc_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        ]
+        position = {doc_id: i for i, doc_id in enumerate(ids)}
+        if self._should_merge(None):
+            docs.sort(key=lambda doc: (position[doc["metadata"]["parent_id"]], doc["metadata"]["chunk_index"]))
+            return self._merge_by_parent(docs, len(ids))
+        return sorted(docs, key=lambda doc: position[doc["id"]])
+    
+    def _retrieve(self, snapshot: IndexSnapshot, queries: List[str], query_embeddings: List[List[float]],
+                  n_results: int, filters: Optional[SearchFilters] = None) -> List[List[Dict]]:
+        """
+        Up to n_results documents per query, best first, using the configured
+        retrieval mode. Hybrid mode fuses the vector and BM25 rankings with
+        reciprocal rank fusion and sets each document's fused "score".
+        Filters are pushed down to the vector store as a where clause and
+        applied to BM25 as a mask, so neither ranks documents that can't be
+        returned.
+        """
+        allowed, where = None, None
+        if filters is not None and not filters.is_empty():
+            with observe_stage("filter"):
+                allowed = snapshot.field_index.matches(filters)
+                where = snapshot.field_index.where(filters)
+            if not allowed.any():
+                return [[] for _ in queries]
+        
+        if self.retrieval_mode == "lexical":
+            with observe_stage("lexical_search"):
+                rankings = [snapshot.lexical_index.search(query, n_results, allowed) for query in queries]
+            return [
+                self._with_scores(self._fetch_by_ids(snapshot.collection, [doc_id for doc_id, _ in hits], embedding), hits)
+                for hits, embedding in zip(rankings, query_embeddings)
+            ]
+        
+        # Hybrid mode draws a deeper candidate pool from both retrievers
+        pool = n_results * self.config.HYBRID_CANDIDATE_FACTOR if self.retrieval_mode == "hybrid" else n_results
+        with observe_stage("vector_search"):
+            results = snapshot.collection.query(query_embeddings=query_embeddings, n_results=pool, where=where)
+        vector_rows = [self._format_results(results, row) for row in range(len(queries))]
+        if self.retrieval_mode == "vector":
+            return vector_rows
+        
+        with observe_stage("lexical_search"):
+            lexical_rows = [snapshot.lexical_index.search(query, pool, allowed) for query in queries]
+        return [
+            self._fuse(snapshot.collection, vector_docs, lexical_hits, embedding, n_results)
+            for vector_docs, lexical_hits, embedding in zip(vector_rows, lexical_rows, query_embeddings)
+        ]
+    
+    def _fuse(self, collection, vector_docs: List[Dict], lexical_hits: List[Tuple[str, float]],
+              query_embedding: List[float], n_results: int) -> List[Dict]:
+        """Reciprocal rank fusion of one query's vector and lexical results"""
+        fused = reciprocal_rank_fusion(
+            [[doc["id"] for doc in vector_docs], [doc_id for doc_id, _ in lexical_hits]],
+            k=self.config.RRF_K
+        )[:n_results]
+        
+        by_id = {doc["id"]: doc for doc in vector_docs}
+        # Lexical-only hits aren't in the vector results yet
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if missing:
+            by_id.update({doc["id"]: doc for doc in self._fetch_by_ids(collection, missing, query_embedding)})
+        return self._with_scores([by_id[doc_id] for doc_id, _ in fused if doc_id in by_id], fused)
+    
+    @staticmethod
+    def _fetch_by_ids(collection, ids: List[str], query_embedding: List[float]) -> List[Dict]:
+        """
+        Documents by id, in the given order, with the same distance the
+        vector store's query would have reported (squared L2)
+        """
+        if not ids:
+            return []
+        stored = collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        query = np.asarray(query_embedding, dtype=np.float32)
+        
+        docs = {}
+        for doc_id, document, metadata, embedding in zip(
+            stored["ids"], stored["documents"], stored["metadatas"], stored["embeddings"]
+        ):
+            docs[doc_id] = {
+                "content": document,
+                "metadata": metadata,
+                "distance": float(np.sum((np.asarray(embedding, dtype=np.float32) - query) ** 2)),
+                "id": doc_id
+            }
+        return [docs[doc_id] for doc_id in ids if doc_id in docs]
+    
+    @staticmethod
+    def _with_scores(docs: List[Dict], scored_ids: List[Tuple[str, float]]) -> List[Dict]:
+        """Copies of docs carrying their ranking score"""
+        scores = dict(scored_ids)
+        return [{**doc, "score": scores[doc["id"]]} for doc in docs]
+    
+    def _should_merge(self, merge_chunks: Optional[bool]) -> bool:
+        """Whether chunk hits are folded back into their parent documents"""
+        if not self.chunker.enabled:
+            return False
+        return self.config.CHUNK_MERGE if merge_chunks is None else merge_chunks
+    
+    def _candidate_count(self, top_k: int, merge: bool) -> int:
+        """Chunks to fetch so that merging still yields top_k documents"""
+        return top_k * self.config.CHUNK_CANDIDATE_FACTOR if merge else top_k
+    
+    @staticmethod
+    def _merge_by_parent(docs: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Groups chunk hits by parent document, keeping the order of each
+        parent's best chunk, and stitches the matched chunks back together
+        in document order.
+        """
+        groups: Dict[str, List[Dict]] = {}
+        for doc in docs:
+            parent_id = doc["metadata"].get("parent_id", doc["id"])
+            if parent_id in groups or len(groups) < top_k:
+                groups.setdefault(parent_id, []).append(doc)
+        
+        merged = []
+        for parent_id, chunks in groups.items():
+            spans = [
+                (c["metadata"]["start_offset"], c["metadata"]["end_offset"], c["content"])
+                for c in chunks
+            ]
+            content = merge_chunk_texts(spans)
+            title = chunks[0]["metadata"].get("title", "")
+            # Keep the product name in front when the header chunk was not matched
+            if title and min(start for start, _, _ in spans) > 0:
+                content = f"{title}\n...\n{content}"
+            
+            metadata = {k: v for k, v in chunks[0]["metadata"].items() if k not in CHUNK_KEYS}
+            metadata["matched_chunks"] = len(chunks)
+            doc = {
+                "content": content,
+                "metadata": metadata,
+                "distance": chunks[0]["distance"],
+                "id": parent_id
+            }
+            if "score" in chunks[0]:
+                doc["score"] = chunks[0]["score"]
+            merged.append(doc)
+        
+        return merged
+    
+    @staticmethod
+    def _format_results(results: Dict, row: int) -> List[Dict]:
+        """Formats one query's vector store results as document dicts"""
+        retrieved_docs = []
+        
+        if results['documents'] and results['documents'][row]:
+            for i in range(len(results['documents'][row])):
+                doc = {
+                    "content": results['documents'][row][i],
+                    "metadata": results['metadatas'][row][i],
+                    "distance": results['distances'][row][i] if results['distances'] else None,
+                    "id": results['ids'][row][i]
+                }
+                retrieved_docs.append(doc)
+        
+        return retrieved_docs
     
     def get_collection_info(self):
         """Information about the collection"""
         try:
-            count = self.collection.count()
+            snapshot = self.snapshot
+            count = snapshot.collection.count()
             return {
                 "total_documents": count,
                 "collection_name": "products",
-                "embedding_model": self.config.EMBEDDING_MODEL
+                "embedding_model": self.config.EMBEDDING_MODEL,
+                "vector_store": self.vector_store,
+                "persistent": self.persistent,
+                "read_only": self.read_only,
+                "artifact": {
+                    "path": self.artifact,
+                    "built_at": self.manifest["built_at"]
+                } if self.artifact else None,
+                "index_version": snapshot.index_version,
+                "generation": snapshot.generation,
+                "last_reload": self.reload_stats or None,
+                "chunking": self.chunker.describe(),
+                "retrieval_mode": self.retrieval_mode,
+                "lexical_index": {
+                    "entries": len(snapshot.lexical_index),
+                    "terms": len(snapshot.lexical_index.vocabulary),
+                    "postings_bytes": snapshot.lexical_index.memory_bytes()
+                },
+                "field_index": snapshot.field_index.describe(),
+                "vector_index": describe(snapshot.collection),
+                "query_embedding_cache": self.encoder.cache_info()
             }
         except Exception as e:
-            print(f"Error getting info: {e}")
+            logger.error("Error getting collection info", extra={"error": str(e)})
             return {}
\ No newline at end of file
@@ -0,0 +1,52 @@
+# src/rag/snapshot.py
+import threading
+from typing import Callable, Optional
+from src.rag.fields import FieldIndex
+from src.rag.lexical import BM25Index
+
+class IndexSnapshot:
+    """
+    One generation of the index: a Chroma collection and the local indexes
+    built from it, which must always be read together (filter masks are
+    positional). Queries hold a snapshot for their whole duration; once a
+    newer one is swapped in, the old one runs its cleanup as soon as its
+    last reader releases it.
+    """
+    def __init__(self, collection, lexical_index: BM25Index, field_index: FieldIndex,
+                 index_version: str, generation: int = 0):
+        self.collection = collection
+        self.lexical_index = lexical_index
+        self.field_index = field_index
+        self.index_version = index_version
+        self.generation = generation
+        self._lock = threading.Lock()
+        self._readers = 0
+        self._cleanup: Optional[Callable[[], None]] = None
+    
+    @property
+    def readers(self) -> int:
+        return self._readers
+    
+    def acquire(self) -> "IndexSnapshot":
+        with self._lock:
+            self._readers += 1
+        return self
+    
+    def release(self):
+        with self._lock:
+            self._readers -= 1
+            cleanup = self._cleanup if self._readers == 0 else None
+            if cleanup is not None:
+                self._cleanup = None
+        if cleanup is not None:
+            cleanup()
+    
+    def retire(self, cleanup: Optional[Callable[[], None]]):
+        """Schedules cleanup for when no query reads this snapshot any more"""
+        if cleanup is None:
+            return
+        with self._lock:
+            if self._readers:
+                self._cleanup = cleanup
+                return
+        cleanup()
@@ -0,0 +1,486 @@
+# src/rag/vector_store.py
+"""
+Vector store backends behind DocumentRetriever, selected with VECTOR_STORE.
+
+A client holds named collections: get_collection, create_collection,
+get_or_create_collection and delete_collection (ValueError when the
+collection is missing or already exists) and list_collections. A
+collection holds (id, document, metadata, embedding) entries and offers
+count, modify(name=), add, upsert, update, delete, get(ids=, where=,
+limit=, offset=, include=) and query(query_embeddings, n_results, where=),
+with Chroma's arguments and result shapes. Query distances are squared L2,
+which for the normalized embeddings stored here is 2 - 2 * cosine.
+
+- chroma: Chroma collections (src.rag.chroma_store), imported only when used
+- numpy: NumpyCollection, exact search over an embedding matrix that is
+  memory-mapped from an .npy file when persistent, or with
+  VECTOR_QUANTIZATION (persistent only) a scan of compressed codes
+  (src.rag.quantization) and an exact rescore of the shortlist
+"""
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence
+import numpy as np
+from src.rag.quantization import QUANTIZATIONS, create_quantizer, load_codes, save_codes
+from src.utils.config import Config
+
+VECTOR_STORES = ("chroma", "numpy")
+EMBEDDINGS_FILE = "embeddings.npy"
+ENTRIES_FILE = "entries.json"
+CODES_FILE = "codes.npz"
+DEFAULT_INCLUDE = ("metadatas", "documents")
+QUERY_INCLUDE = ("metadatas", "documents", "distances")
+COMPARISONS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+_MISSING = object()
+
+def create_client(path: Optional[str] = None, backend: Optional[str] = None):
+    """Client of the given backend (default VECTOR_STORE) stored under path, in memory if path is None"""
+    backend = (backend or Config.VECTOR_STORE).lower()
+    if backend == "chroma":
+        from src.rag.chroma_store import create_chroma_client
+        return create_chroma_client(path)
+    if backend == "numpy":
+        return NumpyClient(path)
+    raise ValueError(f"Unknown vector store '{backend}', expected one of {VECTOR_STORES}")
+
+def close_client(client):
+    """Releases a client's files; its collections must not be used afterwards"""
+    if isinstance(client, NumpyClient):
+        client.close()
+        return
+    from src.rag.chroma_store import close_chroma_client
+    close_chroma_client(client)
+
+def persist(collection):
+    """
+    Writes a collection's pending changes to disk and prepares its quantized
+    codes. Chroma writes through, so only the NumPy store has work to do.
+    """
+    if isinstance(collection, NumpyCollection):
+        collection.persist()
+
+def describe(collection) -> Optional[Dict]:
+    """Size and layout of a NumPy collection's vectors, None for Chroma"""
+    if isinstance(collection, NumpyCollection):
+        return collection.describe()
+    return None
+
+def normalize(embeddings) -> np.ndarray:
+    """Float32 rows scaled to unit length (all-zero rows stay zero)"""
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+class _Entries(NamedTuple):
+    """One version of a collection's contents; writes replace it as a whole"""
+    ids: List[str]
+    documents: List[Optional[str]]
+    metadatas: List[Optional[Dict]]
+    embeddings: np.ndarray
+    positions: Dict[str, int]
+
+def _entries(ids: List[str], documents: List, metadatas: List, embeddings: np.ndarray) -> _Entries:
+    return _Entries(ids, documents, metadatas, embeddings, {doc_id: position for position, doc_id in enumerate(ids)})
+
+class NumpyCollection:
+    """
+    Exact nearest-neighbour search over a float32 matrix of normalized
+    embeddings: one matrix product per query batch and an argpartition for
+    each query's top k. Latency grows linearly with the collection; at
+    catalog sizes it stays below Chroma's HNSW query, and results are exact.
+    
+    Queries never lock: writes build new contents and swap them in, so a
+    query always sees one consistent version. Changes reach disk on
+    persist(), after which the matrix is memory-mapped back read-only and
+    lives in the page cache, shared by every process serving the same file.
+    
+    With quantization, queries scan compact codes instead and rescore only
+    the best QUANTIZED_RESCORE_FACTOR * n_results with the float rows, so
+    a mapped matrix is mostly never paged in.
+    """
+    
+    def __init__(self, client: "NumpyClient", name: str, metadata: Optional[Dict] = None,
+                 entries: Optional[_Entries] = None):
+        self.name = name
+        self.metadata = metadata
+        self._client = client
+        self._entries = entries or _entries([], [], [], np.zeros((0, 0), dtype=np.float32))
+        # Only what was never written is pending
+        self._dirty = entries is None
+        self._write_lock = threading.Lock()
+        # Metadata columns for where clauses, for one version of the entries
+        self._columns = (self._entries, {})
+        # (entries, quantizer, codes) for the version the codes were built from
+        self._codes = (None, None, None)
+        self._codes_lock = threading.Lock()
+    
+    @classmethod
+    def load(cls, client: "NumpyClient", name: str) -> "NumpyCollection":
+        """Opens a persisted collection with its embeddings memory-mapped"""
+        directory = os.path.join(client.path, name)
+        with open(os.path.join(directory, ENTRIES_FILE)) as f:
+            stored = json.load(f)
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+        if len(embeddings) != len(stored["ids"]):
+            raise ValueError(f"{directory} holds {len(embeddings)} embeddings for {len(stored['ids'])} entries")
+        entries = _entries(stored["ids"], stored["documents"], stored["metadatas"], embeddings)
+        collection = cls(client, name, stored["metadata"], entries)
+        
+        codes_path = os.path.join(directory, CODES_FILE)
+        if client.quantization != "none" and os.path.isfile(codes_path):
+            quantizer, codes = load_codes(codes_path)
+            if quantizer.kind == client.quantization and quantizer.matches() and len(codes) == len(embeddings):
+                collection._codes = (entries, quantizer, codes)
+        # Codes missing or built with other settings are rebuilt now, in memory, not by a query
+        collection._build_codes(entries)
+        return collection
+    
+    def count(self) -> int:
+        return len(self._entries.ids)
+    
+    def modify(self, name: Optional[str] = None, metadata: Optional[Dict] = None):
+        if metadata is not None:
+            self.metadata = metadata
+            self._dirty = True
+        if name is not None and name != self.name:
+            self._client._rename(self, name)
+    
+    def add(self, ids: List[str], embeddings, metadatas: Optional[List[Dict]] = None,
+            documents: Optional[List[str]] = None):
+        """Appends new entries; ids already in the collection are an error"""
+        duplicates = sorted(set(ids) & self._entries.positions.keys())
+        if duplicates or len(set(ids)) != len(ids):
+            raise ValueError(f"Duplicate ids in add: {duplicates[:5] or 'within the batch'}")
+        self._write(ids, embeddings, metadatas, documents, insert=True)
+    
+    def upsert(self, ids: List[str], embeddings, metadatas: Optional[List[Dict]] = None,
+               documents: Optional[List[str]] = None):
+        self._write(ids, embeddings, metadatas, documents, insert=True)
+    
+    def update(self, ids: List[str], embeddings=None, metadatas: Optional[List[Dict]] = None,
+               documents: Optional[List[str]] = None):
+        """Overwrites the given fields of existing entries; unknown ids are ignored"""
+        self._write(ids, embeddings, metadatas, documents, insert=False)
+    
+    def delete(self, ids: List[str]):
+        with self._write_lock:
+            entries = self._entries
+            keep = np.ones(len(entries.ids), dtype=bool)
+            keep[[entries.positions[doc_id] for doc_id in ids if doc_id in entries.positions]] = False
+            if keep.all():
+                return
+            positions = np.flatnonzero(keep)
+            self._entries = _entries(
+                [entries.ids[p] for p in positions],
+                [entries.documents[p] for p in positions],
+                [entries.metadatas[p] for p in positions],
+                np.ascontiguousarray(entries.embeddings[positions])
+            )
+            self._dirty = True
+    
+    def _write(self, ids: List[str], embeddings, metadatas: Optional[List[Dict]],
+               documents: Optional[List[str]], insert: bool):
+        if not ids:
+            return
+        vectors = normalize(embeddings) if embeddings is not None else None
+        with self._write_lock:
+            entries = self._entries
+            doc_ids, docs, metas = list(entries.ids), list(entries.documents), list(entries.metadatas)
+            matrix = entries.embeddings
+            updated = [(row, entries.positions[doc_id]) for row, doc_id in enumerate(ids) if doc_id in entries.positions]
+            added = [row for row, doc_id in enumerate(ids) if doc_id not in entries.positions] if insert else []
+            
+            if updated and vectors is not None:
+                # A copy: the current matrix may be mapped read-only and is still read by queries
+                matrix = np.array(matrix)
+                matrix[[position for _, position in updated]] = vectors[[row for row, _ in updated]]
+            for row, position in updated:
+                if documents is not None:
+                    docs[position] = documents[row]
+                if metadatas is not None:
+                    metas[position] = metadatas[row]
+            
+            if added:
+                if vectors is None:
+                    raise ValueError("New entries need embeddings")
+                doc_ids += [ids[row] for row in added]
+                docs += [documents[row] if documents is not None else None for row in added]
+                metas += [metadatas[row] if metadatas is not None else None for row in added]
+                matrix = np.concatenate([matrix, vectors[added]]) if len(matrix) else vectors[added]
+            
+            self._entries = _entries(doc_ids, docs, metas, matrix)
+            self._dirty = True
+    
+    def persist(self):
+        """
+        Writes pending changes, if any, and maps the new matrix back read-only.
+        Quantized codes are built here rather than on the first query.
+        """
+        with self._write_lock:
+            if not self._dirty or self._client.path is None or self._client._collections.get(self.name) is not self:
+                self._build_codes(self._entries)
+                return
+            directory = os.path.join(self._client.path, self.name)
+            os.makedirs(directory, exist_ok=True)
+            entries = self._entries
+            # Matrix first, entries last, each replaced atomically; load checks they agree
+            staging = os.path.join(directory, f".{EMBEDDINGS_FILE}.tmp")
+            with open(staging, "wb") as f:
+                np.save(f, np.ascontiguousarray(entries.embeddings))
+            os.replace(staging, os.path.join(directory, EMBEDDINGS_FILE))
+            staging = os.path.join(directory, f".{ENTRIES_FILE}.tmp")
+            with open(staging, "w") as f:
+                json.dump({
+                    "metadata": self.metadata,
+                    "ids": entries.ids,
+                    "documents": entries.documents,
+                    "metadatas": entries.metadatas
+                }, f)
+            os.replace(staging, os.path.join(directory, ENTRIES_FILE))
+            
+            self._entries = entries._replace(embeddings=np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r"))
+            self._dirty = False
+            quantized = self._build_codes(self._entries)
+            codes_path = os.path.join(directory, CODES_FILE)
+            if quantized is not None:
+                save_codes(codes_path, *quantized)
+            elif os.path.isfile(codes_path):
+                os.remove(codes_path)
+    
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Sequence[str] = DEFAULT_INCLUDE) -> Dict:
+        """Entries by id (in the given order) or all of them, in insertion order"""
+        entries = self._entries
+        if ids is not None:
+            positions = [entries.positions[doc_id] for doc_id in ids if doc_id in entries.positions]
+        else:
+            positions = list(range(len(entries.ids)))
+        if where:
+            mask = self._where_mask(entries, where)
+            positions = [position for position in positions if mask[position]]
+        start = offset or 0
+        positions = positions[start:start + limit if limit is not None else None]
+        
+        return {
+            "ids": [entries.ids[p] for p in positions],
+            "embeddings": entries.embeddings[positions].tolist() if "embeddings" in include else None,
+            "documents": [entries.documents[p] for p in positions] if "documents" in include else None,
+            "metadatas": [entries.metadatas[p] for p in positions] if "metadatas" in include else None
+        }
+    
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None,
+              include: Sequence[str] = QUERY_INCLUDE) -> Dict:
+        """The n_results nearest entries per query, nearest first"""
+        entries = self._entries
+        mask = self._where_mask(entries, where) if where else None
+        available = len(entries.ids) if mask is None else int(np.count_nonzero(mask))
+        k = min(n_results, available)
+        if k == 0:
+            empty = [[] for _ in query_embeddings]
+            return {
+                "ids": empty,
+                "embeddings": None,
+                "documents": empty if "documents" in include else None,
+                "metadatas": empty if "metadatas" in include else None,
+                "distances": empty if "distances" in include else None
+            }
+        
+        queries = normalize(query_embeddings)
+        built_for, quantizer, codes = self._codes
+        if built_for is not entries:
+            # Not quantized, or written since the last persist(): scan the float matrix
+            scores = queries @ entries.embeddings.T
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+            top, top_scores = self._top_k(scores, k)
+        else:
+            approximate = quantizer.scores(queries, codes)
+            if mask is not None:
+                approximate[:, ~mask] = -np.inf
+            shortlist, _ = self._top_k(approximate, min(available, k * self._client.rescore_factor))
+            # Exact rescore, reading only the shortlisted rows of the float matrix
+            rescored = np.einsum("qd,qcd->qc", queries, entries.embeddings[shortlist])
+            best, top_scores = self._top_k(rescored, k)
+            top = np.take_along_axis(shortlist, best, axis=1)
+        top = top.tolist()
+        # Squared L2 between unit vectors
+        distances = np.maximum(2 - 2 * top_scores, 0)
+        
+        return {
+            "ids": [[entries.ids[p] for p in row] for row in top],
+            "embeddings": None,
+            "documents": [[entries.documents[p] for p in row] for row in top] if "documents" in include else None,
+            "metadatas": [[entries.metadatas[p] for p in row] for row in top] if "metadatas" in include else None,
+            "distances": distances.tolist() if "distances" in include else None
+        }
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int):
+        """Column indexes of each row's k highest scores, best first, and those scores"""
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+    
+    def _build_codes(self, entries: _Entries):
+        """
+        (quantizer, codes) for this version of the entries, fitted unless
+        already built; None without quantization. Only load() and persist()
+        call it, so fitting (k-means for pq) never runs on the query path.
+        """
+        if self._client.quantization == "none" or not len(entries.ids):
+            return None
+        with self._codes_lock:
+            built_for, quantizer, codes = self._codes
+            if built_for is not entries:
+                quantizer = create_quantizer(self._client.quantization).fit(entries.embeddings)
+                codes = quantizer.encode(entries.embeddings)
+                self._codes = (entries, quantizer, codes)
+            return quantizer, codes
+    
+    def describe(self) -> Dict:
+        """Vector memory: the float matrix (mapped from disk or in the heap) and the scanned codes"""
+        entries = self._entries
+        built_for, quantizer, codes = self._codes
+        quantized = built_for is entries and quantizer is not None
+        return {
+            "entries": len(entries.ids),
+            "dimensions": int(entries.embeddings.shape[1]) if len(entries.ids) else 0,
+            "embeddings_bytes": int(entries.embeddings.nbytes),
+            "embeddings_mapped": isinstance(entries.embeddings, np.memmap),
+            "quantization": self._client.quantization,
+            "codes_bytes": int(codes.nbytes + sum(array.nbytes for array in quantizer.state().values())) if quantized else 0
+        }
+    
+    def _where_mask(self, entries: _Entries, where: Dict) -> np.ndarray:
+        """Boolean mask of the entries matching a Chroma where clause"""
+        mask = np.ones(len(entries.ids), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(entries, clause)
+            elif key == "$or":
+                mask &= np.logical_or.reduce([self._where_mask(entries, clause) for clause in condition])
+            else:
+                mask &= self._condition_mask(entries, key, condition)
+        return mask
+    
+    def _condition_mask(self, entries: _Entries, key: str, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(len(entries.ids), dtype=bool)
+        for operator, operand in condition.items():
+            if operator in COMPARISONS:
+                # Missing and non-numeric values are NaN, which never compares true
+                with np.errstate(invalid="ignore"):
+                    mask &= COMPARISONS[operator](self._column(entries, key, numeric=True), operand)
+            elif operator in ("$eq", "$ne", "$in", "$nin"):
+                values = self._column(entries, key)
+                accepted = set(operand) if operator in ("$in", "$nin") else {operand}
+                if operator in ("$eq", "$in"):
+                    found = (value in accepted for value in values)
+                else:
+                    found = (value is not _MISSING and value not in accepted for value in values)
+                mask &= np.fromiter(found, dtype=bool, count=len(values))
+            else:
+                raise ValueError(f"Unsupported where operator {operator}")
+        return mask
+    
+    def _column(self, entries: _Entries, key: str, numeric: bool = False):
+        """One metadata field across the entries, cached until the next write"""
+        cached, columns = self._columns
+        if cached is not entries:
+            columns = {}
+            self._columns = (entries, columns)
+        if (key, numeric) not in columns:
+            values = [metadata.get(key, _MISSING) if metadata else _MISSING for metadata in entries.metadatas]
+            if numeric:
+                values = np.array([
+                    value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+                    for value in values
+                ], dtype=np.float64)
+            columns[(key, numeric)] = values
+        return columns[(key, numeric)]
+
+class NumpyClient:
+    """
+    NumpyCollections in memory, or persisted under path with one directory
+    per collection holding embeddings.npy, entries.json (ids, documents and
+    metadata) and, when quantized, codes.npz
+    """
+    
+    def __init__(self, path: Optional[str] = None, quantization: Optional[str] = None,
+                 rescore_factor: Optional[int] = None):
+        self.path = path
+        self.quantization = (quantization or Config.VECTOR_QUANTIZATION).lower()
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{self.quantization}', expected one of {QUANTIZATIONS}")
+        if path is None and self.quantization != "none":
+            # The codes come on top of a float matrix in the heap: more memory, not less
+            raise ValueError("VECTOR_QUANTIZATION needs an on-disk matrix: set CHROMA_PERSISTENT=True or INDEX_ARTIFACT")
+        self.rescore_factor = max(1, rescore_factor or Config.QUANTIZED_RESCORE_FACTOR)
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.RLock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+    
+    def _stored(self, name: str) -> bool:
+        return self.path is not None and os.path.isfile(os.path.join(self.path, name, ENTRIES_FILE))
+    
+    def get_collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            if name not in self._collections:
+                if not self._stored(name):
+                    raise ValueError(f"Collection {name} does not exist.")
+                self._collections[name] = NumpyCollection.load(self, name)
+            return self._collections[name]
+    
+    def create_collection(self, name: str, metadata: Optional[Dict] = None) -> NumpyCollection:
+        with self._lock:
+            if name in self._collections or self._stored(name):
+                raise ValueError(f"Collection {name} already exists.")
+            collection = NumpyCollection(self, name, metadata)
+            self._collections[name] = collection
+        collection.persist()
+        return collection
+    
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> NumpyCollection:
+        with self._lock:
+            try:
+                return self.get_collection(name)
+            except ValueError:
+                return self.create_collection(name, metadata)
+    
+    def delete_collection(self, name: str):
+        with self._lock:
+            if name not in self._collections and not self._stored(name):
+                raise ValueError(f"Collection {name} does not exist.")
+            self._collections.pop(name, None)
+            if self.path is not None:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+    
+    def list_collections(self) -> List[NumpyCollection]:
+        with self._lock:
+            names = set(self._collections)
+            if self.path is not None:
+                names.update(name for name in os.listdir(self.path) if self._stored(name))
+            return [self.get_collection(name) for name in sorted(names)]
+    
+    def _rename(self, collection: NumpyCollection, name: str):
+        with self._lock:
+            if name in self._collections or self._stored(name):
+                raise ValueError(f"Collection {name} already exists.")
+            if self.path is not None and os.path.isdir(os.path.join(self.path, collection.name)):
+                os.rename(os.path.join(self.path, collection.name), os.path.join(self.path, name))
+            self._collections.pop(collection.name, None)
+            collection.name = name
+            self._collections[name] = collection
+    
+    def close(self):
+        with self._lock:
+            self._collections.clear()
@@ -0,0 +1,74 @@
+# src/rag/watcher.py
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from src.rag.artifact import CURRENT_FILE
+from src.utils.config import Config
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class CatalogWatcher:
+    """
+    Polls the catalog for changes and hot-reloads the retriever when it
+    changes. It watches the name, size and mtime of every .txt file in
+    DOCS_PATH, or the CURRENT file of an INDEX_ARTIFACT root. Polling needs
+    no extra dependency and also works on network and container volumes
+    where file system events are not delivered.
+    """
+    
+    def __init__(self, retriever, interval: Optional[float] = None):
+        self.retriever = retriever
+        self.interval = interval if interval is not None else Config.INDEX_WATCH_INTERVAL
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._signature = self.signature()
+    
+    def signature(self) -> Tuple:
+        """Cheap summary of the catalog source that changes whenever it does"""
+        if self.retriever.artifact_source:
+            current = os.path.join(self.retriever.artifact_source, CURRENT_FILE)
+            if not os.path.isfile(current):
+                return ()
+            with open(current) as f:
+                return (f.read().strip(),)
+        
+        entries = []
+        with os.scandir(self.retriever.config.DOCS_PATH) as scan:
+            for entry in scan:
+                if entry.name.endswith(".txt") and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+    
+    def check(self) -> Optional[Dict]:
+        """Reloads the retriever if the catalog changed since the last check"""
+        signature = self.signature()
+        if signature == self._signature:
+            return None
+        stats = self.retriever.reload()
+        # Only remembered once applied, so a failed reload is retried
+        self._signature = signature
+        return stats
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+        self._thread.start()
+        logger.info("Catalog watcher started", extra={"interval_s": self.interval})
+    
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception("Catalog reload failed", extra={"error": str(e)})
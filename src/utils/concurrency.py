@@ -0,0 +1,39 @@
+# src/utils/concurrency.py
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from src.utils.config import Config
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide executor used for CPU-bound work"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=Config.EXECUTOR_MAX_WORKERS,
+            thread_name_prefix="rag-worker"
+        )
+    return _executor
+
+async def run_in_executor(func: Callable, *args, **kwargs) -> Any:
+    """
+    Runs a blocking call (embedding, vector search) on the bounded executor
+    so it doesn't stall the event loop. The caller's context variables (such
+    as the metrics pipeline label) are visible to the call.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(),
+        functools.partial(context.run, func, *args, **kwargs)
+    )
+
+def shutdown_executor():
+    """Stops the executor, waiting for queued work to finish"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
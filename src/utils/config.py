@@ -13,20 +13,130 @@ class Config:
     # OpenAI Configuration
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
     MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")  # any OpenAI-compatible server, e.g. a local one
+    
+    # Generator Configuration
+    # openai (chat completions at OPENAI_BASE_URL) | extractive (in-process
+    # answers quoted from the retrieved documents, no network)
+    GENERATOR_BACKEND = os.getenv("GENERATOR_BACKEND", "openai")
     
     # RAG Configuration
     TOP_K_DOCUMENTS = int(os.getenv("TOP_K_DOCUMENTS", 3))
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 1024))
+    
+    # Retrieval Configuration
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")  # vector | lexical | hybrid
+    RRF_K = int(os.getenv("RRF_K", 60))  # reciprocal rank fusion constant
+    HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", 4))  # candidates per retriever per requested result
+    # chroma | numpy (exact search over a memory-mapped .npy matrix, no Chroma);
+    # persistent indexes of either backend live under CHROMA_PERSIST_DIR
+    VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+    # Compressed embeddings scanned per query with VECTOR_STORE=numpy, on-disk indexes only: none | int8 | pq
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+    PQ_SUBVECTOR_DIM = int(os.getenv("PQ_SUBVECTOR_DIM", 8))  # dimensions per one-byte product quantization code
+    QUANTIZED_RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", 10))  # shortlist rescored exactly, per requested result
+    
+    # Rerank Configuration
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "False").lower() == "true"  # rescore retrieval candidates with a cross-encoder
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))  # candidates retrieved and rescored per query
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))  # query-document pairs per inference batch
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 100))  # per query; unscored candidates keep retrieval order (0 = no limit)
+    RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", 256))  # tokens per query-document pair
+    
+    # Chunking Configuration
+    CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "none")  # none | fields | tokens
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 200))  # tokens per chunk
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 40))  # tokens shared by consecutive windows
+    CHUNK_MERGE = os.getenv("CHUNK_MERGE", "True").lower() == "true"  # merge chunks per parent document
+    CHUNK_CANDIDATE_FACTOR = int(os.getenv("CHUNK_CANDIDATE_FACTOR", 4))  # chunks fetched per requested document
+    
+    # Context Configuration
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", 1500))  # prompt tokens for retrieved documents
+    CONTEXT_DEDUPLICATE = os.getenv("CONTEXT_DEDUPLICATE", "True").lower() == "true"  # drop lines repeated across documents
+    
+    # Fast Path Configuration
+    FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "True").lower() == "true"  # answer single-field lookups without the LLM
+    FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", 0.75))  # share of product words matching only one document
+    
+    # Response Cache Configuration
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "True").lower() == "true"
+    RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.92))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+    RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 3600))
+    
+    # Conversation Memory Configuration
+    CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", 4))  # turns kept per user (0 = stateless)
+    CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", 10000))  # sessions in memory, least recently used evicted
+    CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", 32 * 1024 * 1024))  # memory held by all sessions
+    CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", 1800))  # idle seconds before a session expires
+    CONVERSATION_MAX_RESPONSE_CHARS = int(os.getenv("CONVERSATION_MAX_RESPONSE_CHARS", 500))  # answers are stored cut to this
+    CONVERSATION_FOLLOW_UP_MAX_TERMS = int(os.getenv("CONVERSATION_FOLLOW_UP_MAX_TERMS", 3))  # own words a follow-up may have
+    CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "memory")  # memory | sqlite (also persisted to CONVERSATION_DB_PATH)
+    CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+    
+    # Async Configuration
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+    EXECUTOR_MAX_WORKERS = int(os.getenv("EXECUTOR_MAX_WORKERS", 4))
+    
+    # Request Coalescing Configuration
+    COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "True").lower() == "true"  # identical in-flight queries share one pipeline run
+    
+    # Batch Configuration
+    BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 1000))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 8))
+    
+    # LLM Resilience Configuration
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))  # seconds per attempt (per read while streaming)
+    LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", 60))  # seconds per call, retries and backoff included
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))  # retries of timeouts, connection errors, 429 and 5xx
+    LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))  # backoff cap before the first retry, doubled each retry
+    LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 8))  # backoff cap; the actual delay is drawn below it (jitter)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 64))  # LLM calls in flight per process (0 = no limit)
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 10))  # seconds a call waits for a slot before a 503
+    LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))  # consecutive failed calls that open the circuit (0 = off)
+    LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))  # seconds calls fail fast before a probe call
+    
+    # Observability Configuration
+    LOG_ENABLED = os.getenv("LOG_ENABLED", "True").lower() == "true"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")  # per-request lines are logged at DEBUG
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
     
     # Paths
-    DOCS_PATH = "docs/products"
-    CHROMA_PERSIST_DIR = "chroma_db"
+    DOCS_PATH = os.getenv("DOCS_PATH", "docs/products")
+    CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "chroma_db")
+    
+    # Index Configuration
+    # When enabled, the collection lives on disk under CHROMA_PERSIST_DIR and
+    # startup only re-embeds documents that were added or changed.
+    CHROMA_PERSISTENT = os.getenv("CHROMA_PERSISTENT", "False").lower() == "true"
+    # Open the persistent index without syncing or writing it (serving workers)
+    INDEX_READ_ONLY = os.getenv("INDEX_READ_ONLY", "False").lower() == "true"
+    # Prebuilt index artifact (python -m src.rag.build_index) to serve read-only:
+    # a build directory, or an artifact root whose CURRENT file names the build.
+    # When set, DOCS_PATH is not read at startup.
+    INDEX_ARTIFACT = os.getenv("INDEX_ARTIFACT", "")
+    # Seconds between checks of DOCS_PATH (or the artifact's CURRENT file) for
+    # changes to hot-reload; 0 disables the watcher
+    INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", 0))
+    # Required in the X-Admin-Token header of /admin endpoints, which are
+    # disabled (404) while it is unset
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+    
+    # Serving Configuration
+    # Worker processes for src.api.serve; they share one prebuilt index and
+    # the embedding model weights loaded before fork
+    WORKERS = int(os.getenv("WORKERS", 1))
     
     # Validation
     @classmethod
     def validate(cls):
         errors = []
-        if not cls.OPENAI_API_KEY:
+        if cls.GENERATOR_BACKEND.lower() == "openai" and not cls.OPENAI_API_KEY and not cls.OPENAI_BASE_URL:
+            # Local OpenAI-compatible servers usually need no key
             errors.append("OPENAI_API_KEY not set")
         
         if not os.path.exists(cls.DOCS_PATH):
@@ -0,0 +1,35 @@
+# src/utils/http_client.py
+import asyncio
+import httpx
+from typing import Optional
+from src.utils.config import Config
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared, connection-pooled HTTP client for outbound calls.
+    Connections are bound to an event loop, so a new client is created if
+    the running loop changed (e.g. between test cases).
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0)
+        )
+        _client_loop = loop
+    return _client
+
+async def close_async_http_client():
+    """Closes the shared HTTP client"""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
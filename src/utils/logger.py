@@ -0,0 +1,98 @@
+# src/utils/logger.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from typing import Optional
+from src.utils.config import Config
+
+ROOT_LOGGER = "product_query_bot"
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message and any `extra` fields"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with `extra` fields appended as key=value"""
+    
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [
+            f"{key}={value}" for key, value in vars(record).items()
+            if key not in _RECORD_ATTRS and not key.startswith("_")
+        ]
+        return f"{line} {' '.join(fields)}" if fields else line
+
+def configure_logging(level: str = None, log_format: str = None, enabled: bool = None):
+    """
+    Sets up the application logger. Records are handed to a queue and written
+    by a background thread, so request threads never block on stdout.
+    Safe to call again to change the settings.
+    """
+    global _listener
+    level = (level or Config.LOG_LEVEL).upper()
+    log_format = (log_format or Config.LOG_FORMAT).lower()
+    enabled = Config.LOG_ENABLED if enabled is None else enabled
+    
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers.clear()
+        root.propagate = False
+        if not enabled:
+            # A handler must exist or logging falls back to stderr for warnings
+            root.addHandler(logging.NullHandler())
+            root.setLevel(logging.CRITICAL + 1)
+            return
+        root.setLevel(level)
+        
+        output = logging.StreamHandler()
+        output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+        
+        records = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+
+def shutdown_logging():
+    """Flushes queued records"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the application namespace, configured on first use"""
+    if _listener is None and not logging.getLogger(ROOT_LOGGER).handlers:
+        configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,171 @@
+# src/utils/metrics.py
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# Latencies span cached lookups (sub-millisecond) to slow LLM calls (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "rag_request_duration_seconds",
+    "End-to-end time to answer a query",
+    ["pipeline"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in one stage of the RAG pipeline",
+    ["pipeline", "stage"],
+    buckets=LATENCY_BUCKETS
+)
+ERRORS = Counter(
+    "rag_errors_total",
+    "Errors by pipeline and stage",
+    ["pipeline", "stage"]
+)
+DOCS_RETURNED = Counter(
+    "rag_docs_returned_total",
+    "Documents returned by retrieval",
+    ["pipeline"]
+)
+COALESCED = Counter(
+    "rag_coalesced_requests_total",
+    "Requests answered by an identical request already in flight",
+    ["pipeline"]
+)
+ROUTES = Counter(
+    "rag_routes_total",
+    "Queries by answer path: fast_path (from document fields) or llm",
+    ["pipeline", "path"]
+)
+RERANK_TRUNCATED = Counter(
+    "rag_rerank_budget_exhausted_total",
+    "Rerank calls that hit the time budget before scoring every candidate",
+    ["pipeline"]
+)
+GENERATION_LATENCY = Histogram(
+    "rag_generation_duration_seconds",
+    "Time a generator backend takes to answer, whole stream included",
+    ["pipeline", "backend"],
+    buckets=LATENCY_BUCKETS
+)
+GENERATION_FIRST_TOKEN = Histogram(
+    "rag_generation_first_token_seconds",
+    "Time until a generator backend streams the first text of an answer",
+    ["pipeline", "backend"],
+    buckets=LATENCY_BUCKETS
+)
+GENERATION_ERRORS = Counter(
+    "rag_generation_errors_total",
+    "Failed generator backend calls",
+    ["pipeline", "backend"]
+)
+LLM_RETRIES = Counter(
+    "rag_llm_retries_total",
+    "LLM call attempts retried, by the error that failed them",
+    ["pipeline", "reason"]
+)
+LLM_REJECTED = Counter(
+    "rag_llm_rejected_total",
+    "LLM calls refused without reaching the API: circuit_open or overloaded",
+    ["pipeline", "reason"]
+)
+FOLLOW_UPS = Counter(
+    "rag_conversation_follow_ups_total",
+    "Follow-up queries answered from the documents of the user's previous turn",
+    ["pipeline"]
+)
+
+# Pipeline label for everything measured while handling the current request
+_pipeline: ContextVar[str] = ContextVar("pipeline", default="none")
+
+def current_pipeline() -> str:
+    return _pipeline.get()
+
+@contextmanager
+def pipeline_label(pipeline: str):
+    """
+    Labels everything measured inside the block with the pipeline. Needed
+    where work moves to threads that don't inherit the caller's context.
+    """
+    token = _pipeline.set(pipeline)
+    try:
+        yield
+    finally:
+        _pipeline.reset(token)
+
+@contextmanager
+def track_request(pipeline: str):
+    """Labels the block with the pipeline and records the total request time"""
+    start = time.perf_counter()
+    with pipeline_label(pipeline):
+        try:
+            yield
+        finally:
+            REQUEST_LATENCY.labels(pipeline).observe(time.perf_counter() - start)
+
+@contextmanager
+def observe_stage(stage: str):
+    """Times a pipeline stage; an exception escaping the block counts as an error"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record_error(stage)
+        raise
+    finally:
+        STAGE_LATENCY.labels(current_pipeline(), stage).observe(time.perf_counter() - start)
+
+@contextmanager
+def observe_generation(backend: str):
+    """Times a generator backend call and counts its failures; yields the start time"""
+    start = time.perf_counter()
+    try:
+        yield start
+    except Exception:
+        GENERATION_ERRORS.labels(current_pipeline(), backend).inc()
+        raise
+    finally:
+        GENERATION_LATENCY.labels(current_pipeline(), backend).observe(time.perf_counter() - start)
+
+def record_first_token(backend: str, start: float):
+    GENERATION_FIRST_TOKEN.labels(current_pipeline(), backend).observe(time.perf_counter() - start)
+
+def record_error(stage: str):
+    ERRORS.labels(current_pipeline(), stage).inc()
+
+def record_docs(count: int):
+    DOCS_RETURNED.labels(current_pipeline()).inc(count)
+
+def record_coalesced():
+    COALESCED.labels(current_pipeline()).inc()
+
+def record_route(path: str):
+    ROUTES.labels(current_pipeline(), path).inc()
+
+def record_rerank_truncated():
+    RERANK_TRUNCATED.labels(current_pipeline()).inc()
+
+def record_llm_retry(reason: str):
+    LLM_RETRIES.labels(current_pipeline(), reason).inc()
+
+def record_llm_rejected(reason: str):
+    LLM_REJECTED.labels(current_pipeline(), reason).inc()
+
+def record_follow_up():
+    FOLLOW_UPS.labels(current_pipeline()).inc()
+
+def render_metrics():
+    """
+    Prometheus text exposition of every registered metric and its content
+    type. Under src.api.serve with several workers, PROMETHEUS_MULTIPROC_DIR
+    is set and the samples of all workers are aggregated, since any one of
+    them may answer the scrape.
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,82 @@
+# src/utils/singleflight.py
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from src.utils.metrics import record_coalesced
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for a key is in flight, identical calls
+    wait for it and receive the same result (or exception) instead of doing
+    the work again. Nothing is cached once the call completes.
+    
+    do() serves threads and ado() serves coroutines; the two keep separate
+    in-flight tables.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks: Dict[Hashable, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self.coalesced = 0
+    
+    def _count_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+        record_coalesced()
+    
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """Runs func(*args, **kwargs) unless an identical call is in flight, then waits for that one"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        
+        if not leader:
+            self._count_coalesced()
+            return future.result()
+        
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+    
+    async def ado(self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """
+        Async variant of do. The shared call runs as a task, so a waiter
+        that is cancelled (e.g. its client disconnected) doesn't cancel it
+        for the others.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flight = self._tasks.get(key)
+            # A task left behind by another event loop can't be awaited here
+            leader = flight is None or flight[0] is not loop
+            if leader:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                self._tasks[key] = (loop, task)
+                task.add_done_callback(lambda done: self._forget(key, done))
+            else:
+                task = flight[1]
+        
+        if not leader:
+            self._count_coalesced()
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        with self._lock:
+            if self._tasks.get(key, (None, None))[1] is task:
+                del self._tasks[key]
+    
+    def stats(self) -> Dict:
+        """Coalescing counters for /system/info"""
+        with self._lock:
+            return {
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._tasks)
+            }
@@ -0,0 +1,18 @@
+# tests/conftest.py
+import pytest
+from tests.helpers import HashingEmbeddingModel
+
+@pytest.fixture
+def embedding_model():
+    """Offline stand-in for the embedding model; its encode calls are in `calls`"""
+    return HashingEmbeddingModel(dim=64)
+
+@pytest.fixture
+def make_retriever(embedding_model):
+    """Builds DocumentRetrievers over the stand-in model with the current Config"""
+    # Imported here: importing the retriever loads Chroma, and some tests check what the app imports
+    from src.rag.retriever import DocumentRetriever
+    
+    def make(**kwargs):
+        return DocumentRetriever(embedding_model=embedding_model, **kwargs)
+    return make
@@ -0,0 +1,31 @@
+# tests/helpers.py
+"""
+Offline stand-ins shared by the tests and the benchmark scripts, which
+import them from here.
+"""
+import re
+import zlib
+import numpy as np
+
+class HashingEmbeddingModel:
+    """
+    Bag-of-words stand-in for SentenceTransformer. Lets the tests and the
+    benchmark suite run offline and isolates pipeline overhead from model
+    inference time. Every encode call is recorded in `calls`.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.calls = []
+    
+    def encode(self, sentences, batch_size=32, **kwargs):
+        self.calls.append((sentences, batch_size))
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else sentences
+        
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                vectors[row, zlib.crc32(token.encode()) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        return vectors[0] if single else vectors
@@ -1,5 +1,7 @@
 # tests/test_agents.py
 import pytest
+import asyncio
+import time
 import sys
 import os
 
@@ -50,6 +52,270 @@ def test_basic_config():
     except Exception as e:
         pytest.fail(f"Agent config test failed: {e}")
 
+def test_systems_share_one_embedding_model(monkeypatch):
+    """Both systems and all agents resolve the same retriever and model"""
+    import sentence_transformers
+    from tests.helpers import HashingEmbeddingModel
+    from src.rag import registry
+    from src.agents.multi_agent_system import MultiAgentSystem
+    from src.agents.langgraph_system import LangGraphMultiAgentSystem
+    
+    instances = []
+    
+    # Offline stand-in for the model the registry would load
+    def counting_model(*args, **kwargs):
+        model = HashingEmbeddingModel()
+        instances.append(model)
+        return model
+    
+    # The registry imports the class when it first loads the model
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", counting_model)
+    registry.shutdown()
+    try:
+        multi_agent = MultiAgentSystem()
+        langgraph = LangGraphMultiAgentSystem()
+        
+        assert len(instances) == 1
+        assert langgraph.retriever_agent.retriever is multi_agent.shared_retriever
+        assert multi_agent.shared_retriever.embedding_model is instances[0]
+    finally:
+        registry.shutdown()
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Points the generator at a local fake OpenAI server"""
+    from benchmarks.fake_openai import FakeOpenAIServer
+    from src.utils.config import Config
+    
+    with FakeOpenAIServer(latency=0.3) as server:
+        monkeypatch.setattr(Config, "OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setattr(Config, "OPENAI_API_KEY", "test-key")
+        yield server
+
+@pytest.mark.asyncio
+async def test_responder_arun_is_concurrent(fake_openai):
+    """Async responder calls overlap instead of running one after another"""
+    from src.agents.responder_agent import ResponderAgent
+    
+    agent = ResponderAgent()
+    docs = [{"content": "SPF 50+ Sunscreen\nPrice: $18.75", "metadata": {}, "id": "protector_solar"}]
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(agent.arun("sunscreen?", docs) for _ in range(5)))
+    elapsed = time.perf_counter() - start
+    
+    assert all(r["status"] == "success" for r in results)
+    assert "SPF 50+ Sunscreen" in results[0]["response"]
+    assert fake_openai.calls == 5
+    # Five serialized calls would take at least 1.5s
+    assert elapsed < 1.2
+
+@pytest.mark.asyncio
+async def test_responder_retries_and_reports_llm_failures(fake_openai):
+    """Retryable API errors are retried; a call that keeps failing is an error result, not an answer"""
+    from src.agents.responder_agent import ResponderAgent
+    from src.rag.llm_guard import LLMGuard
+    
+    agent = ResponderAgent(response_cache=None)
+    agent.generator.backend.guard = LLMGuard(max_retries=2, base_delay=0.01, breaker_threshold=0)
+    docs = [{"content": "SPF 50+ Sunscreen\nPrice: $18.75", "metadata": {}, "id": "protector_solar"}]
+    
+    fake_openai.fail_next(500)
+    result = await agent.arun("sunscreen?", docs)
+    assert result["status"] == "success"
+    assert fake_openai.calls == 2
+    
+    fake_openai.fail_next(429, 429, 429)
+    result = await agent.arun("sunscreen?", docs)
+    assert result["status"] == "error"
+    assert result["status_code"] == 503
+    assert "rate limit" in result["error"]
+    assert fake_openai.calls == 5
+    
+    fake_openai.fail_next(400)
+    result = agent.run("sunscreen?", docs)
+    assert result["status"] == "error"
+    assert result["status_code"] == 502
+    assert fake_openai.calls == 6
+
+@pytest.mark.asyncio
+async def test_responder_serves_near_duplicates_from_cache(fake_openai):
+    """A near-duplicate query over the same documents skips the LLM"""
+    from src.agents.responder_agent import ResponderAgent
+    from src.rag.response_cache import SemanticResponseCache
+    
+    agent = ResponderAgent(response_cache=SemanticResponseCache(threshold=0.9))
+    docs = [{"content": "Anti-Dandruff Shampoo Premium\nPrice: $15.99", "metadata": {}, "id": "shampoo_anticaspa"}]
+    
+    first = await agent.arun("shampoo for dandruff?", docs, [0.9, 0.1, 0.0], "v1")
+    second = await agent.arun("what shampoo for dandruff", docs, [0.88, 0.12, 0.01], "v1")
+    
+    assert first["cache_hit"] is False
+    assert second["cache_hit"] is True
+    assert second["response"] == first["response"]
+    assert fake_openai.calls == 1
+
+@pytest.mark.asyncio
+async def test_responder_reports_context_tokens(fake_openai, monkeypatch):
+    """Responder results include the size of the prompt context"""
+    from src.agents.responder_agent import ResponderAgent
+    from src.utils.config import Config
+    monkeypatch.setattr(Config, "CONTEXT_MAX_TOKENS", 40)
+    
+    agent = ResponderAgent()
+    agent.response_cache = None
+    docs = [
+        {"content": "SPF 50+ Sunscreen\nPrice: $18.75", "metadata": {}, "id": "protector_solar", "distance": 0.1},
+        {"content": "Aloe Gel\n" + "soothing " * 100, "metadata": {}, "id": "gel_aloe", "distance": 0.4},
+    ]
+    
+    result = await agent.arun("sunscreen?", docs)
+    
+    assert result["status"] == "success"
+    assert 0 < result["context_tokens"] <= 40
+    assert result["context_truncated"] is True
+    assert result["docs_used"] == 2
+
+ROUTER_DOCS = [
+    {"content": "SPF 50+ Sunscreen\nIngredients: Zinc oxide, Vitamin C\nUsage: Apply 30 minutes before sun exposure\nPrice: $18.75",
+     "metadata": {"price": 18.75}, "id": "protector_solar"},
+    {"content": "Facial Moisturizing Cream\nIngredients: Hyaluronic acid\nPrice: $22.50",
+     "metadata": {"price": 22.5}, "id": "crema_hidratante"},
+]
+
+@pytest.mark.parametrize("query, intent, answer", [
+    ("How much is the SPF 50+ sunscreen?", "price", "The SPF 50+ Sunscreen costs $18.75."),
+    ("What ingredients does the sunscreen contain?", "ingredients", "The SPF 50+ Sunscreen contains: Zinc oxide, Vitamin C."),
+    ("How do I use the sunscreen?", "usage", "How to use the SPF 50+ Sunscreen: Apply 30 minutes before sun exposure."),
+])
+def test_router_answers_single_field_lookups(query, intent, answer):
+    from src.agents.router_agent import RouterAgent
+    
+    result = RouterAgent(min_confidence=0.75, enabled=True).run(query, ROUTER_DOCS)
+    
+    assert result["path"] == "fast_path"
+    assert result["intent"] == intent
+    assert result["doc_id"] == "protector_solar"
+    assert result["response"] == answer
+
+@pytest.mark.parametrize("query", [
+    "Which is cheaper, the sunscreen or the cream?",
+    "How much is a good product for dry skin?",
+    "Price and ingredients of the sunscreen?",
+    "Tell me about the sunscreen",
+    "How do I use the cream?",
+])
+def test_router_sends_open_or_ambiguous_queries_to_llm(query):
+    from src.agents.router_agent import RouterAgent
+    
+    result = RouterAgent(min_confidence=0.75, enabled=True).run(query, ROUTER_DOCS)
+    
+    assert result["path"] == "llm"
+    assert "response" not in result
+
+@pytest.mark.asyncio
+async def test_systems_take_fast_path_without_llm(fake_openai, make_retriever, monkeypatch):
+    """Both systems answer a price lookup from the document and report the path"""
+    from src.rag import registry
+    from src.agents.multi_agent_system import MultiAgentSystem
+    from src.agents.langgraph_system import LangGraphMultiAgentSystem
+    monkeypatch.setattr(registry, "_retriever", make_retriever())
+    monkeypatch.setattr(registry, "_response_cache", None)
+    
+    multi_agent, langgraph = MultiAgentSystem(), LangGraphMultiAgentSystem()
+    query = "How much is the SPF 50+ sunscreen?"
+    results = [
+        multi_agent.process_query(query),
+        await multi_agent.aprocess_query(query),
+        langgraph.process_query(query),
+        await langgraph.aprocess_query(query),
+    ]
+    
+    for result in results:
+        assert result["final_response"] == "The SPF 50+ Sunscreen costs $18.75."
+        assert result["agent_results"]["router"]["path"] == "fast_path"
+        assert result["agent_results"]["responder"]["context_tokens"] == 0
+    assert fake_openai.calls == 0
+    
+    open_ended = await langgraph.aprocess_query("Which product do you recommend for dry skin?")
+    assert open_ended["agent_results"]["router"]["path"] == "llm"
+    assert fake_openai.calls == 1
+
+
+@pytest.fixture
+def coalescing_system(fake_openai, make_retriever, monkeypatch):
+    """MultiAgentSystem over the sample catalog with the response cache off"""
+    from src.rag import registry
+    from src.utils.config import Config
+    from src.agents.multi_agent_system import MultiAgentSystem
+    monkeypatch.setattr(registry, "_retriever", make_retriever())
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(Config, "COALESCE_REQUESTS", True)
+    return MultiAgentSystem()
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_queries_share_one_llm_call(coalescing_system, fake_openai):
+    from prometheus_client import REGISTRY
+    
+    def coalesced():
+        return REGISTRY.get_sample_value("rag_coalesced_requests_total", {"pipeline": "query"}) or 0
+    
+    before = coalesced()
+    queries = ["sunscreen for the beach?", "Sunscreen for  the beach?"] * 5
+    results = await asyncio.gather(*(coalescing_system.aprocess_query(query) for query in queries))
+    
+    assert fake_openai.calls == 1
+    assert all(result["final_response"] == results[0]["final_response"] for result in results)
+    assert coalesced() - before == 9
+    assert coalescing_system.single_flight.stats() == {"coalesced": 9, "in_flight": 0}
+    
+    # Nothing is cached afterwards, and different top_k values are separate requests
+    await asyncio.gather(coalescing_system.aprocess_query(queries[0]), coalescing_system.aprocess_query(queries[0], top_k=1))
+    assert fake_openai.calls == 3
+
+def test_identical_threaded_queries_share_one_llm_call(coalescing_system, fake_openai):
+    from concurrent.futures import ThreadPoolExecutor
+    
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(coalescing_system.process_query, ["shampoo for dandruff?"] * 6))
+    
+    assert fake_openai.calls == 1
+    assert len({result["final_response"] for result in results}) == 1
+    assert coalescing_system.single_flight.stats()["coalesced"] == 5
+
+def test_single_flight_shares_exceptions():
+    import threading
+    from src.utils.singleflight import SingleFlight
+    
+    flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+    
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+    
+    errors = []
+    def call():
+        try:
+            flight.do("key", failing)
+        except RuntimeError as e:
+            errors.append(e)
+    
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flight.stats()["coalesced"] == 0:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.stats()["in_flight"] == 0
+
+
 if __name__ == "__main__":
     test_agent_imports()
     test_agent_structure()
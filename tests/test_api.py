@@ -1,5 +1,6 @@
 # tests/test_api.py
 import pytest
+import time
 import sys
 import os
 
@@ -55,6 +56,345 @@ def test_config_validation():
     except Exception as e:
         pytest.fail(f"Config test failed: {e}")
 
+class StubRetriever:
+    """In-memory stand-in for DocumentRetriever (no embedding model needed)"""
+    
+    index_version = "stub"
+    
+    def __init__(self):
+        self.filters = []
+    
+    def search(self, query, top_k=3, filters=None):
+        self.filters.append(filters)
+        return [{
+            "content": f"Product for {query}\nPrice: $18.75",
+            "metadata": {"doc_id": f"doc-{query}"},
+            "distance": 0.1,
+            "id": f"doc-{query}"
+        }]
+    
+    def search_batch(self, queries, top_k=3, filters=None):
+        return [self.search(query, top_k, filters) for query in queries]
+    
+    def get_documents(self, ids):
+        return [{
+            "content": f"Product for {doc_id[len('doc-'):]}\nPrice: $18.75",
+            "metadata": {"doc_id": doc_id},
+            "distance": None,
+            "id": doc_id
+        } for doc_id in ids]
+    
+    def embed_query(self, query):
+        return [float(len(query)), 1.0]
+    
+    def embed_queries(self, queries):
+        return [self.embed_query(query) for query in queries]
+    
+    def get_collection_info(self):
+        return {"total_documents": 1}
+
+@pytest.fixture
+def stub_systems(monkeypatch):
+    """Installs both systems over a stub retriever and a fake OpenAI server"""
+    from benchmarks.fake_openai import FakeOpenAIServer
+    from src.api import main
+    from src.rag import registry
+    from src.utils.config import Config
+    from src.agents.multi_agent_system import MultiAgentSystem
+    from src.agents.langgraph_system import LangGraphMultiAgentSystem
+    
+    with FakeOpenAIServer(latency=0.05, token_delay=0.1) as llm:
+        monkeypatch.setattr(Config, "OPENAI_BASE_URL", llm.base_url)
+        monkeypatch.setattr(Config, "OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(registry, "_retriever", StubRetriever())
+        # Keeps background startup from loading the real model for the stub
+        monkeypatch.setattr(registry, "_embedding_model", object())
+        monkeypatch.setattr(registry, "_response_cache", None)
+        monkeypatch.setattr(registry, "_conversation_store", None)
+        
+        monkeypatch.setattr(main, "multi_agent_system", MultiAgentSystem())
+        monkeypatch.setattr(main, "langgraph_system", LangGraphMultiAgentSystem())
+        yield llm
+
+@pytest.fixture
+def streaming_api(stub_systems):
+    """Serves the API on a local port, backed by a slow-streaming fake OpenAI"""
+    from benchmarks.fake_openai import BackgroundServer
+    from src.api import main
+    
+    with BackgroundServer(main.app) as api:
+        yield api
+
+def test_batch_endpoint_keeps_order_and_item_status(stub_systems):
+    """Batch results come back in input order with per-item status"""
+    from src.api.main import app
+    client = TestClient(app)
+    
+    queries = ["sunscreen", "shampoo", "   ", "soap"]
+    response = client.post("/query/batch", json={"user_id": "eval", "queries": queries})
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 4
+    assert data["succeeded"] == 3
+    assert [item["index"] for item in data["results"]] == [0, 1, 2, 3]
+    for item, query in zip(data["results"], queries):
+        assert item["query"] == query
+        if query.strip():
+            assert item["status"] == "success"
+            assert f"Product for {query}" in item["response"]
+        else:
+            assert item["status"] == "error"
+            assert item["error"] == "Empty query"
+    assert stub_systems.calls == 3
+
+def test_batch_endpoint_rejects_oversized_batch(stub_systems, monkeypatch):
+    from src.api.main import app
+    from src.utils.config import Config
+    monkeypatch.setattr(Config, "BATCH_MAX_QUERIES", 2)
+    
+    response = TestClient(app).post("/query/batch", json={"user_id": "eval", "queries": ["a", "b", "c"]})
+    assert response.status_code == 413
+
+def test_query_filters_reach_retriever(stub_systems):
+    from src.api.main import app
+    from src.rag import registry
+    from src.rag.fields import SearchFilters
+    client = TestClient(app)
+    
+    filters = {"max_price": 20, "skin_type": "dry skin"}
+    for path in ("/query", "/query-langgraph"):
+        response = client.post(path, json={"user_id": "u1", "query": "cream", "filters": filters})
+        assert response.status_code == 200
+    client.post("/query", json={"user_id": "u1", "query": "cream"})
+    
+    expected = SearchFilters(max_price=20, skin_type="dry skin")
+    assert registry._retriever.filters == [expected, expected, None]
+
+def test_importing_app_skips_heavy_modules():
+    """The port can open before torch, sentence-transformers and Chroma load"""
+    import subprocess
+    code = "import sys, src.api.main; print(sorted(m for m in ('torch', 'sentence_transformers', 'chromadb', 'langgraph') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+def test_ready_reports_background_startup(monkeypatch):
+    """/ready is 503 with per-component state until startup finishes; /health answers throughout"""
+    import threading
+    from src.api import main
+    from src.api.startup import StartupTracker
+    release = threading.Event()
+    
+    def initialize(tracker):
+        with tracker.stage("index"):
+            release.wait(10)
+        with tracker.stage("langgraph_system"):
+            raise ImportError("langgraph not installed")
+    
+    tracker = StartupTracker(["index", "langgraph_system"], optional=["langgraph_system"])
+    monkeypatch.setattr(main, "startup", tracker)
+    monkeypatch.setattr(main, "multi_agent_system", None)
+    client = TestClient(main.app)
+    tracker.start(initialize)
+    
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "loading"
+    assert response.json()["components"]["index"]["status"] == "loading"
+    assert client.get("/health").json() == {"status": "healthy", "service": "product-query-bot", "ready": False}
+    assert client.post("/query", json={"user_id": "u1", "query": "soap"}).status_code == 503
+    
+    release.set()
+    assert tracker.wait(10)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    components = response.json()["components"]
+    assert components["index"]["status"] == "ready"
+    assert components["index"]["elapsed_s"] >= 0
+    assert components["langgraph_system"]["status"] == "unavailable"
+
+def test_admin_reindex_requires_token(stub_systems, monkeypatch):
+    from src.api.main import app
+    from src.rag import registry
+    from src.utils.config import Config
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(registry._retriever, "reload", lambda: {"reloaded": True, "generation": 1}, raising=False)
+    client = TestClient(app)
+    
+    assert client.post("/admin/reindex").status_code == 403
+    response = client.post("/admin/reindex", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["generation"] == 1
+
+def test_admin_reindex_disabled_without_token(stub_systems, monkeypatch):
+    """Without ADMIN_TOKEN nobody can trigger a reindex"""
+    from src.api.main import app
+    from src.rag import registry
+    from src.utils.config import Config
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "")
+    reloads = []
+    monkeypatch.setattr(registry._retriever, "reload", lambda: reloads.append(1), raising=False)
+    client = TestClient(app)
+    
+    assert client.post("/admin/reindex").status_code == 404
+    assert client.post("/admin/reindex", headers={"X-Admin-Token": ""}).status_code == 404
+    assert reloads == []
+
+def test_metrics_endpoint_reports_per_pipeline_stages(stub_systems):
+    """Stage histograms and counters are labelled with the endpoint's pipeline"""
+    from src.api.main import app
+    client = TestClient(app)
+    
+    # Different queries, so the second isn't served from the shared response cache
+    for path, query in (("/query", "sunscreen?"), ("/query-langgraph", "shampoo?")):
+        response = client.post(path, json={"user_id": "test_user", "query": query})
+        assert response.status_code == 200
+    
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    
+    body = metrics.text
+    for pipeline in ("query", "query-langgraph"):
+        assert f'rag_request_duration_seconds_count{{pipeline="{pipeline}"}}' in body
+        assert f'rag_docs_returned_total{{pipeline="{pipeline}"}}' in body
+        for stage in ("context_build", "llm"):
+            assert f'rag_stage_duration_seconds_count{{pipeline="{pipeline}",stage="{stage}"}}' in body
+
+def test_llm_failures_map_to_status_codes(stub_systems):
+    """LLM failures reach clients as 502, then 503 with Retry-After once the circuit opens"""
+    from src.api import main
+    from src.rag.llm_guard import LLMGuard
+    client = TestClient(main.app)
+    guard = LLMGuard(max_retries=0, breaker_threshold=1, breaker_cooldown=30)
+    for system in (main.multi_agent_system, main.langgraph_system):
+        system.responder_agent.generator.backend.guard = guard
+    
+    stub_systems.fail_next(500)
+    response = client.post("/query", json={"user_id": "u1", "query": "sunscreen?"})
+    assert response.status_code == 502
+    assert "500" in response.json()["detail"]
+    
+    for path in ("/query", "/query-langgraph"):
+        response = client.post(path, json={"user_id": "u1", "query": "shampoo?"})
+        assert response.status_code == 503
+        assert 0 < int(response.headers["Retry-After"]) <= 30
+    assert stub_systems.calls == 1
+    
+    response = client.post("/query/batch", json={"user_id": "u1", "queries": ["soap"]})
+    assert response.json()["results"][0]["status_code"] == 503
+
+def test_retrieval_failures_map_to_status_codes(stub_systems, monkeypatch):
+    """A failed search is a 503 on both systems and never reaches the LLM"""
+    from src.api import main
+    from src.rag import registry
+    client = TestClient(main.app)
+    
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("index unavailable")
+    monkeypatch.setattr(registry._retriever, "search", unavailable)
+    
+    for path in ("/query", "/query-langgraph"):
+        response = client.post(path, json={"user_id": "u1", "query": "sunscreen?"})
+        assert response.status_code == 503
+        assert "index unavailable" in response.json()["detail"]
+    assert stub_systems.calls == 0
+
+def test_extractive_backend_serves_without_llm(stub_systems, monkeypatch):
+    """GENERATOR_BACKEND=extractive answers in-process, with metrics labelled by backend"""
+    from src.api import main
+    from src.agents.multi_agent_system import MultiAgentSystem
+    from src.utils.config import Config
+    monkeypatch.setattr(Config, "GENERATOR_BACKEND", "extractive")
+    monkeypatch.setattr(main, "multi_agent_system", MultiAgentSystem())
+    client = TestClient(main.app)
+    
+    response = client.post("/query", json={"user_id": "u1", "query": "sunscreen for the beach?"})
+    assert response.status_code == 200
+    assert "Product for sunscreen for the beach? ($18.75)" in response.json()["response"]
+    assert stub_systems.calls == 0
+    
+    info = client.get("/system/info").json()
+    assert info["primary_system"]["agents"]["responder"]["generator"]["backend"] == "extractive"
+    assert 'rag_generation_duration_seconds_count{backend="extractive",pipeline="query"}' in client.get("/metrics").text
+
+def test_follow_up_reuses_previous_documents(stub_systems):
+    """A follow-up is answered from the user's previous documents, without a search"""
+    from src.api import main
+    from src.rag import registry
+    client = TestClient(main.app)
+    retriever = registry.get_retriever()
+    
+    for path in ("/query", "/query-langgraph"):
+        client.post(path, json={"user_id": f"user{path}", "query": "sunscreen for the beach"})
+        searches = len(retriever.filters)
+        response = client.post(path, json={"user_id": f"user{path}", "query": "and how much is it?"})
+        assert response.status_code == 200
+        assert len(retriever.filters) == searches
+        data = response.json()
+        assert [doc["id"] for doc in data["retrieved_docs"]] == ["doc-sunscreen for the beach"]
+        assert data["agent_info"]["router"]["path"] == "fast_path"
+        assert "$18.75" in data["response"]
+    
+    # Other users' turns don't count
+    client.post("/query", json={"user_id": "stranger", "query": "and how much is it?"})
+    assert len(retriever.filters) == searches + 1
+    
+    conversations = client.get("/system/info").json()["conversations"]
+    assert conversations["sessions"] == 3
+    assert conversations["follow_ups"] == 2
+    assert conversations["bytes"] > 0
+
+def test_new_question_after_a_turn_searches(stub_systems):
+    """Queries that are new questions, or name what the previous documents don't mention, search afresh"""
+    from src.api import main
+    from src.rag import registry
+    client = TestClient(main.app)
+    retriever = registry.get_retriever()
+    
+    for path in ("/query", "/query-langgraph"):
+        for query in ("Which one is best for dandruff?", "is it good for dandruff?"):
+            client.post(path, json={"user_id": f"user{path}", "query": "sunscreen for the beach"})
+            searches = len(retriever.filters)
+            response = client.post(path, json={"user_id": f"user{path}", "query": query})
+            assert response.status_code == 200
+            assert len(retriever.filters) == searches + 1
+            data = response.json()
+            assert [doc["id"] for doc in data["retrieved_docs"]] == [f"doc-{query}"]
+            assert data["agent_info"]["retriever"]["follow_up"] is False
+    
+    assert client.get("/system/info").json()["conversations"]["follow_ups"] == 0
+
+@pytest.mark.parametrize("path", ["/query/stream", "/query-langgraph/stream"])
+def test_stream_time_to_first_byte(streaming_api, path):
+    """Retrieval metadata and first token arrive well before generation ends"""
+    import httpx
+    
+    events = []
+    first_token_at = None
+    start = time.perf_counter()
+    
+    with httpx.stream(
+        "POST", streaming_api.url + path,
+        json={"user_id": "test_user", "query": "sunscreen?"}, timeout=10
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                events.append(line[len("event: "):])
+                if events[-1] == "token" and first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+    
+    total = time.perf_counter() - start
+    
+    assert events[0] == "retrieval"
+    assert events[-1] == "done"
+    assert events.count("token") > 3
+    assert first_token_at < total / 2
+    print(f"{path}: first token {first_token_at * 1000:.0f}ms, total {total * 1000:.0f}ms")
+
 if __name__ == "__main__":
     test_basic_import()
     test_basic_endpoints()
@@ -0,0 +1,43 @@
+# tests/test_benchmarks.py
+import os
+import sys
+
+# Add root directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.catalog import generate_catalog, generate_queries
+from benchmarks.harness import percentile, run_threaded
+
+def test_catalog_is_reproducible_and_in_product_format(tmp_path):
+    """Same seed gives the same files, laid out like docs/products"""
+    first = generate_catalog(20, str(tmp_path / "a"), seed=3)
+    second = generate_catalog(20, str(tmp_path / "b"), seed=3)
+    
+    files = sorted(os.listdir(first))
+    assert len(files) == 20
+    assert files == sorted(os.listdir(second))
+    
+    for filename in files:
+        with open(os.path.join(first, filename), encoding="utf-8") as f:
+            content = f.read()
+        with open(os.path.join(second, filename), encoding="utf-8") as f:
+            assert f.read() == content
+        lines = content.split("\n")
+        assert [line.split(":")[0] for line in lines[1:]] == [
+            "Ingredients", "Indicated for", "Usage", "Benefits", "Price"
+        ]
+    
+    assert generate_queries(5, 20) == generate_queries(5, 20)
+
+def test_threaded_run_reports_percentiles_and_errors():
+    def work(item):
+        if item == "fail":
+            raise RuntimeError("boom")
+    
+    result = run_threaded("noop", work, ["ok"] * 9 + ["fail"], concurrency=4)
+    
+    assert result["requests"] == 10
+    assert result["errors"] == 1
+    assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"] <= result["max_ms"]
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 99) == 4
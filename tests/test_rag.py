@@ -1,7 +1,9 @@
 # tests/test_rag.py
 import pytest
+import re
 import sys
 import os
+import numpy as np
 
 # Add root directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -9,6 +11,65 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from src.rag.retriever import DocumentRetriever
 from src.rag.generator import ResponseGenerator
 
+
+class TestEmbeddingEncoder:
+    """Tests for the batched, cached embedding layer"""
+    
+    def test_query_cache_normalizes_text(self, embedding_model):
+        """Repeated questions skip the encoder"""
+        from src.rag.embeddings import EmbeddingEncoder
+        encoder = EmbeddingEncoder(embedding_model, cache_size=8)
+        
+        first = encoder.encode_query("Shampoo for dandruff?")
+        second = encoder.encode_query("  shampoo FOR   dandruff? ")
+        
+        assert first == second
+        assert len(embedding_model.calls) == 1
+        assert encoder.cache_info()["hits"] == 1
+    
+    def test_query_cache_evicts_least_recently_used(self, embedding_model):
+        from src.rag.embeddings import EmbeddingEncoder
+        encoder = EmbeddingEncoder(embedding_model, cache_size=2)
+        
+        for query in ["soap", "cream", "soap", "sunscreen"]:
+            encoder.encode_query(query)
+        
+        assert encoder.cache_info()["size"] == 2
+        assert "soap" in encoder._cache
+        assert "cream" not in encoder._cache
+    
+    def test_documents_encoded_in_batches(self, embedding_model):
+        from src.rag.embeddings import EmbeddingEncoder
+        embeddings = EmbeddingEncoder(embedding_model, batch_size=2).encode_documents(["a", "b", "c"])
+        
+        assert len(embeddings) == 3
+        assert len(embeddings[0]) == embedding_model.dim
+        assert embedding_model.calls == [(["a", "b", "c"], 2)]
+    
+    def test_search_batch_matches_single_search(self, make_retriever, embedding_model):
+        """One encoder pass and one vector search for the whole batch"""
+        retriever = make_retriever()
+        queries = ["zinc oxide sunscreen", "ketoconazole shampoo", "vitamin c tablet"]
+        
+        embedding_model.calls.clear()
+        batch = retriever.search_batch(queries, top_k=2)
+        assert len(embedding_model.calls) == 1
+        
+        assert len(batch) == len(queries)
+        for query, docs in zip(queries, batch):
+            assert [d["id"] for d in docs] == [d["id"] for d in retriever.search(query, top_k=2)]
+    
+    def test_retriever_uses_configured_model(self, make_retriever, embedding_model):
+        """Chroma receives precomputed embeddings from our model"""
+        retriever = make_retriever()
+        
+        results = retriever.search("zinc oxide sunscreen", top_k=1)
+        
+        assert results[0]["id"] == "protector_solar"
+        # One ingestion batch plus one query
+        assert len(embedding_model.calls) == 2
+
+
 class TestDocumentRetriever:
     """Tests for DocumentRetriever"""
     
@@ -74,6 +135,616 @@ class TestDocumentRetriever:
         assert info["total_documents"] > 0
 
 
+class TestPersistentIndex:
+    """Tests for the persistent, incremental index mode"""
+    
+    @pytest.fixture(params=["chroma", "numpy"])
+    def catalog(self, request, tmp_path, monkeypatch):
+        """Copies the sample catalog into a temporary persistent setup, for each vector store"""
+        import shutil
+        from src.utils.config import Config
+        
+        docs_dir = tmp_path / "products"
+        shutil.copytree("docs/products", docs_dir)
+        
+        monkeypatch.setattr(Config, "VECTOR_STORE", request.param)
+        monkeypatch.setattr(Config, "DOCS_PATH", str(docs_dir))
+        monkeypatch.setattr(Config, "CHROMA_PERSIST_DIR", str(tmp_path / "chroma_db"))
+        monkeypatch.setattr(Config, "CHROMA_PERSISTENT", True)
+        return docs_dir
+    
+    def test_restart_skips_unchanged_documents(self, make_retriever, catalog):
+        """Second startup should not re-embed anything"""
+        first = make_retriever()
+        assert first.sync_stats["added"] == first.collection.count()
+        
+        second = make_retriever()
+        assert second.sync_stats["added"] == 0
+        assert second.sync_stats["reembedded"] == 0
+        assert second.sync_stats["unchanged"] == second.collection.count()
+    
+    def test_sync_applies_changes_and_deletions(self, make_retriever, catalog):
+        """Modified files are re-embedded and deleted files are removed"""
+        make_retriever()
+        
+        (catalog / "vitaminas_c.txt").unlink()
+        (catalog / "jabon_antibacterial.txt").write_text(
+            "Antibacterial Hand Soap\nPrice: $5.49", encoding="utf-8"
+        )
+        (catalog / "gel_aloe.txt").write_text(
+            "Aloe Vera Gel\nPrice: $7.25", encoding="utf-8"
+        )
+        
+        retriever = make_retriever()
+        assert retriever.sync_stats["added"] == 1
+        assert retriever.sync_stats["reembedded"] == 1
+        assert retriever.sync_stats["removed"] == 1
+        
+        ids = set(retriever.collection.get()["ids"])
+        assert "vitaminas_c" not in ids
+        assert "gel_aloe" in ids
+        soap = retriever.collection.get(ids=["jabon_antibacterial"])
+        assert "$5.49" in soap["documents"][0]
+    
+    def test_read_only_serves_index_as_built(self, make_retriever, catalog, monkeypatch):
+        """Read-only mode needs a prebuilt index and never syncs it"""
+        from src.utils.config import Config
+        
+        with pytest.raises(FileNotFoundError):
+            make_retriever(read_only=True)
+        
+        built = make_retriever()
+        (catalog / "gel_aloe.txt").write_text("Aloe Vera Gel\nPrice: $7.25", encoding="utf-8")
+        
+        served = make_retriever(read_only=True)
+        assert served.collection.count() == built.collection.count()
+        assert served.index_version == built.index_version
+        assert served.search("Aloe Vera Gel", top_k=1)[0]["id"] != "gel_aloe"
+        assert len(served.lexical_index) == built.collection.count()
+        
+        monkeypatch.setattr(Config, "CHUNK_STRATEGY", "fields")
+        with pytest.raises(ValueError):
+            make_retriever(read_only=True)
+    
+    def test_artifact_serves_without_documents(self, make_retriever, embedding_model, catalog, tmp_path, monkeypatch):
+        """A built artifact opens without DOCS_PATH and reuses its BM25 index"""
+        from src.rag.build_index import IndexBuilder
+        from src.rag.lexical import BM25Index
+        from src.utils.config import Config
+        
+        root = tmp_path / "indexes"
+        with pytest.raises(FileNotFoundError):
+            make_retriever(artifact=str(root))
+        
+        manifest = IndexBuilder(str(catalog), str(root), batch_size=2, embedding_model=embedding_model).build()
+        assert manifest["documents"] == manifest["chunks"] == len(os.listdir(catalog))
+        assert (root / "CURRENT").read_text().strip() == manifest["version"]
+        
+        monkeypatch.setattr(Config, "DOCS_PATH", str(tmp_path / "missing"))
+        monkeypatch.setattr(BM25Index, "build", lambda *args: pytest.fail("BM25 index rebuilt"))
+        served = make_retriever(artifact=str(root))
+        assert served.read_only
+        assert served.index_version == manifest["index_version"]
+        assert served.search("zinc oxide sunscreen", top_k=1)[0]["id"] == "protector_solar"
+    
+    def test_reload_swaps_snapshot_after_readers_finish(self, make_retriever, catalog):
+        """Reload applies changes into a shadow index; held snapshots stay readable"""
+        retriever = make_retriever()
+        assert retriever.reload()["reloaded"] is False
+        
+        (catalog / "vitaminas_c.txt").unlink()
+        (catalog / "gel_aloe.txt").write_text("Aloe Vera Gel\nPrice: $7.25", encoding="utf-8")
+        
+        old = retriever.snapshot.acquire()
+        stats = retriever.reload()
+        assert stats["reloaded"] is True
+        assert stats["added"] == 1 and stats["removed"] == 1
+        assert stats["generation"] == old.generation + 1
+        assert retriever.index_version != old.index_version
+        
+        # The in-flight reader still sees the catalog as it was
+        assert "vitaminas_c" in old.collection.get()["ids"]
+        assert "gel_aloe" not in old.collection.get()["ids"]
+        assert retriever.search("Aloe Vera Gel", top_k=1)[0]["id"] == "gel_aloe"
+        
+        old.release()
+        # The old collection is dropped and the live one takes over its name
+        assert [c.name for c in retriever.client.list_collections()] == ["products"]
+        assert retriever.collection.name == "products"
+        assert "vitaminas_c" not in retriever.collection.get()["ids"]
+        
+        # A restart finds the reloaded index under its usual name
+        restarted = make_retriever()
+        assert restarted.sync_stats["added"] == 0
+        assert restarted.index_version == retriever.index_version
+    
+    def test_watcher_reloads_new_artifact_build(self, make_retriever, embedding_model, catalog, tmp_path):
+        """The watcher opens the build CURRENT is repointed at"""
+        from src.rag.build_index import IndexBuilder
+        from src.rag.watcher import CatalogWatcher
+        
+        root = tmp_path / "indexes"
+        IndexBuilder(str(catalog), str(root), embedding_model=embedding_model).build()
+        served = make_retriever(artifact=str(root))
+        watcher = CatalogWatcher(served, interval=60)
+        assert watcher.check() is None
+        
+        (catalog / "gel_aloe.txt").write_text("Aloe Vera Gel\nPrice: $7.25", encoding="utf-8")
+        manifest = IndexBuilder(str(catalog), str(root), embedding_model=embedding_model).build()
+        
+        stats = watcher.check()
+        assert stats["reloaded"] is True
+        assert served.index_version == manifest["index_version"]
+        assert served.search("Aloe Vera Gel", top_k=1)[0]["id"] == "gel_aloe"
+        assert watcher.check() is None
+
+
+class TestVectorStore:
+    """Tests for the NumPy vector store against Chroma"""
+    
+    def test_numpy_store_matches_chroma(self, make_retriever, monkeypatch):
+        from src.rag.fields import SearchFilters
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "RETRIEVAL_MODE", "vector")
+        
+        chroma = make_retriever()
+        monkeypatch.setattr(Config, "VECTOR_STORE", "numpy")
+        numpy_store = make_retriever()
+        assert numpy_store.get_collection_info()["vector_store"] == "numpy"
+        
+        queries = ["zinc oxide sunscreen", "dandruff shampoo", "vitamin c"]
+        for filters in (None, SearchFilters(max_price=20), SearchFilters(min_price=10, ingredient="zinc")):
+            expected = chroma.search_batch(queries, top_k=4, filters=filters)
+            actual = numpy_store.search_batch(queries, top_k=4, filters=filters)
+            for want, got in zip(expected, actual):
+                assert [doc["id"] for doc in got] == [doc["id"] for doc in want]
+                assert [doc["distance"] for doc in got] == pytest.approx([doc["distance"] for doc in want], abs=1e-4)
+    
+    def test_numpy_collection_where_and_persistence(self, tmp_path):
+        from src.rag.vector_store import create_client, persist
+        
+        client = create_client(str(tmp_path), "numpy")
+        collection = client.create_collection("products", metadata={"embedding_model": "test"})
+        collection.add(
+            ids=["a", "b", "c"],
+            embeddings=[[1.0, 0.0], [0.0, 2.0], [1.0, 1.0]],
+            metadatas=[{"price": 5.0, "doc_id": "a"}, {"price": 50.0, "doc_id": "b"}, {"doc_id": "c"}],
+            documents=["A", "B", "C"]
+        )
+        collection.update(ids=["c"], metadatas=[{"price": 9.0, "doc_id": "c"}])
+        results = collection.query(query_embeddings=[[1.0, 0.0]], n_results=5, where={"price": {"$lte": 10.0}})
+        assert results["ids"] == [["a", "c"]]
+        assert results["distances"][0] == pytest.approx([0.0, 2 - np.sqrt(2)])
+        
+        persist(collection)
+        reopened = create_client(str(tmp_path), "numpy").get_collection("products")
+        assert reopened.metadata == {"embedding_model": "test"}
+        assert reopened.get(ids=["c", "a"])["documents"] == ["C", "A"]
+        assert isinstance(reopened._entries.embeddings, np.memmap)
+        reopened.delete(ids=["a"])
+        assert reopened.query(query_embeddings=[[0.0, 1.0]], n_results=1, where={"doc_id": {"$in": ["a", "b"]}})["ids"] == [["b"]]
+        with pytest.raises(ValueError):
+            client.create_collection("products")
+    
+    @pytest.mark.parametrize("quantization", ["int8", "pq"])
+    def test_quantized_search_rescores_shortlist(self, quantization, tmp_path, monkeypatch):
+        from src.rag.vector_store import create_client, describe, persist
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "VECTOR_QUANTIZATION", quantization)
+        monkeypatch.setattr(Config, "PQ_SUBVECTOR_DIM", 4)
+        
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((500, 32)).astype(np.float32)
+        queries = embeddings[:20] + 0.1 * rng.standard_normal((20, 32)).astype(np.float32)
+        collection = create_client(str(tmp_path), "numpy").create_collection("products")
+        collection.add(ids=[str(i) for i in range(500)], embeddings=embeddings, metadatas=[{"price": float(i)} for i in range(500)])
+        persist(collection)
+        
+        monkeypatch.setattr(Config, "VECTOR_QUANTIZATION", "none")
+        reference = create_client(None, "numpy").create_collection("products")
+        reference.add(ids=[str(i) for i in range(500)], embeddings=embeddings)
+        monkeypatch.setattr(Config, "VECTOR_QUANTIZATION", quantization)
+        
+        reopened = create_client(str(tmp_path), "numpy").get_collection("products")
+        assert reopened._codes[0] is reopened._entries
+        results = reopened.query(query_embeddings=queries, n_results=3)
+        assert [row[0] for row in results["ids"]] == [str(i) for i in range(20)]
+        expected = reference.query(query_embeddings=queries, n_results=3)
+        # Rescored distances are exact
+        for got, want in zip(results["distances"], expected["distances"]):
+            assert got[0] == pytest.approx(want[0], abs=1e-5)
+        
+        filtered = reopened.query(query_embeddings=queries[:2], n_results=3, where={"price": {"$lt": 10.0}})
+        assert all(metadata["price"] < 10 for row in filtered["metadatas"] for metadata in row)
+        info = describe(reopened)
+        assert info["embeddings_mapped"]
+        assert 0 < info["codes_bytes"] < info["embeddings_bytes"]
+        
+        # Queries never fit codes: after a write they scan the floats until persist() rebuilds them
+        reopened.delete(ids=["0"])
+        assert reopened.query(query_embeddings=queries[:1], n_results=1)["ids"][0] != ["0"]
+        assert reopened._codes[0] is not reopened._entries
+        persist(reopened)
+        assert reopened._codes[0] is reopened._entries
+        
+        # An in-memory matrix would only grow by the codes
+        with pytest.raises(ValueError):
+            create_client(None, "numpy")
+
+
+class TestDocumentChunker:
+    """Tests for document chunking and chunk-aware retrieval"""
+    
+    SAMPLE = (
+        "Facial Moisturizing Cream\n"
+        "Ingredients: Hyaluronic acid, Vitamin E\n"
+        "Price: $22.50"
+    )
+    
+    def test_field_chunks_keep_exact_offsets(self):
+        from src.rag.chunker import DocumentChunker
+        
+        chunks = DocumentChunker("fields", chunk_size=50, overlap=5).chunk(self.SAMPLE)
+        
+        assert [c.text for c in chunks] == self.SAMPLE.split("\n")
+        assert all(self.SAMPLE[c.start:c.end] == c.text for c in chunks)
+        # Field chunks carry the product name into their embedding
+        assert chunks[2].embed_text == "Facial Moisturizing Cream\nPrice: $22.50"
+    
+    def test_token_windows_overlap_and_merge_back(self):
+        from src.rag.chunker import DocumentChunker, merge_chunk_texts
+        
+        chunks = DocumentChunker("tokens", chunk_size=4, overlap=2).chunk(self.SAMPLE)
+        
+        assert len(chunks) > 1
+        assert chunks[1].start < chunks[0].end
+        spans = [(c.start, c.end, c.text) for c in chunks]
+        assert merge_chunk_texts(spans) == self.SAMPLE
+    
+    def test_invalid_settings_rejected(self):
+        from src.rag.chunker import DocumentChunker
+        
+        with pytest.raises(ValueError):
+            DocumentChunker("sentences")
+        with pytest.raises(ValueError):
+            DocumentChunker("tokens", chunk_size=10, overlap=10)
+    
+    def test_search_merges_chunks_into_parents(self, make_retriever, monkeypatch):
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "CHUNK_STRATEGY", "fields")
+        
+        retriever = make_retriever()
+        assert retriever.collection.count() > len(os.listdir("docs/products"))
+        
+        chunks = retriever.search("price of the sunscreen", top_k=3, merge_chunks=False)
+        assert all("#" in doc["id"] for doc in chunks)
+        assert all("start_offset" in doc["metadata"] for doc in chunks)
+        
+        merged = retriever.search("price of the sunscreen", top_k=3)
+        assert len(merged) == 3
+        assert len({doc["id"] for doc in merged}) == 3
+        for doc in merged:
+            assert "#" not in doc["id"]
+            assert "start_offset" not in doc["metadata"]
+            assert doc["metadata"]["matched_chunks"] >= 1
+            # The product name is always part of the merged context
+            assert doc["content"].startswith(doc["metadata"]["title"])
+
+
+class TestLexicalRetrieval:
+    """Tests for the BM25 index and hybrid retrieval"""
+    
+    def test_tokenize_keeps_numbers_and_folds_accents(self):
+        from src.rag.lexical import tokenize
+        
+        assert tokenize("SPF 50+ Protección, 2% ketoconazol.") == ["spf", "50+", "proteccion", "2%", "ketoconazol"]
+        assert "18.75" in tokenize("Price: $18.75")
+    
+    def test_bm25_ranks_exact_term_first(self):
+        from src.rag.lexical import BM25Index
+        
+        index = BM25Index().build(
+            ["crema", "shampoo", "protector"],
+            ["Cream with hyaluronic acid", "Shampoo with ketoconazole 2%", "Sunscreen with zinc oxide and zinc"]
+        )
+        
+        assert [doc_id for doc_id, _ in index.search("ketoconazole", 3)] == ["shampoo"]
+        hits = index.search("zinc cream", 2)
+        assert [doc_id for doc_id, _ in hits] == ["protector", "crema"]
+        assert hits[0][1] > hits[1][1] > 0
+        assert index.search("unknown words", 3) == []
+    
+    def test_bm25_save_and_load(self, tmp_path):
+        from src.rag.lexical import BM25Index
+        
+        index = BM25Index(k1=1.2).build(["a", "b", "c"], ["zinc oxide cream", "zinc shampoo", "vitamin c"])
+        index.save(str(tmp_path / "lexical.npz"))
+        loaded = BM25Index.load(str(tmp_path / "lexical.npz"))
+        
+        assert loaded.ids == index.ids and loaded.k1 == 1.2
+        assert loaded.search("zinc cream", top_k=3) == index.search("zinc cream", top_k=3)
+    
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        from src.rag.lexical import reciprocal_rank_fusion
+        
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c"]], k=60)
+        
+        assert [doc_id for doc_id, _ in fused] == ["b", "c", "a"]
+        assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    
+    def test_hybrid_search_scores_and_distances(self, make_retriever, monkeypatch):
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "RETRIEVAL_MODE", "hybrid")
+        
+        retriever = make_retriever()
+        results = retriever.search("zinc oxide", top_k=3)
+        
+        assert results[0]["id"] == "protector_solar"
+        scores = [doc["score"] for doc in results]
+        assert scores == sorted(scores, reverse=True)
+        assert all(doc["distance"] >= 0 for doc in results)
+        assert retriever.get_collection_info()["lexical_index"]["entries"] == retriever.collection.count()
+    
+    def test_retrieval_modes(self, make_retriever, monkeypatch):
+        from src.utils.config import Config
+        
+        monkeypatch.setattr(Config, "RETRIEVAL_MODE", "lexical")
+        lexical = make_retriever().search("ketoconazole shampoo", top_k=5)
+        assert lexical[0]["id"] == "shampoo_anticaspa"
+        assert "distance" in lexical[0]
+        
+        monkeypatch.setattr(Config, "RETRIEVAL_MODE", "vector")
+        vector = make_retriever()
+        assert len(vector.lexical_index) == 0
+        assert all("score" not in doc for doc in vector.search("ketoconazole shampoo", top_k=2))
+        
+        monkeypatch.setattr(Config, "RETRIEVAL_MODE", "fuzzy")
+        with pytest.raises(ValueError):
+            make_retriever()
+
+
+class TestFieldFilters:
+    """Tests for parsed product fields and filtered search"""
+    
+    def test_parse_product_fields(self):
+        from src.rag.fields import parse_product_fields
+        
+        fields = parse_product_fields(
+            "SPF 50+ Sunscreen\n"
+            "Ingredients: Zinc oxide, Titanium dioxide, Vitamin C\n"
+            "Indicated for: All skin types, water-resistant\n"
+            "Price: $1,018.75"
+        )
+        
+        assert fields == {
+            "ingredients": "zinc oxide, titanium dioxide, vitamin c",
+            "indicated_for": "all skin types, water resistant",
+            "price": 1018.75
+        }
+        assert parse_product_fields("No fields here") == {}
+    
+    def test_field_index_masks_and_where_clause(self):
+        from src.rag.fields import FieldIndex, SearchFilters
+        
+        index = FieldIndex().build(
+            ["a#0", "a#1", "b", "c"],
+            [
+                {"doc_id": "a", "price": 10.0, "ingredients": "zinc oxide"},
+                {"doc_id": "a", "price": 10.0, "ingredients": "zinc oxide"},
+                {"doc_id": "b", "price": 25.0, "ingredients": "zinc pyrithione, ketoconazole 2%"},
+                {"doc_id": "c", "ingredients": "vitamin c"}
+            ]
+        )
+        
+        assert index.matches(SearchFilters(max_price=20)).tolist() == [True, True, False, False]
+        assert index.matches(SearchFilters(ingredient="Zinc")).tolist() == [True, True, True, False]
+        assert index.matches(SearchFilters(min_price=15, ingredient="zinc")).tolist() == [False, False, True, False]
+        assert index.where(SearchFilters(min_price=15, ingredient="zinc")) == {
+            "$and": [{"price": {"$gte": 15.0}}, {"doc_id": {"$in": ["a", "b"]}}]
+        }
+        assert index.where(SearchFilters()) is None
+    
+    @pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+    def test_filtered_search(self, make_retriever, mode, monkeypatch):
+        from src.rag.fields import SearchFilters
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "RETRIEVAL_MODE", mode)
+        
+        retriever = make_retriever()
+        under_20 = retriever.search("sunscreen price", top_k=5, filters=SearchFilters(max_price=20))
+        
+        assert under_20
+        assert all(doc["metadata"]["price"] <= 20 for doc in under_20)
+        assert "protector_solar" in [doc["id"] for doc in under_20]
+        
+        dry_skin = retriever.search("cream", top_k=5, filters=SearchFilters(skin_type="dry skin"))
+        assert [doc["id"] for doc in dry_skin] == ["crema_hidratante"]
+        assert retriever.search("cream", filters=SearchFilters(min_price=1000)) == []
+    
+    def test_filters_apply_to_merged_chunks(self, make_retriever, monkeypatch):
+        from src.rag.fields import SearchFilters
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "CHUNK_STRATEGY", "fields")
+        
+        retriever = make_retriever()
+        results = retriever.search_batch(["sunscreen", "shampoo"], top_k=3, filters=SearchFilters(ingredient="zinc"))
+        
+        for docs in results:
+            assert [doc["id"] for doc in docs] == ["protector_solar"]
+            assert "zinc oxide" in docs[0]["metadata"]["ingredients"]
+
+
+class TestSemanticResponseCache:
+    """Tests for the semantic response cache"""
+    
+    @pytest.fixture
+    def cache(self):
+        from src.rag.response_cache import SemanticResponseCache
+        return SemanticResponseCache(threshold=0.9, max_entries=10, ttl_seconds=60)
+    
+    def test_near_duplicate_query_hits(self, cache):
+        cache.store([1.0, 0.0, 0.1], ["shampoo_anticaspa"], "v1", "Use the shampoo")
+        
+        assert cache.lookup([1.0, 0.05, 0.1], ["shampoo_anticaspa"], "v1") == "Use the shampoo"
+        assert cache.stats()["hits"] == 1
+    
+    def test_requires_same_documents_and_similarity(self, cache):
+        cache.store([1.0, 0.0], ["shampoo_anticaspa", "crema_hidratante"], "v1", "answer")
+        
+        # Same ids in a different order still match
+        assert cache.lookup([1.0, 0.0], ["crema_hidratante", "shampoo_anticaspa"], "v1") == "answer"
+        assert cache.lookup([1.0, 0.0], ["shampoo_anticaspa"], "v1") is None
+        assert cache.lookup([0.0, 1.0], ["shampoo_anticaspa", "crema_hidratante"], "v1") is None
+        assert cache.stats()["misses"] == 2
+    
+    def test_ttl_and_lru_eviction(self):
+        import time
+        from src.rag.response_cache import SemanticResponseCache
+        
+        expiring = SemanticResponseCache(threshold=0.9, max_entries=10, ttl_seconds=0.01)
+        expiring.store([1.0, 0.0], ["a"], "v1", "old")
+        time.sleep(0.02)
+        assert expiring.lookup([1.0, 0.0], ["a"], "v1") is None
+        assert expiring.stats()["entries"] == 0
+        
+        bounded = SemanticResponseCache(threshold=0.9, max_entries=1, ttl_seconds=60)
+        bounded.store([1.0, 0.0], ["a"], "v1", "first")
+        bounded.store([1.0, 0.0], ["b"], "v1", "second")
+        assert bounded.lookup([1.0, 0.0], ["a"], "v1") is None
+        assert bounded.lookup([1.0, 0.0], ["b"], "v1") == "second"
+    
+    def test_index_change_invalidates(self, cache):
+        cache.store([1.0, 0.0], ["a"], "v1", "stale")
+        
+        assert cache.lookup([1.0, 0.0], ["a"], "v2") is None
+        assert cache.stats()["invalidations"] == 1
+        assert cache.stats()["entries"] == 0
+    
+    def test_index_version_tracks_content(self, make_retriever):
+        first = make_retriever().index_version
+        second = make_retriever().index_version
+        assert first and first == second
+
+
+class TestConversationStore:
+    """Tests for per-user conversation memory"""
+    
+    def test_follow_up_detection(self):
+        from src.rag.conversation import is_follow_up
+        
+        assert is_follow_up("and how much is it?")
+        assert is_follow_up("What are its ingredients?")
+        assert is_follow_up("is it good for dry skin?")
+        assert not is_follow_up("How much is the anti-dandruff shampoo?")
+        assert not is_follow_up("is it a good moisturizer for very dry sensitive skin?")
+        # New questions that merely contain "one", "that" or "this"
+        for query in ("Which one is best for dandruff?", "Is there one for oily skin?",
+                      "Anything that helps acne?", "Do you have one with zinc oxide?", "Is this sold in pharmacies?"):
+            assert not is_follow_up(query)
+    
+    def test_follow_up_must_match_documents(self):
+        from src.rag.conversation import refers_to
+        
+        docs = [{"content": "Sunscreen SPF 50\nSkin type: dry, oily\nPrice: $18.75"}]
+        assert refers_to("and how much is it?", docs)
+        assert refers_to("is it good for dry skin?", docs)
+        assert not refers_to("is it good for dandruff?", docs)
+    
+    def test_recall_and_bounds(self):
+        import time
+        from src.rag.conversation import ConversationStore
+        
+        store = ConversationStore(max_turns=2, max_sessions=2, ttl_seconds=60, max_response_chars=10, backend="memory")
+        assert store.recall("u1", "how much is it?") is None
+        store.record("u1", "Tell me about the shampoo", "A shampoo against dandruff", ["shampoo_anticaspa"])
+        
+        turns = store.recall("u1", "how much is it?")
+        assert turns[-1].doc_ids == ("shampoo_anticaspa",)
+        assert turns[-1].response == "A shampoo..."
+        assert store.recall("u1", "Tell me about sunscreen") is None
+        assert store.recall("u2", "how much is it?") is None
+        
+        for i in range(3):
+            store.record("u1", f"query {i}", "answer", ["a"])
+        assert [turn.query for turn in store.history("u1")] == ["query 1", "query 2"]
+        
+        # Least recently used sessions go first, by count and by bytes
+        store.record("u2", "query", "answer", ["b"])
+        store.history("u1")
+        store.record("u3", "query", "answer", ["c"])
+        assert store.history("u2") == []
+        stats = store.stats()
+        assert stats["sessions"] == 2 and stats["evictions"] == 1
+        assert stats["bytes"] == sum(session.size for session in store._sessions.values()) > 0
+        store.max_bytes = stats["max_session_bytes"]
+        store.record("u1", "query", "answer", ["a"])
+        assert store.history("u3") == [] and store.stats()["sessions"] == 1
+        
+        expiring = ConversationStore(max_turns=2, ttl_seconds=0.01, backend="memory")
+        expiring.record("u1", "query", "answer", ["a"])
+        time.sleep(0.02)
+        assert expiring.recall("u1", "how much is it?") is None
+        assert expiring.stats()["expirations"] == 1
+    
+    def test_sqlite_backend_outlives_process(self, tmp_path):
+        from src.rag.conversation import ConversationStore
+        
+        path = str(tmp_path / "conversations.db")
+        store = ConversationStore(max_turns=3, max_sessions=1, ttl_seconds=60, backend="sqlite", db_path=path)
+        store.record("u1", "Tell me about the shampoo", "A shampoo", ["shampoo_anticaspa"])
+        store.record("u2", "Tell me about the cream", "A cream", ["crema_hidratante"])
+        # Evicted from memory, loaded back from the database
+        assert store.recall("u1", "how much is it?")[-1].doc_ids == ("shampoo_anticaspa",)
+        store.close()
+        
+        restarted = ConversationStore(max_turns=3, ttl_seconds=60, backend="sqlite", db_path=path)
+        assert [turn.query for turn in restarted.history("u2")] == ["Tell me about the cream"]
+        assert restarted.stats()["persisted_sessions"] == 2
+        restarted.forget("u2")
+        assert restarted.history("u2") == []
+        restarted.close()
+    
+    @pytest.mark.asyncio
+    async def test_sqlite_io_runs_off_the_loop_and_outside_the_lock(self, tmp_path):
+        import threading
+        from src.rag.conversation import ConversationStore
+        
+        store = ConversationStore(max_turns=3, max_sessions=1, ttl_seconds=60, backend="sqlite",
+                                  db_path=str(tmp_path / "conversations.db"))
+        io_threads = []
+        for name in ("load", "save"):
+            method = getattr(store._persisted, name)
+            
+            def traced(*args, method=method):
+                assert not store._lock.locked()
+                io_threads.append(threading.get_ident())
+                return method(*args)
+            setattr(store._persisted, name, traced)
+        
+        await store.arecord("u1", "Tell me about the shampoo", "A shampoo", ["shampoo_anticaspa"])
+        await store.arecord("u2", "Tell me about the cream", "A cream", ["crema_hidratante"])
+        # u1 was evicted from memory, so recalling it reads the database
+        turns = await store.arecall("u1", "how much is it?")
+        assert turns[-1].doc_ids == ("shampoo_anticaspa",)
+        assert io_threads and threading.get_ident() not in io_threads
+        store.close()
+    
+    @pytest.mark.parametrize("strategy", ["none", "fields"])
+    def test_retriever_fetches_documents_by_id(self, make_retriever, strategy, monkeypatch):
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "CHUNK_STRATEGY", strategy)
+        
+        retriever = make_retriever()
+        found = retriever.search("price of the sunscreen", top_k=2)
+        ids = [doc["id"] for doc in reversed(found)] + ["missing"]
+        
+        docs = retriever.get_documents(ids)
+        assert [doc["id"] for doc in docs] == ids[:2]
+        assert all(doc["distance"] is None for doc in docs)
+        # Every chunk is merged back: the whole document, price included
+        assert all("price" in doc["content"].lower() for doc in docs)
+
+
 class TestResponseGenerator:
     """Tests for ResponseGenerator"""
     
@@ -100,7 +771,7 @@ class TestResponseGenerator:
     
     def test_build_context(self, generator, sample_docs):
         """Test context building"""
-        context = generator._build_context(sample_docs)
+        context = generator.build_context(sample_docs).text
         
         assert isinstance(context, str)
         assert "Document 1:" in context
@@ -110,12 +781,12 @@ class TestResponseGenerator:
     
     def test_build_context_empty(self, generator):
         """Test empty context"""
-        context = generator._build_context([])
+        context = generator.build_context([]).text
         assert "No relevant documents found" in context
     
     def test_create_prompt(self, generator, sample_docs):
         """Test prompt creation"""
-        context = generator._build_context(sample_docs)
+        context = generator.build_context(sample_docs).text
         prompt = generator._create_prompt("What shampoo do you recommend?", context)
         
         assert isinstance(prompt, str)
@@ -123,15 +794,251 @@ class TestResponseGenerator:
         assert "Anti-Dandruff Shampoo" in prompt
         assert "Instructions:" in prompt
     
-    def test_generate_response_structure(self, generator, sample_docs):
-        """Test generated response structure"""
-        # Only test that it doesn't fail, without making real OpenAI call
-        query = "test query"
+    def test_follow_up_messages_carry_history(self, generator, sample_docs):
+        from src.rag.conversation import Turn
+        history = [Turn("What shampoo do you recommend?", "The Anti-Dandruff Shampoo.", ("shampoo",), 0.0)]
+        
+        messages = generator._build_messages("How much is it?", sample_docs, history=history)
+        assert [message["role"] for message in messages] == ["system", "user", "assistant", "user"]
+        assert messages[2]["content"] == "The Anti-Dandruff Shampoo."
+        assert "How much is it?" in messages[-1]["content"]
+    
+    def test_generate_response_raises_llm_error(self, sample_docs, monkeypatch):
+        """A failed LLM call raises LLMError instead of being returned as an answer"""
+        from src.rag.llm_guard import LLMError, LLMGuard
+        from src.rag.openai_backend import OpenAIBackend
+        from src.utils.config import Config
+        # Nothing listens on the discard port
+        monkeypatch.setattr(Config, "OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+        monkeypatch.setattr(Config, "OPENAI_API_KEY", "test-key")
+        generator = ResponseGenerator(backend=OpenAIBackend(guard=LLMGuard(max_retries=0)))
+        
+        with pytest.raises(LLMError) as error:
+            generator.generate_response("test query", sample_docs)
+        assert error.value.reason == "connection"
+        assert error.value.status_code == 502
+    
+    def test_empty_completion_raises_llm_error(self, sample_docs):
+        """A completion without content (refusal, content filter) fails as an LLMError"""
+        import asyncio
+        from types import SimpleNamespace
+        from src.rag.llm_guard import LLMError, LLMGuard
+        from src.rag.openai_backend import OpenAIBackend
+        
+        filtered = SimpleNamespace(choices=[
+            SimpleNamespace(message=SimpleNamespace(content=None), finish_reason="content_filter")
+        ])
+        
+        async def acreate(**kwargs):
+            return filtered
+        backend = OpenAIBackend(guard=LLMGuard(max_retries=0))
+        backend.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: filtered)))
+        backend._get_async_client = lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=acreate)))
+        generator = ResponseGenerator(backend=backend)
+        
+        with pytest.raises(LLMError) as error:
+            generator.generate_response("test query", sample_docs)
+        assert error.value.reason == "empty"
+        assert "content_filter" in str(error.value)
+        with pytest.raises(LLMError):
+            asyncio.run(generator.agenerate_response("test query", sample_docs))
+    
+    
+    def test_extractive_backend_quotes_matching_lines(self, sample_docs):
+        """The extractive backend answers from the best-matching documents without any network call"""
+        from src.rag.generator_backends import ExtractiveBackend
+        generator = ResponseGenerator(backend=ExtractiveBackend())
+        
+        response = generator.generate_response("shampoo with ketoconazole?", sample_docs)
+        assert response.splitlines() == [
+            "Based on the available information:",
+            "- Anti-Dandruff Shampoo Premium ($15.99): Ingredients: Ketoconazole 2%"
+        ]
+        assert generator.generate_response("vitamin c?", sample_docs) == ExtractiveBackend.NO_ANSWER
+        assert generator.generate_response("shampoo?", []) == ExtractiveBackend.NO_ANSWER
+
+
+class TestLLMGuard:
+    """Tests for the retries, concurrency limit and circuit breaker around LLM calls"""
+    
+    @staticmethod
+    def flaky(*errors):
+        """Call that raises the given errors in turn, then answers"""
+        calls = []
+        
+        def func(timeout):
+            calls.append(timeout)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return "answer"
+        return func, calls
+    
+    def test_retries_only_retryable_errors(self):
+        from src.rag.openai_backend import classify_error
+        from src.rag.llm_guard import LLMError, LLMGuard
+        guard = LLMGuard(max_retries=2, base_delay=0.01, timeout=5, breaker_threshold=0)
+        
+        func, calls = self.flaky(TimeoutError(), LLMError("busy", reason="server_error", retryable=True))
+        assert guard.call(func, classify_error) == "answer"
+        assert len(calls) == 3
+        assert all(0 < timeout <= 5 for timeout in calls)
+        
+        func, calls = self.flaky(LLMError("bad request", reason="rejected"))
+        with pytest.raises(LLMError):
+            guard.call(func, classify_error)
+        assert len(calls) == 1
+        
+        func, calls = self.flaky(*[TimeoutError()] * 3)
+        with pytest.raises(LLMError) as error:
+            guard.call(func, classify_error)
+        assert len(calls) == 3
+        assert error.value.status_code == 504
+    
+    def test_circuit_fails_fast_then_probes(self):
+        import time
+        from src.rag.openai_backend import classify_error
+        from src.rag.llm_guard import LLMCircuitOpenError, LLMError, LLMGuard
+        guard = LLMGuard(max_retries=0, breaker_threshold=2, breaker_cooldown=0.2)
+        
+        for _ in range(2):
+            with pytest.raises(LLMError):
+                guard.call(self.flaky(LLMError("down", reason="connection", retryable=True))[0], classify_error)
+        func, calls = self.flaky()
+        with pytest.raises(LLMCircuitOpenError) as error:
+            guard.call(func, classify_error)
+        assert calls == []
+        assert error.value.status_code == 503
+        assert 0 < error.value.retry_after <= 0.2
+        
+        time.sleep(0.25)
+        assert guard.call(func, classify_error) == "answer"
+        assert guard.breaker.state == "closed"
+    
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_rejects_after_queue_timeout(self):
+        import asyncio
+        from src.rag.openai_backend import classify_error
+        from src.rag.llm_guard import LLMGuard, LLMOverloadedError, LLMTimeoutError
+        guard = LLMGuard(max_concurrency=1, queue_timeout=0.05, timeout=1)
+        
+        async def slow(timeout):
+            await asyncio.sleep(0.2)
+            return "answer"
+        
+        results = await asyncio.gather(
+            guard.acall(slow, classify_error), guard.acall(slow, classify_error), return_exceptions=True
+        )
+        assert results[0] == "answer"
+        assert isinstance(results[1], LLMOverloadedError)
+        assert guard.stats()["in_flight"] == 0
+        
+        # A call that outlives its timeout is cancelled and reported as a timeout
+        guard = LLMGuard(timeout=0.05, max_retries=0)
+        with pytest.raises(LLMTimeoutError) as error:
+            await guard.acall(slow, classify_error)
+        assert error.value.status_code == 504
+
+
+class TestContextBuilder:
+    """Tests for the token-budgeted context builder"""
+    
+    DOCS = [
+        {"content": "Vitamin C Supplement\nPrice: $12.00\nShared warranty line", "distance": 0.6, "id": "vitaminas_c"},
+        {"content": "SPF 50+ Sunscreen\nPrice: $18.75\nShared warranty line", "distance": 0.2, "id": "protector_solar"},
+    ]
+    
+    def test_ranks_by_distance_and_deduplicates(self):
+        from src.rag.context_builder import ContextBuilder
+        
+        context = ContextBuilder(max_tokens=500).build(self.DOCS)
+        
+        assert context.text.index("SPF 50+") < context.text.index("Vitamin C")
+        assert context.text.count("Shared warranty line") == 1
+        assert context.docs_used == 2
+        assert context.truncated is False
+        assert context.tokens == ContextBuilder(max_tokens=500).counter.count(context.text)
+    
+    def test_budget_truncates_last_document(self):
+        from src.rag.context_builder import ContextBuilder
+        
+        builder = ContextBuilder(max_tokens=20)
+        context = builder.build(self.DOCS)
+        
+        assert context.truncated is True
+        assert context.tokens <= 20
+        assert context.text.startswith("Document 1:\nSPF 50+ Sunscreen")
+        assert "Vitamin C" not in context.text
+    
+    def test_generator_context_respects_budget(self, monkeypatch):
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "CONTEXT_MAX_TOKENS", 30)
+        
+        generator = ResponseGenerator()
+        long_doc = {"content": "Cream\n" + "hydrating " * 200, "distance": 0.1, "id": "crema"}
+        context = generator.build_context([long_doc])
+        
+        assert context.tokens <= 30
+        assert context.text.endswith("...\n")
+
+
+class OverlapCrossEncoder:
+    """Stand-in CrossEncoder: scores a pair by the query words the document contains"""
+    
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+    
+    def predict(self, pairs, batch_size=32, **kwargs):
+        import time
+        time.sleep(self.delay)
+        self.batches.append(len(pairs))
+        return [
+            float(len(set(re.findall(r"\w+", query.lower())) & set(re.findall(r"\w+", doc.lower()))))
+            for query, doc in pairs
+        ]
+
+
+class TestReranker:
+    """Tests for the cross-encoder rerank stage"""
+    
+    def test_agent_reranks_wider_candidate_set(self, make_retriever, monkeypatch):
+        from src.agents.retriever_agent import RetrieverAgent
+        from src.rag.context_builder import ContextBuilder
+        from src.rag.reranker import CrossEncoderReranker
+        from src.utils.config import Config
+        monkeypatch.setattr(Config, "RERANK_CANDIDATES", 5)
+        
+        retriever = make_retriever()
+        model = OverlapCrossEncoder()
+        agent = RetrieverAgent(retriever, reranker=CrossEncoderReranker(model, batch_size=2, budget_ms=0))
+        
+        result = agent.run("price of the antibacterial soap", top_k=2)
+        
+        docs = result["retrieved_docs"]
+        assert len(docs) == 2
+        assert sum(model.batches) == 5
+        assert docs[0]["id"] == "jabon_antibacterial"
+        assert docs[0]["rerank_score"] >= docs[1]["rerank_score"]
+        # The prompt keeps the reranked order
+        context = ContextBuilder(max_tokens=500).build(list(reversed(docs)))
+        assert context.text.startswith(f"Document 1:\n{docs[1]['content'].splitlines()[0]}")
+    
+    def test_budget_keeps_retrieval_order_for_unscored(self):
+        from src.rag.reranker import CrossEncoderReranker
+        
+        docs = [{"id": f"d{i}", "content": "soap" if i == 3 else "cream"} for i in range(8)]
+        model = OverlapCrossEncoder(delay=0.05)
+        reranker = CrossEncoderReranker(model, batch_size=2, budget_ms=80)
+        
+        ranked = reranker.rerank("soap", docs, top_k=8)
+        
+        # Second batch predicted to overrun the budget after the first took 50ms
+        assert model.batches == [2]
+        assert [doc["id"] for doc in ranked] == ["d0", "d1", "d2", "d3", "d4", "d5", "d6", "d7"]
+        assert [doc["rerank_score"] for doc in ranked[2:]] == [None] * 6
         
-        # Test error handling with empty docs
-        response = generator.generate_response(query, [])
-        assert isinstance(response, str)
-        assert len(response) > 0
+        ranked = CrossEncoderReranker(OverlapCrossEncoder(), batch_size=2, budget_ms=0).rerank("soap", docs, top_k=3)
+        assert [doc["id"] for doc in ranked] == ["d3", "d0", "d1"]
 
 
 def test_config_import():